@@ -0,0 +1,50 @@
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from .models import User
+
+# The fields permission checks and views read from request.user
+SNAPSHOT_FIELDS = ('id', 'email', 'user_type', 'is_active', 'is_staff', 'is_admin')
+
+
+def user_cache_key(user_id):
+    return f'auth-user:{user_id}'
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWT authentication that resolves the token's user from a small snapshot
+    in the shared cache instead of querying the users table on every request.
+    The snapshot is dropped whenever the user is saved or deleted (see
+    signals.py). request.user is a deferred User instance: any field outside
+    SNAPSHOT_FIELDS is loaded from the database on first access.
+    """
+
+    def get_user(self, validated_token):
+        if api_settings.CHECK_REVOKE_TOKEN:
+            # Revocation compares against the password hash, which is not cached
+            return super().get_user(validated_token)
+
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken("Token contained no recognizable user identification")
+
+        snapshot = cache.get(user_cache_key(user_id))
+        if snapshot is None:
+            user = super().get_user(validated_token)
+            cache.set(
+                user_cache_key(user_id),
+                {field: getattr(user, field) for field in SNAPSHOT_FIELDS},
+                settings.AUTH_USER_CACHE_TTL,
+            )
+            return user
+
+        # from_db expects the values in model field order
+        field_names = [f.attname for f in User._meta.concrete_fields if f.attname in snapshot]
+        user = User.from_db(User.objects.db, field_names, [snapshot[name] for name in field_names])
+        if not user.is_active:
+            raise AuthenticationFailed("User is inactive", code="user_inactive")
+        return user
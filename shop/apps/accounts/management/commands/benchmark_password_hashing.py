@@ -0,0 +1,33 @@
+import time
+from django.contrib.auth.hashers import get_hashers
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Measures the CPU cost of verifying a password with each configured hasher, as logins per second per core'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20, help='Verifications timed per hasher (default: 20)')
+        parser.add_argument('--hasher', help='Only benchmark this algorithm, e.g. argon2, bcrypt_sha256, pbkdf2_sha256')
+
+    def handle(self, *args, **options):
+        hashers = get_hashers()
+        preferred = hashers[0]
+        if options['hasher']:
+            hashers = [hasher for hasher in hashers if hasher.algorithm == options['hasher']]
+
+        for hasher in hashers:
+            encoded = hasher.encode('benchmark-password-1', hasher.salt())
+            started = time.perf_counter()
+            for _ in range(options['iterations']):
+                hasher.verify('benchmark-password-1', encoded)
+            per_login = (time.perf_counter() - started) / options['iterations']
+
+            cost = ', '.join(
+                f'{key}={value}' for key, value in hasher.safe_summary(encoded).items()
+                if key not in ('algorithm', 'salt', 'hash', 'checksum')
+            )
+            self.stdout.write(
+                f"{hasher.algorithm:<15} {per_login * 1000:8.1f} ms/login {1 / per_login:8.1f} logins/s per core"
+                f"  ({cost}){'  [preferred]' if hasher is preferred else ''}"
+            )
@@ -3,7 +3,17 @@ from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, Permis
 from django.core.validators import RegexValidator
 
 
-class CustomUserManager(BaseUserManager):
+class UserQuerySet(models.QuerySet):
+    def update(self, **kwargs):
+        # Bulk updates (and bulk_update) skip post_save, so drop the cached auth snapshots here
+        from .signals import invalidate_cached_users
+        user_ids = list(self.values_list('pk', flat=True))
+        rows = super().update(**kwargs)
+        invalidate_cached_users(user_ids)
+        return rows
+
+
+class CustomUserManager(BaseUserManager.from_queryset(UserQuerySet)):
     def create_user(self, email, password=None, **extra_fields):
         if not email:
             raise ValueError('Email is required')
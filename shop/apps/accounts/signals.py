@@ -0,0 +1,23 @@
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .authentication import user_cache_key
+from .models import User
+
+
+def invalidate_cached_users(user_ids):
+    """
+    Drop the authentication snapshots once the current transaction commits.
+    Deleting earlier would let a concurrent request re-cache the old row.
+    """
+    keys = [user_cache_key(user_id) for user_id in user_ids]
+    if keys:
+        transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_user(sender, instance, **kwargs):
+    """Drop the authentication snapshot so the next request reloads the user"""
+    invalidate_cached_users([instance.pk])
@@ -1,2 +1,5 @@
 from .test_models import UserModelTest
-from .test_views import SignupViewTests, VerifyEmailViewTests, ResendVerificationViewTests, RequestPasswordResetViewTests, ResetPasswordViewTests, LoginViewTests
\ No newline at end of file
+from .test_views import SignupViewTests, VerifyEmailViewTests, ResendVerificationViewTests, RequestPasswordResetViewTests, ResetPasswordViewTests, LoginViewTests
+from .test_authentication import CachedJWTAuthenticationTests
+from .test_hashers import PasswordHashingTests
+from .test_throttling import SlidingWindowRateThrottleTests
@@ -0,0 +1,58 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+from ..authentication import user_cache_key
+from ..models import User
+
+
+class CachedJWTAuthenticationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(email='test@example.com', password='testpassword')
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.user).access_token}')
+
+    def test_user_is_served_from_cache_after_first_request(self):
+        self.client.get(reverse('cart'))
+        self.assertIsNotNone(cache.get(user_cache_key(self.user.id)))
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('cart'))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse([q for q in queries.captured_queries if User._meta.db_table in q['sql']])
+
+    def test_save_invalidates_cached_user(self):
+        self.client.get(reverse('cart'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save()
+            # Still cached until the write commits
+            self.assertIsNotNone(cache.get(user_cache_key(self.user.id)))
+
+        self.assertIsNone(cache.get(user_cache_key(self.user.id)))
+        response = self.client.get(reverse('cart'))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_queryset_update_invalidates_cached_user(self):
+        self.client.get(reverse('cart'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            User.objects.filter(pk=self.user.pk).update(user_type='ADMIN')
+
+        self.assertIsNone(cache.get(user_cache_key(self.user.id)))
+
+    def test_profile_loads_full_user(self):
+        self.client.get(reverse('profile'))
+
+        response = self.client.get(reverse('profile'))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['email'], 'test@example.com')
+        self.assertIn('created_at', response.data)
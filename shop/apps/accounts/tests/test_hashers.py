@@ -0,0 +1,62 @@
+from io import StringIO
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+from ..models import User
+
+
+@override_settings(PASSWORD_PBKDF2_ITERATIONS=1000)
+class PasswordHashingTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+
+    def login(self, user):
+        return self.client.post(reverse('login'), {'email': user.email, 'password': 'testpassword'})
+
+    def test_new_passwords_use_preferred_hasher(self):
+        user = User.objects.create_user(email='test@example.com', password='testpassword')
+
+        self.assertTrue(user.password.startswith('argon2$'))
+
+    def test_legacy_hash_is_upgraded_on_login(self):
+        user = User.objects.create_user(email='test@example.com', password='testpassword', is_verified=True)
+        User.objects.filter(pk=user.pk).update(password=make_password('testpassword', hasher='pbkdf2_sha256'))
+
+        response = self.login(user)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        user.refresh_from_db()
+        self.assertTrue(user.password.startswith('argon2$'))
+
+    def test_other_default_hashes_still_verify(self):
+        user = User.objects.create_user(email='test@example.com', password='testpassword', is_verified=True)
+
+        for algorithm in ('scrypt', 'pbkdf2_sha1'):
+            User.objects.filter(pk=user.pk).update(password=make_password('testpassword', hasher=algorithm))
+
+            response = self.login(user)
+
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            user.refresh_from_db()
+            self.assertTrue(user.password.startswith('argon2$'))
+
+    def test_hash_is_upgraded_when_cost_changes(self):
+        user = User.objects.create_user(email='test@example.com', password='testpassword', is_verified=True)
+
+        with override_settings(PASSWORD_ARGON2_TIME_COST=3):
+            response = self.login(user)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        user.refresh_from_db()
+        self.assertIn('t=3', user.password)
+
+    def test_benchmark_reports_logins_per_core(self):
+        out = StringIO()
+
+        call_command('benchmark_password_hashing', '--iterations', '1', '--hasher', 'argon2', stdout=out)
+
+        self.assertIn('logins/s per core', out.getvalue())
+        self.assertIn('[preferred]', out.getvalue())
@@ -0,0 +1,79 @@
+from unittest.mock import patch
+from django.conf import settings
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+from ..throttling import SlidingWindowRateThrottle
+
+REST_FRAMEWORK = {
+    **settings.REST_FRAMEWORK,
+    'DEFAULT_THROTTLE_RATES': {**settings.REST_FRAMEWORK['DEFAULT_THROTTLE_RATES'], 'login': '3/min'},
+}
+
+
+@override_settings(REST_FRAMEWORK=REST_FRAMEWORK)
+class SlidingWindowRateThrottleTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def login(self, email, ip='10.0.0.1'):
+        return self.client.post(reverse('login'), {'email': email, 'password': 'wrong'}, REMOTE_ADDR=ip)
+
+    def test_requests_over_limit_are_rejected(self):
+        for _ in range(3):
+            self.assertEqual(self.login('test@example.com').status_code, status.HTTP_401_UNAUTHORIZED)
+
+        with patch('apps.accounts.views.authenticate') as mock_authenticate:
+            response = self.login('test@example.com')
+
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertIn('Retry-After', response)
+        mock_authenticate.assert_not_called()
+
+    def test_limit_applies_per_ip_across_emails(self):
+        for i in range(3):
+            self.login(f'user{i}@example.com')
+
+        self.assertEqual(self.login('other@example.com').status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    def test_limit_applies_per_email_across_ips(self):
+        for i in range(3):
+            self.login('Test@Example.com', ip=f'10.0.0.{i}')
+
+        self.assertEqual(self.login('test@example.com', ip='10.0.1.1').status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(self.login('other@example.com', ip='10.0.1.1').status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_spoofed_forwarded_for_does_not_bypass_ip_limit(self):
+        # The proxy appends the real client address after whatever the client sent
+        for i in range(3):
+            self.client.post(
+                reverse('login'), {'email': f'user{i}@example.com', 'password': 'wrong'},
+                HTTP_X_FORWARDED_FOR=f'203.0.113.{i}, 10.0.0.9'
+            )
+
+        response = self.client.post(
+            reverse('login'), {'email': 'other@example.com', 'password': 'wrong'},
+            HTTP_X_FORWARDED_FOR='203.0.113.99, 10.0.0.9'
+        )
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    def test_previous_window_is_weighted_by_overlap(self):
+        with patch.object(SlidingWindowRateThrottle, 'timer', return_value=6000 + 59):
+            for _ in range(3):
+                self.login('test@example.com')
+
+        # A quarter into the next window, 75% of the previous window still counts: 2.25 + 1 > 3
+        with patch.object(SlidingWindowRateThrottle, 'timer', return_value=6060 + 15):
+            self.assertEqual(self.login('test@example.com').status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+        cache.clear()
+        with patch.object(SlidingWindowRateThrottle, 'timer', return_value=6000 + 59):
+            for _ in range(3):
+                self.login('test@example.com')
+
+        # Late in the next window only 10% still counts: 0.3 + 1 <= 3
+        with patch.object(SlidingWindowRateThrottle, 'timer', return_value=6060 + 54):
+            self.assertEqual(self.login('test@example.com').status_code, status.HTTP_401_UNAUTHORIZED)
@@ -1,13 +1,21 @@
+from django.core.cache import cache
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.utils import timezone
 from rest_framework.test import APIClient
 from rest_framework import status
 from ..models import User
+from ...cart.guest import GuestCart
+from ...notifications.models import EmailOutbox
+from ...products.models import Product
 from unittest.mock import patch
 
 class BaseTestCase(TestCase):
     def setUp(self):
+        # Rate limit counters live in the cache
+        cache.clear()
         self.client = APIClient()
         self.user_data = {
             'email': 'test@example.com',
@@ -30,7 +38,22 @@ class SignupViewTests(BaseTestCase):
         self.assertIn('message', response.data)
         self.assertIn('user', response.data)
         mock_send_email.assert_called_once()
-        
+
+    def test_signup_queues_verification_email(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse('signup'), self.user_data)
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        user_writes = [
+            q['sql'] for q in queries.captured_queries
+            if User._meta.db_table in q['sql'] and not q['sql'].startswith('SELECT')
+        ]
+        self.assertEqual(len(user_writes), 1)
+        self.assertTrue(user_writes[0].startswith('INSERT'))
+        user = User.objects.get(email='test@example.com')
+        self.assertFalse(user.is_verified)
+        email = EmailOutbox.objects.get(recipient='test@example.com', status='PENDING')
+        self.assertIn(user.verification_code, email.body)
 
     def test_signup_failure(self):
         data = {'email': 'invalid-email', 'password': 'testpassword'}
@@ -152,6 +175,20 @@ class LoginViewTests(BaseTestCase):
         self.assertIn('access', response.data)
         self.assertIn('user', response.data)
 
+    def test_login_merges_guest_cart(self):
+        user = self.create_user()
+        user.is_verified = True
+        user.save()
+        product = Product.objects.create(name='Test Product', price=10.00)
+        guest_cart = GuestCart()
+        guest_cart.add(product.id, 2)
+
+        data = {'email': user.email, 'password': 'testpassword', 'cart_token': guest_cart.token}
+        response = self.client.post(reverse('login'), data)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(user.cart.items.get().quantity, 2)
+
     def test_login_unverified_email(self):
         user = self.create_user()
         
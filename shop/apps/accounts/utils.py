@@ -1,56 +1,23 @@
-from django.conf import settings
-from django.core.mail import send_mail
-from django.template.loader import render_to_string
-from django.utils.html import strip_tags
+from ..notifications.utils import queue_email, render_email
 
 
 def send_verification_email(email, verification_code):
-    subject = 'Verify your email address'
-    
-    # HTML version of the email
-    html_message = render_to_string('emails/verification_email.html', {
+    """Queue the signup verification code email; the outbox worker delivers it"""
+    plain_message, html_message = render_email('emails/verification_email', {
         'verification_code': verification_code,
         'company_name': 'Ideal Furniture & Decor',
         'support_email': 'support@IdealFurniture&Decor.com',
     })
-    
-    # Plain text version of the email
-    plain_message = strip_tags(html_message)
-    
-    try:
-        send_mail(
-            subject,
-            plain_message,
-            settings.EMAIL_HOST_USER,
-            [email],
-            fail_silently=False,
-            html_message=html_message,
-        )
-    except Exception as e:
-        print(f'Error sending verification email: {e}')
+
+    queue_email(email, 'Verify your email address', plain_message, html_message)
 
 
 def send_password_reset_email(email, reset_token):
-    subject = "Ideal Furniture & Decor: Password Reset Request"
-    
-    # HTML version of the email
-    html_message = render_to_string('emails/password_reset_email.html', {
+    """Queue the password reset code email; the outbox worker delivers it"""
+    plain_message, html_message = render_email('emails/password_reset_email', {
         'reset_token': reset_token,
         'company_name': 'Ideal Furniture & Decor',
         'support_email': 'support@IdealFurniture&Decor.com',
     })
-    
-    # Plain text version of the email
-    plain_message = strip_tags(html_message)
-    
-    try:
-        send_mail(
-            subject,
-            plain_message,
-            settings.EMAIL_HOST_USER,
-            [email],
-            fail_silently=False,
-            html_message=html_message,
-        )
-    except Exception as e:
-        print(f'Error sending password reset email: {e}')
+
+    queue_email(email, 'Ideal Furniture & Decor: Password Reset Request', plain_message, html_message)
@@ -3,10 +3,13 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework_simplejwt.tokens import RefreshToken
 from django.contrib.auth import authenticate
+from django.db import transaction
 from .models import User
 from .permissions import IsAdmin
 from .serializers import UserSerializer
+from .throttling import SlidingWindowRateThrottle
 from .utils import send_verification_email, send_password_reset_email
+from ..cart.guest import merge_guest_cart
 import secrets
 from django.utils import timezone
 from datetime import timedelta
@@ -20,30 +23,23 @@ class SignupView(APIView):
         if serializer.is_valid():
             verification_code = secrets.token_hex(3)
 
-            user = serializer.save()
-            user.verification_code = verification_code
-            user.is_verified = False
-            user.save()
-
-            try:
+            # One insert for the user and one for the queued email, committed together
+            with transaction.atomic():
+                user = serializer.save(verification_code=verification_code, is_verified=False)
                 send_verification_email(user.email, verification_code)
 
-                return Response({
-                    'message': 'Registration sucessful. Please check your email for verification.',
-                    'user': serializer.data
-                }, status=status.HTTP_201_CREATED)
-            except Exception as e:
-                user.delete()
-                return Response({
-                    'message': 'Error sending verification email. Please try again later.',
-                    'error': str(e)
-                }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+            return Response({
+                'message': 'Registration sucessful. Please check your email for verification.',
+                'user': serializer.data
+            }, status=status.HTTP_201_CREATED)
         
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
 
 class VerifyEmailView(APIView):
     permission_classes = [permissions.AllowAny]
+    throttle_classes = [SlidingWindowRateThrottle]
+    throttle_scope = 'verify_email'
 
     def post(self, request):
         email = request.data.get('email')
@@ -81,7 +77,9 @@ class VerifyEmailView(APIView):
                 }, status=status.HTTP_404_NOT_FOUND)
         
 class ResendVerificationView(APIView):
-    permission_classes = [permissions.AllowAny] 
+    permission_classes = [permissions.AllowAny]
+    throttle_classes = [SlidingWindowRateThrottle]
+    throttle_scope = 'resend_verification'
 
     def post(self, request):
         email = request.data.get('email')
@@ -97,17 +95,14 @@ class ResendVerificationView(APIView):
             # Generate new verification code
             verification_code = secrets.token_hex(3)
             user.verification_code = verification_code
-            user.save()
-            
-            try:
+
+            with transaction.atomic():
+                user.save(update_fields=['verification_code', 'updated_at'])
                 send_verification_email(email, verification_code)
-                return Response({
-                    'message': 'Verification code resent successfully'
-                }, status=status.HTTP_200_OK)
-            except Exception as e:
-                return Response({
-                    'message': 'Failed to send verification email'
-                }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+            return Response({
+                'message': 'Verification code resent successfully'
+            }, status=status.HTTP_200_OK)
                 
         except User.DoesNotExist:
             return Response({
@@ -117,6 +112,8 @@ class ResendVerificationView(APIView):
 
 class RequestPasswordResetView(APIView):
     permission_classes = [permissions.AllowAny]
+    throttle_classes = [SlidingWindowRateThrottle]
+    throttle_scope = 'password_reset'
 
     def post(self, request):
         email = request.data.get('email')
@@ -128,17 +125,14 @@ class RequestPasswordResetView(APIView):
             reset_token = secrets.token_hex(3)
             user.password_reset_token = reset_token
             user.password_reset_token_created = timezone.now()
-            user.save()
-            
-            try:
+
+            with transaction.atomic():
+                user.save(update_fields=['password_reset_token', 'password_reset_token_created', 'updated_at'])
                 send_password_reset_email(email, reset_token)
-                return Response({
-                    'message': 'Password reset instructions sent to your email'
-                }, status=status.HTTP_200_OK)
-            except Exception as e:
-                return Response({
-                    'message': 'Failed to send password reset email'
-                }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+            return Response({
+                'message': 'Password reset instructions sent to your email'
+            }, status=status.HTTP_200_OK)
                 
         except User.DoesNotExist:
             # Return success even if email doesn't exist (security best practice)
@@ -192,6 +186,8 @@ class ResetPasswordView(APIView):
 
 class LoginView(APIView):
     permission_classes = [permissions.AllowAny]
+    throttle_classes = [SlidingWindowRateThrottle]
+    throttle_scope = 'login'
 
     def post(self, request):
         email = request.data.get('email')
@@ -206,6 +202,11 @@ class LoginView(APIView):
                     'detail': 'Email not verified.'
                     }, status=status.HTTP_403_FORBIDDEN)
             
+            # Carry over anything the user added to a guest cart before logging in
+            cart_token = request.data.get('cart_token') or request.headers.get('X-Cart-Token')
+            if cart_token:
+                merge_guest_cart(user, cart_token)
+
             refresh = RefreshToken.for_user(user)
             serializer = UserSerializer(user)
 
@@ -223,12 +224,16 @@ class LoginView(APIView):
 class ProfileView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
+    def get_user(self, request):
+        # request.user only carries the cached auth fields; the profile needs the full row
+        return User.objects.get(pk=request.user.pk)
+
     def get(self, request):
-        serializer = UserSerializer(request.user)
+        serializer = UserSerializer(self.get_user(request))
         return Response(serializer.data)
     
     def put(self, request):
-        serializer = UserSerializer(request.user, data=request.data, partial=True, context={'request': request})
+        serializer = UserSerializer(self.get_user(request), data=request.data, partial=True, context={'request': request})
         if serializer.is_valid():
             serializer.save()
             return Response(serializer.data)
@@ -0,0 +1,91 @@
+import re
+import secrets
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+from .models import Cart, CartItem
+from ..products.models import Product
+
+MAX_ITEM_QUANTITY = 100
+TOKEN_PATTERN = re.compile(r'^[A-Za-z0-9_-]{16,64}$')
+
+
+class GuestCart:
+    """
+    Cart for anonymous shoppers, kept in the shared cache as a compact
+    {product_id: quantity} mapping under an opaque token. Nothing touches
+    the database until the shopper logs in and the cart is merged.
+    """
+
+    def __init__(self, token=None):
+        if token and TOKEN_PATTERN.match(token):
+            self.token = token
+            self.items = cache.get(self.cache_key) or {}
+        else:
+            self.token = secrets.token_urlsafe(16)
+            self.items = {}
+
+    @property
+    def cache_key(self):
+        return f'guest-cart:{self.token}'
+
+    def add(self, product_id, quantity):
+        self.items[product_id] = min(self.items.get(product_id, 0) + quantity, MAX_ITEM_QUANTITY)
+        self.save()
+
+    def update(self, product_id, quantity):
+        if quantity > 0:
+            self.items[product_id] = min(quantity, MAX_ITEM_QUANTITY)
+        else:
+            self.items.pop(product_id, None)
+        self.save()
+
+    def remove(self, product_id):
+        self.items.pop(product_id, None)
+        self.save()
+
+    def save(self):
+        # Every write refreshes the TTL, so only idle carts expire
+        cache.set(self.cache_key, self.items, settings.GUEST_CART_TTL)
+
+    def clear(self):
+        self.items = {}
+        cache.delete(self.cache_key)
+
+
+def merge_guest_cart(user, token):
+    """
+    Fold a guest cart into the user's database cart with a single bulk upsert.
+    Quantities for products already in the cart are added together.
+    """
+    guest_cart = GuestCart(token)
+    if guest_cart.token != token or not guest_cart.items:
+        return None
+
+    with transaction.atomic():
+        cart, created = Cart.objects.get_or_create(user=user)
+        product_ids = list(
+            Product.objects.filter(id__in=guest_cart.items.keys()).values_list('id', flat=True)
+        )
+        existing = dict(
+            CartItem.objects.filter(cart=cart, product_id__in=product_ids).values_list('product_id', 'quantity')
+        )
+
+        CartItem.objects.bulk_create(
+            [
+                CartItem(
+                    cart=cart,
+                    product_id=product_id,
+                    quantity=min(existing.get(product_id, 0) + guest_cart.items[product_id], MAX_ITEM_QUANTITY),
+                )
+                for product_id in product_ids
+            ],
+            update_conflicts=True,
+            unique_fields=['cart', 'product'],
+            update_fields=['quantity', 'updated_at'],
+        )
+        Cart.objects.filter(pk=cart.pk).update(updated_at=timezone.now())
+
+    guest_cart.clear()
+    return cart
@@ -0,0 +1,50 @@
+import time
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from datetime import timedelta
+from ...models import Cart, CartItem
+
+
+class Command(BaseCommand):
+    help = 'Deletes items of carts that have been idle longer than the given number of days'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=30, help='Idle threshold in days (default: 30)')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows deleted per statement (default: 1000)')
+        parser.add_argument('--pause', type=float, default=0, help='Seconds to sleep between batches')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        batch_size = options['batch_size']
+
+        # A cart is idle when neither the cart nor any of its items changed since the cutoff
+        idle_carts = Cart.objects.filter(updated_at__lt=cutoff).exclude(items__updated_at__gte=cutoff)
+
+        self.stdout.write(f'Cleaning up carts idle since {cutoff:%Y-%m-%d %H:%M}...')
+        started = time.monotonic()
+
+        # Each batch is its own short autocommit statement, so locks are never held for long
+        items_deleted = self.delete_in_batches(
+            CartItem.objects.filter(cart__in=idle_carts.values('id')), batch_size, options['pause']
+        )
+        carts_deleted = self.delete_in_batches(
+            Cart.objects.filter(updated_at__lt=cutoff, items__isnull=True), batch_size, options['pause']
+        )
+
+        elapsed = time.monotonic() - started
+        total = items_deleted + carts_deleted
+        rate = total / elapsed if elapsed > 0 else total
+        self.stdout.write(self.style.SUCCESS(
+            f'Deleted {items_deleted} cart items and {carts_deleted} carts in {elapsed:.2f}s ({rate:.0f} rows/s)'
+        ))
+
+    def delete_in_batches(self, queryset, batch_size, pause):
+        deleted = 0
+        while True:
+            ids = list(queryset.values_list('id', flat=True)[:batch_size])
+            if not ids:
+                return deleted
+            count, _ = queryset.model.objects.filter(id__in=ids).delete()
+            deleted += count
+            if pause:
+                time.sleep(pause)
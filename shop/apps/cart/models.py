@@ -10,7 +10,7 @@ class Cart(models.Model):
         related_name='cart',
     )
     created_at = models.DateTimeField(auto_now_add=True)
-    updated_at = models.DateTimeField(auto_now=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     def get_total_price(self):
         return sum(item.get_subtotal() for item in self.items.all())
@@ -1,2 +1,3 @@
 from .test_models import CartTests, CartItemTests
-from .test_views import CartItemViewTest, CartViewTest
\ No newline at end of file
+from .test_views import CartItemViewTest, CartViewTest, GuestCartViewTest
+from .test_commands import CleanupAbandonedCartsTest
\ No newline at end of file
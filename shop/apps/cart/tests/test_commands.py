@@ -0,0 +1,43 @@
+from io import StringIO
+from datetime import timedelta
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.utils import timezone
+from ..models import Cart, CartItem
+from ...products.models import Product
+
+class CleanupAbandonedCartsTest(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.product = Product.objects.create(
+            name='Test Product',
+            price=10.00
+        )
+        self.idle_cart = Cart.objects.create(
+            user=User.objects.create_user(email='idle@example.com', password='testpass123')
+        )
+        self.active_cart = Cart.objects.create(
+            user=User.objects.create_user(email='active@example.com', password='testpass123')
+        )
+        for cart in (self.idle_cart, self.active_cart):
+            CartItem.objects.create(cart=cart, product=self.product, quantity=1)
+
+        long_ago = timezone.now() - timedelta(days=60)
+        Cart.objects.filter(pk=self.idle_cart.pk).update(updated_at=long_ago)
+        CartItem.objects.filter(cart=self.idle_cart).update(updated_at=long_ago)
+
+    def test_idle_carts_are_removed(self):
+        out = StringIO()
+        call_command('cleanup_abandoned_carts', days=30, batch_size=1, stdout=out)
+
+        self.assertFalse(Cart.objects.filter(pk=self.idle_cart.pk).exists())
+        self.assertFalse(CartItem.objects.filter(cart_id=self.idle_cart.pk).exists())
+        self.assertEqual(self.active_cart.items.count(), 1)
+        self.assertIn('rows/s', out.getvalue())
+
+    def test_cart_with_recent_items_is_kept(self):
+        CartItem.objects.filter(cart=self.idle_cart).update(updated_at=timezone.now())
+        call_command('cleanup_abandoned_carts', days=30, stdout=StringIO())
+
+        self.assertEqual(self.idle_cart.items.count(), 1)
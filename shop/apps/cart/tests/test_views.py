@@ -1,9 +1,11 @@
 from django.test import TestCase
 from django.contrib.auth import get_user_model
 from django.urls import reverse
+from django.core.cache import cache
 from rest_framework.test import APIClient
 from rest_framework import status
 from ..models import Cart, CartItem
+from ..guest import GuestCart, merge_guest_cart
 from ...products.models import Product
 
 class CartViewTest(TestCase):
@@ -95,4 +97,60 @@ class CartItemViewTest(TestCase):
             reverse('cart-item', args=[self.cart_item.id])
         )
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(CartItem.objects.filter(id=self.cart_item.id).exists(), False)
\ No newline at end of file
+        self.assertEqual(CartItem.objects.filter(id=self.cart_item.id).exists(), False)
+
+class GuestCartViewTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.product = Product.objects.create(
+            name='Test Product',
+            price=10.00,
+            stock=5
+        )
+
+    def test_add_to_guest_cart(self):
+        response = self.client.post(reverse('guest-cart'), {
+            'product_id': self.product.id,
+            'quantity': 2
+        })
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['items']), 1)
+        self.assertEqual(response.data['items'][0]['quantity'], 2)
+        self.assertFalse(CartItem.objects.exists())
+
+        token = response.data['cart_token']
+        response = self.client.get(reverse('guest-cart'), HTTP_X_CART_TOKEN=token)
+        self.assertEqual(response.data['cart_token'], token)
+        self.assertEqual(response.data['items'][0]['quantity'], 2)
+
+    def test_update_guest_cart_item(self):
+        guest_cart = GuestCart()
+        guest_cart.add(self.product.id, 1)
+
+        response = self.client.put(
+            reverse('guest-cart-item', args=[self.product.id]),
+            {'quantity': 0},
+            HTTP_X_CART_TOKEN=guest_cart.token
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['items']), 0)
+
+    def test_merge_guest_cart(self):
+        user = get_user_model().objects.create_user(
+            email='test@example.com',
+            password='testpass123'
+        )
+        cart = Cart.objects.create(user=user)
+        CartItem.objects.create(cart=cart, product=self.product, quantity=1)
+        other_product = Product.objects.create(name='Other Product', price=5.00)
+
+        guest_cart = GuestCart()
+        guest_cart.add(self.product.id, 2)
+        guest_cart.add(other_product.id, 3)
+
+        merge_guest_cart(user, guest_cart.token)
+
+        quantities = dict(cart.items.values_list('product_id', 'quantity'))
+        self.assertEqual(quantities, {self.product.id: 3, other_product.id: 3})
+        self.assertEqual(GuestCart(guest_cart.token).items, {})
@@ -5,4 +5,6 @@ from django.urls import path
 urlpatterns = [
     path('cart/', views.CartView.as_view(), name='cart'),
     path('cart/item/<int:item_id>/', views.CartItemView.as_view(), name='cart-item'),
+    path('guest/', views.GuestCartView.as_view(), name='guest-cart'),
+    path('guest/item/<int:product_id>/', views.GuestCartItemView.as_view(), name='guest-cart-item'),
 ]
\ No newline at end of file
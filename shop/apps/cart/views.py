@@ -6,6 +6,7 @@ from django.db import transaction
 from .models import Cart, CartItem
 from ..products.models import Product
 from .serializers import CartSerializer, CartItemSerializer
+from .guest import GuestCart
 
 class CartView(APIView):
     permission_classes = [permissions.IsAuthenticated]
@@ -99,4 +100,89 @@ class CartItemView(APIView):
         cart = cart_item.cart
         cart_item.delete()
         serializer = CartSerializer(cart)
-        return Response(serializer.data)
\ No newline at end of file
+        return Response(serializer.data)
+
+
+class GuestCartMixin:
+    """Shared helpers for carts of anonymous users, identified by the X-Cart-Token header"""
+
+    def get_guest_cart(self, request):
+        return GuestCart(request.headers.get('X-Cart-Token'))
+
+    def build_response(self, guest_cart):
+        products = Product.objects.filter(id__in=guest_cart.items.keys())
+        items = []
+        total_price = 0
+        for product in products:
+            quantity = guest_cart.items[product.id]
+            subtotal = product.price * quantity
+            total_price += subtotal
+            items.append({
+                'product': product.id,
+                'product_name': product.name,
+                'product_image': product.image.url if product.image else None,
+                'product_price': product.price,
+                'quantity': quantity,
+                'subtotal': subtotal,
+            })
+        return Response({
+            'cart_token': guest_cart.token,
+            'items': items,
+            'total_price': total_price,
+        })
+
+
+class GuestCartView(GuestCartMixin, APIView):
+    permission_classes = [permissions.AllowAny]
+
+    def get(self, request):
+        return self.build_response(self.get_guest_cart(request))
+
+    def post(self, request):
+        product_id = request.data.get('product_id')
+        quantity = int(request.data.get('quantity', 1))
+
+        product = get_object_or_404(Product, id=product_id)
+
+        if quantity < 1:
+            return Response(
+                {'error': 'Quantity must be at least 1'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        guest_cart = self.get_guest_cart(request)
+        guest_cart.add(product.id, quantity)
+        return self.build_response(guest_cart)
+
+    def delete(self, request):
+        """Clear all items from the guest cart"""
+        guest_cart = self.get_guest_cart(request)
+        guest_cart.clear()
+        return self.build_response(guest_cart)
+
+
+class GuestCartItemView(GuestCartMixin, APIView):
+    permission_classes = [permissions.AllowAny]
+
+    def put(self, request, product_id):
+        guest_cart = self.get_guest_cart(request)
+        if product_id not in guest_cart.items:
+            return Response({'error': 'Item not in cart'}, status=status.HTTP_404_NOT_FOUND)
+
+        quantity = int(request.data.get('quantity', 0))
+        if quantity < 0:
+            return Response(
+                {'error': 'Quantity must be non-negative'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        guest_cart.update(product_id, quantity)
+        return self.build_response(guest_cart)
+
+    def delete(self, request, product_id):
+        guest_cart = self.get_guest_cart(request)
+        if product_id not in guest_cart.items:
+            return Response({'error': 'Item not in cart'}, status=status.HTTP_404_NOT_FOUND)
+
+        guest_cart.remove(product_id)
+        return self.build_response(guest_cart)
@@ -0,0 +1,175 @@
+"""
+Shared clients for outbound HTTP calls (M-Pesa, Stripe, image checks).
+
+The payment providers (Stripe, Safaricom) each get their own keep-alive
+connection pool, so repeated calls skip the TCP+TLS handshake. Every other
+host (e.g. user-supplied image URLs) shares one session whose pools are
+evicted least recently used, so arbitrary hosts can't grow memory without
+bound. All calls get connect/read timeouts, so
+a hung upstream can't pin a worker. Idempotent requests are retried with
+jittered exponential backoff. Every call logs its latency. Async views
+use an httpx client with the same timeouts and pool size.
+"""
+import asyncio
+import logging
+import threading
+import time
+import weakref
+from urllib.parse import urlsplit
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Only these are retried after the request reached the server; connection
+# failures are retried for every method since nothing was sent yet
+IDEMPOTENT_METHODS = frozenset(['GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'])
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+# Session and latency stats key for every host that is not a known upstream
+OTHER_HOSTS = 'other'
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+# One AsyncClient per event loop; its pooled connections can't cross loops
+_async_clients = weakref.WeakKeyDictionary()
+_stats = {}
+_stats_lock = threading.Lock()
+
+
+def _build_session(pool_connections=1):
+    retry = Retry(
+        total=settings.OUTBOUND_HTTP_RETRIES,
+        allowed_methods=IDEMPOTENT_METHODS,
+        status_forcelist=RETRY_STATUSES,
+        backoff_factor=0.3,
+        backoff_jitter=0.3,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(
+        pool_connections=pool_connections,
+        pool_maxsize=settings.OUTBOUND_HTTP_POOL_SIZE,
+        max_retries=retry,
+    )
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def _upstream_hosts():
+    return {urlsplit(settings.STRIPE_API_BASE).netloc, urlsplit(settings.MPESA_BASE_URL).netloc}
+
+
+def _host_key(url):
+    """The host of ``url`` if it is a known upstream, otherwise OTHER_HOSTS"""
+    host = urlsplit(url).netloc
+    return host if host in _upstream_hosts() else OTHER_HOSTS
+
+
+def get_session(url):
+    """Return the pooled session for the host of ``url``, or the shared session for other hosts"""
+    key = _host_key(url)
+    session = _sessions.get(key)
+    if session is None:
+        with _sessions_lock:
+            session = _sessions.get(key)
+            if session is None:
+                if key == OTHER_HOSTS:
+                    # urllib3 keeps this many host pools and drops the least recently used
+                    session = _build_session(pool_connections=settings.OUTBOUND_HTTP_POOL_SIZE)
+                else:
+                    session = _build_session()
+                _sessions[key] = session
+    return session
+
+
+def request(method, url, timeout=None, **kwargs):
+    """Send a request through the pooled session for the URL's host"""
+    host = urlsplit(url).netloc
+    started = time.monotonic()
+    status = None
+    try:
+        response = get_session(url).request(
+            method, url, timeout=timeout or settings.OUTBOUND_HTTP_TIMEOUT, **kwargs
+        )
+        status = response.status_code
+        return response
+    finally:
+        elapsed_ms = (time.monotonic() - started) * 1000
+        _record(_host_key(url), elapsed_ms, status)
+        logger.info(f"Outbound {method} {host}{urlsplit(url).path} -> {status or 'error'} in {elapsed_ms:.1f}ms")
+
+
+def httpx_timeout():
+    connect, read = settings.OUTBOUND_HTTP_TIMEOUT
+    return httpx.Timeout(read, connect=connect)
+
+
+def get_async_client():
+    """Return the pooled httpx client for the running event loop"""
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = _async_clients[loop] = httpx.AsyncClient(
+            timeout=httpx_timeout(),
+            limits=httpx.Limits(max_keepalive_connections=settings.OUTBOUND_HTTP_POOL_SIZE),
+            # httpx only retries failed connects, which is safe for every method
+            transport=httpx.AsyncHTTPTransport(retries=settings.OUTBOUND_HTTP_RETRIES),
+        )
+    return client
+
+
+async def arequest(method, url, **kwargs):
+    """Async counterpart of request(), sent through the loop's httpx client"""
+    host = urlsplit(url).netloc
+    started = time.monotonic()
+    status = None
+    try:
+        response = await get_async_client().request(method, url, **kwargs)
+        status = response.status_code
+        return response
+    finally:
+        elapsed_ms = (time.monotonic() - started) * 1000
+        _record(_host_key(url), elapsed_ms, status)
+        logger.info(f"Outbound {method} {host}{urlsplit(url).path} -> {status or 'error'} in {elapsed_ms:.1f}ms")
+
+
+async def apost(url, **kwargs):
+    return await arequest('POST', url, **kwargs)
+
+
+def get(url, **kwargs):
+    return request('GET', url, **kwargs)
+
+
+def post(url, **kwargs):
+    return request('POST', url, **kwargs)
+
+
+def head(url, **kwargs):
+    return request('HEAD', url, **kwargs)
+
+
+def _record(host, elapsed_ms, status):
+    with _stats_lock:
+        stats = _stats.setdefault(host, {'calls': 0, 'errors': 0, 'total_ms': 0.0, 'max_ms': 0.0})
+        stats['calls'] += 1
+        stats['total_ms'] += elapsed_ms
+        stats['max_ms'] = max(stats['max_ms'], elapsed_ms)
+        if status is None or status >= 500:
+            stats['errors'] += 1
+
+
+def get_latency_stats():
+    """
+    Per-upstream call counts, error counts and latency for this process; all
+    other hosts are counted together under OTHER_HOSTS
+    """
+    with _stats_lock:
+        return {
+            host: {**stats, 'avg_ms': stats['total_ms'] / stats['calls']}
+            for host, stats in _stats.items()
+        }
@@ -0,0 +1,38 @@
+from unittest.mock import patch, MagicMock
+from django.test import SimpleTestCase, override_settings
+from . import http
+
+
+class OutboundHttpTests(SimpleTestCase):
+    @override_settings(MPESA_BASE_URL='https://sandbox.safaricom.co.ke', STRIPE_API_BASE='https://api.stripe.com')
+    def test_session_is_shared_per_host(self):
+        first = http.get_session('https://sandbox.safaricom.co.ke/oauth/v1/generate')
+        second = http.get_session('https://sandbox.safaricom.co.ke/mpesa/stkpush/v1/processrequest')
+        other = http.get_session('https://api.stripe.com/v1/payment_intents')
+
+        self.assertIs(first, second)
+        self.assertIsNot(first, other)
+
+    @override_settings(OUTBOUND_HTTP_TIMEOUT=(1, 2))
+    def test_default_timeout_is_applied(self):
+        session = http.get_session('https://example.com/')
+        with patch.object(session, 'request', return_value=MagicMock(status_code=200)) as mock_request:
+            http.get('https://example.com/image.png')
+
+        mock_request.assert_called_once_with('GET', 'https://example.com/image.png', timeout=(1, 2))
+        self.assertGreaterEqual(http.get_latency_stats()[http.OTHER_HOSTS]['calls'], 1)
+
+    @override_settings(MPESA_BASE_URL='https://sandbox.safaricom.co.ke', STRIPE_API_BASE='https://api.stripe.com')
+    def test_other_hosts_share_one_session(self):
+        mpesa = http.get_session('https://sandbox.safaricom.co.ke/oauth/v1/generate')
+        first = http.get_session('https://images.example.com/a.png')
+        second = http.get_session('https://cdn.example.net/b.png')
+
+        self.assertIs(first, second)
+        self.assertIsNot(first, mpesa)
+        self.assertNotIn('images.example.com', http._sessions)
+
+    def test_post_is_not_retried_after_reaching_server(self):
+        adapter = http.get_session('https://example.org/').get_adapter('https://example.org/')
+        self.assertNotIn('POST', adapter.max_retries.allowed_methods)
+        self.assertIn('GET', adapter.max_retries.allowed_methods)
@@ -0,0 +1,17 @@
+from django.contrib import admin
+from django.utils import timezone
+from .models import EmailOutbox
+
+@admin.register(EmailOutbox)
+class EmailOutboxAdmin(admin.ModelAdmin):
+    list_display = ('id', 'recipient', 'subject', 'status', 'attempts', 'next_attempt_at', 'created_at', 'sent_at')
+    list_filter = ('status', 'created_at')
+    search_fields = ('recipient', 'subject')
+    readonly_fields = ('created_at', 'sent_at', 'last_error')
+    ordering = ('-created_at',)
+    actions = ['retry_now']
+
+    def retry_now(self, request, queryset):
+        updated = queryset.exclude(status='SENT').update(status='PENDING', next_attempt_at=timezone.now())
+        self.message_user(request, f'{updated} emails were queued for another delivery attempt.')
+    retry_now.short_description = "Retry selected emails now"
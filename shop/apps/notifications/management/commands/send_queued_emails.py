@@ -0,0 +1,107 @@
+import logging
+import random
+import time
+from datetime import timedelta
+from django.core.mail import get_connection
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from ...models import EmailOutbox
+from ...utils import build_email
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Delivers queued emails from the outbox over a single persistent SMTP connection'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=50, help='Emails claimed per batch (default: 50)')
+        parser.add_argument('--max-attempts', type=int, default=5, help='Attempts before an email is marked failed')
+        parser.add_argument('--backoff', type=float, default=30, help='Base retry delay in seconds, doubled per attempt')
+        parser.add_argument('--loop', action='store_true', help='Keep polling the outbox instead of exiting when empty')
+        parser.add_argument('--interval', type=float, default=5, help='Seconds to wait between polls with --loop')
+        parser.add_argument(
+            '--lease', type=float, default=300,
+            help='Seconds a claimed email is hidden from other workers; it is retried after that if never marked'
+        )
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.connection = get_connection()
+        sent = failed = 0
+
+        try:
+            while True:
+                batch_sent, batch_failed, claimed = self.process_batch()
+                sent += batch_sent
+                failed += batch_failed
+
+                if claimed < options['batch_size']:
+                    if not options['loop']:
+                        break
+                    # Idle: release the SMTP session rather than let the server time it out
+                    self.connection.close()
+                    time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.connection.close()
+
+        self.stdout.write(self.style.SUCCESS(f'Sent {sent} emails, {failed} failed'))
+
+    def process_batch(self):
+        sent = failed = 0
+
+        with transaction.atomic():
+            # skip_locked lets several workers claim from the outbox without taking the same email
+            emails = list(
+                EmailOutbox.objects.select_for_update(skip_locked=True)
+                .filter(status='PENDING', next_attempt_at__lte=timezone.now())
+                .order_by('next_attempt_at')[:self.options['batch_size']]
+            )
+            # Lease the batch and commit before talking to SMTP, so no row lock is
+            # held during delivery; a worker that dies mid-batch only delays its emails
+            EmailOutbox.objects.filter(id__in=[email.id for email in emails]).update(
+                next_attempt_at=timezone.now() + timedelta(seconds=self.options['lease'])
+            )
+
+        for email in emails:
+            try:
+                # Opening is a no-op while the session is still up
+                self.connection.open()
+                self.connection.send_messages([
+                    build_email(email.recipient, email.subject, email.body, email.html_body, self.connection)
+                ])
+            except Exception as e:
+                logger.warning(f'Sending email {email.id} to {email.recipient} failed: {e}')
+                self.schedule_retry(email, e)
+                failed += 1
+                # Start from a fresh session for the next message
+                self.connection.close()
+            else:
+                email.status = 'SENT'
+                email.sent_at = timezone.now()
+                email.attempts += 1
+                sent += 1
+
+            # Recorded right away, so a later failure cannot undo it and resend the email
+            EmailOutbox.objects.filter(pk=email.pk).update(
+                status=email.status,
+                attempts=email.attempts,
+                next_attempt_at=email.next_attempt_at,
+                last_error=email.last_error,
+                sent_at=email.sent_at,
+            )
+
+        return sent, failed, len(emails)
+
+    def schedule_retry(self, email, error):
+        email.attempts += 1
+        email.last_error = str(error)
+        if email.attempts >= self.options['max_attempts']:
+            email.status = 'FAILED'
+            return
+
+        delay = self.options['backoff'] * 2 ** (email.attempts - 1)
+        email.next_attempt_at = timezone.now() + timedelta(seconds=delay + random.uniform(0, delay / 2))
@@ -0,0 +1,2 @@
+from .test_commands import SendQueuedEmailsTest
+from .test_utils import RenderEmailTest
@@ -0,0 +1,51 @@
+from io import StringIO
+from unittest.mock import patch
+from django.test import TestCase
+from django.core import mail
+from django.core.management import call_command
+from django.utils import timezone
+from ..models import EmailOutbox
+from ..utils import queue_email
+
+class SendQueuedEmailsTest(TestCase):
+    def setUp(self):
+        queue_email('first@example.com', 'First', 'Plain body', '<p>HTML body</p>')
+        queue_email('second@example.com', 'Second', 'Plain body')
+
+    def test_queued_emails_are_sent(self):
+        call_command('send_queued_emails', stdout=StringIO())
+
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertEqual(mail.outbox[0].to, ['first@example.com'])
+        self.assertEqual(mail.outbox[0].alternatives[0][1], 'text/html')
+        self.assertFalse(EmailOutbox.objects.exclude(status='SENT').exists())
+
+    def test_failed_email_is_retried_later(self):
+        with patch('django.core.mail.backends.locmem.EmailBackend.send_messages', side_effect=OSError('boom')):
+            call_command('send_queued_emails', stdout=StringIO())
+
+        email = EmailOutbox.objects.get(recipient='first@example.com')
+        self.assertEqual(email.status, 'PENDING')
+        self.assertEqual(email.attempts, 1)
+        self.assertEqual(email.last_error, 'boom')
+        self.assertGreater(email.next_attempt_at, timezone.now())
+
+    def test_email_fails_after_max_attempts(self):
+        with patch('django.core.mail.backends.locmem.EmailBackend.send_messages', side_effect=OSError('boom')):
+            call_command('send_queued_emails', max_attempts=1, stdout=StringIO())
+
+        self.assertEqual(EmailOutbox.objects.filter(status='FAILED').count(), 2)
+
+    def test_batch_is_leased_while_sending(self):
+        leased = []
+
+        def send_messages(messages):
+            # Delivery happens after the claim committed, with the batch hidden from other workers
+            leased.append(EmailOutbox.objects.filter(status='PENDING', next_attempt_at__lte=timezone.now()).exists())
+            return len(messages)
+
+        with patch('django.core.mail.backends.locmem.EmailBackend.send_messages', side_effect=send_messages):
+            call_command('send_queued_emails', stdout=StringIO())
+
+        self.assertEqual(leased, [False, False])
+        self.assertEqual(EmailOutbox.objects.filter(status='SENT').count(), 2)
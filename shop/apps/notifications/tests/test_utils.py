@@ -0,0 +1,15 @@
+from django.test import TestCase
+from ..utils import render_email
+
+class RenderEmailTest(TestCase):
+    def test_plain_text_part_comes_from_text_template(self):
+        plain_message, html_message = render_email('emails/verification_email', {
+            'verification_code': 'abc123',
+            'company_name': 'Ideal Furniture & Decor',
+            'support_email': 'support@example.com',
+        })
+
+        self.assertIn('abc123', plain_message)
+        self.assertIn('Ideal Furniture & Decor', plain_message)
+        self.assertNotIn('<', plain_message)
+        self.assertIn('<div class="verification-code">abc123</div>', html_message)
@@ -0,0 +1,55 @@
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.template.loader import render_to_string
+from .models import EmailOutbox
+
+
+def render_email(template_name, context):
+    """
+    Render the plain text and HTML parts of an email from <template_name>.txt
+    and <template_name>.html. Both come from the cached template loader, so
+    no HTML has to be parsed back into text on each send.
+    """
+    plain_message = render_to_string(f'{template_name}.txt', context)
+    html_message = render_to_string(f'{template_name}.html', context)
+    return plain_message, html_message
+
+
+def queue_email(recipient, subject, body, html_body=''):
+    """
+    Add an email to the outbox. Call this inside the transaction that makes
+    the change being announced: the email is only delivered if it commits.
+    """
+    return EmailOutbox.objects.create(
+        recipient=recipient,
+        subject=subject,
+        body=body,
+        html_body=html_body,
+    )
+
+
+def build_email(recipient, subject, body, html_body='', connection=None):
+    """Build a multipart message with an optional HTML alternative"""
+    message = EmailMultiAlternatives(
+        subject,
+        body,
+        settings.EMAIL_HOST_USER,
+        [recipient],
+        connection=connection,
+    )
+    if html_body:
+        message.attach_alternative(html_body, 'text/html')
+    return message
+
+
+def send_email_batch(messages):
+    """
+    Send already-built messages over one SMTP connection, paying for a single
+    TCP+TLS handshake no matter how many messages there are.
+    Returns the number of messages sent.
+    """
+    if not messages:
+        return 0
+
+    with get_connection() as connection:
+        return connection.send_messages(messages)
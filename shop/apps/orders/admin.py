@@ -4,7 +4,11 @@ from django.db.models import Sum, Count
 from django.urls import reverse
 from django.utils import timezone
 from django.contrib import messages
+from django.db import transaction
 from .models import Order, OrderItem
+from .utils import render_order_status_update_email, render_shipping_confirmation_email
+from ..notifications.utils import build_email, send_email_batch
+from ..salesanalysis.events import record_orders_created, record_status_changes
 
 class OrderItemInline(admin.TabularInline):
     model = OrderItem
@@ -96,33 +100,61 @@ class OrderAdmin(admin.ModelAdmin):
         if not change:
             obj.total_price = 0  # Initialize price before first save
         super().save_model(request, obj, form, change)
+        if change and 'status' in form.changed_data:
+            record_status_changes([(obj, form.initial['status'])])
     
     def save_related(self, request, form, formsets, change):
         super().save_related(request, form, formsets, change)
         if form.instance.pk:  # Ensure order has been saved before accessing related fields
             form.instance.total_price = form.instance.get_total_price()
             form.instance.save()
+            if not change:
+                # Only now are the inline items in place
+                record_orders_created([form.instance])
     
     def mark_as_processing(self, request, queryset):
-        updated = queryset.update(status='PROCESSING', updated_at=timezone.now())
-        self._send_status_update_message(request, updated, "processing")
+        self._update_status(request, queryset, 'PROCESSING')
     mark_as_processing.short_description = "Mark selected orders as processing"
     
     def mark_as_shipped(self, request, queryset):
-        updated = queryset.update(status='SHIPPED', updated_at=timezone.now())
-        self._send_status_update_message(request, updated, "shipped")
+        self._update_status(request, queryset, 'SHIPPED')
     mark_as_shipped.short_description = "Mark selected orders as shipped"
     
     def mark_as_delivered(self, request, queryset):
-        updated = queryset.update(status='DELIVERED', updated_at=timezone.now())
-        self._send_status_update_message(request, updated, "delivered")
+        self._update_status(request, queryset, 'DELIVERED')
     mark_as_delivered.short_description = "Mark selected orders as delivered"
     
     def mark_as_cancelled(self, request, queryset):
-        updated = queryset.update(status='CANCELLED', updated_at=timezone.now())
-        self._send_status_update_message(request, updated, "cancelled")
+        self._update_status(request, queryset, 'CANCELLED')
     mark_as_cancelled.short_description = "Mark selected orders as cancelled"
     
+    def _update_status(self, request, queryset, new_status):
+        # Only customers whose order actually changes status get an email
+        now = timezone.now()
+        with transaction.atomic():
+            changed_orders = list(queryset.exclude(status=new_status).select_related('user').select_for_update(of=('self',)))
+            updated = queryset.update(status=new_status, updated_at=now)
+
+            old_statuses = {order.id: order.status for order in changed_orders}
+            for order in changed_orders:
+                order.status = new_status
+                order.updated_at = now
+            record_status_changes([(order, old_statuses[order.id]) for order in changed_orders])
+
+        emails = []
+        for order in changed_orders:
+            emails.append(build_email(**render_order_status_update_email(order)))
+            if new_status == 'SHIPPED':
+                emails.append(build_email(**render_shipping_confirmation_email(order)))
+
+        # One SMTP connection for the whole selection instead of a handshake per order
+        try:
+            send_email_batch(emails)
+        except Exception as e:
+            messages.warning(request, f'Customer notification emails could not be sent: {e}')
+
+        self._send_status_update_message(request, updated, new_status.lower())
+    
     def _send_status_update_message(self, request, updated, status):
         messages.success(request, f'{updated} orders were successfully marked as {status}.')
 
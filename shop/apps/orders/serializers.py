@@ -3,6 +3,7 @@ from rest_framework.response import Response
 from .models import Order, OrderItem
 from django.db import transaction
 from rest_framework.decorators import api_view
+from ..salesanalysis.events import record_orders_created
 
 
 class OrderItemSerializer(serializers.ModelSerializer):
@@ -75,6 +76,8 @@ class CreateOrderFromCartSerializer(serializers.Serializer):
         # Clear the cart
         cart.items.all().delete()
 
+        record_orders_created([order])
+
         return order
 
 @api_view(['POST'])
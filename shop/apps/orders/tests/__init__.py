@@ -1,2 +1,3 @@
 from .test_models import OrderModelTests, OrderItemModelTests
-from .test_views import OrderViewsTestCase
\ No newline at end of file
+from .test_views import OrderViewsTestCase
+from .test_admin import OrderAdminActionsTestCase
@@ -0,0 +1,42 @@
+from unittest.mock import patch
+from django.test import TestCase, RequestFactory
+from django.contrib.admin.sites import AdminSite
+from django.contrib.auth import get_user_model
+from django.contrib.messages.storage.fallback import FallbackStorage
+from django.core import mail
+from django.core.mail import get_connection
+from ..admin import OrderAdmin
+from ..models import Order
+
+class OrderAdminActionsTestCase(TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.admin = OrderAdmin(Order, AdminSite())
+        self.admin_user = User.objects.create_superuser(email='admin@test.com', password='adminpass123')
+        for i in range(3):
+            Order.objects.create(
+                user=User.objects.create_user(email=f'customer{i}@test.com', password='testpass123'),
+                status='PROCESSING',
+                shipping_address='123 Test St',
+                total_price=10
+            )
+
+    def get_request(self):
+        request = RequestFactory().post('/admin/orders/order/')
+        request.user = self.admin_user
+        request.session = {}
+        request._messages = FallbackStorage(request)
+        return request
+
+    @patch('apps.notifications.utils.get_connection', wraps=get_connection)
+    def test_mark_as_shipped_notifies_over_one_connection(self, mock_get_connection):
+        self.admin.mark_as_shipped(self.get_request(), Order.objects.all())
+
+        self.assertEqual(Order.objects.filter(status='SHIPPED').count(), 3)
+        mock_get_connection.assert_called_once()
+        # A status update and a shipping confirmation for each customer
+        self.assertEqual(len(mail.outbox), 6)
+        self.assertEqual(
+            {message.to[0] for message in mail.outbox},
+            {'customer0@test.com', 'customer1@test.com', 'customer2@test.com'}
+        )
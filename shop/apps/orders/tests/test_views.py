@@ -4,6 +4,7 @@ from django.contrib.auth import get_user_model
 from rest_framework.test import APIClient
 from rest_framework import status
 from ..models import Order
+from ...notifications.models import EmailOutbox
 from unittest.mock import patch
 
 class OrderViewsTestCase(TestCase):
@@ -83,6 +84,7 @@ class OrderViewsTestCase(TestCase):
         url = reverse('order-delete', kwargs={'pk': self.order.pk})
         response = self.client.delete(url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(EmailOutbox.objects.filter(recipient=self.user.email, status='PENDING').exists())
 
     def test_delete_non_pending_order(self):
         self.order.status = 'PROCESSING'
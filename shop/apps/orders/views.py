@@ -4,9 +4,11 @@ from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from ..accounts.permissions import IsAdmin
 from django.shortcuts import get_object_or_404
+from django.db import transaction
 from .models import Order
 import copy
 from .serializers import OrderSerializer, CreateOrderFromCartSerializer
+from ..salesanalysis.events import record_status_changes
 from .utils import send_order_status_update_email, send_shipping_confirmation_email, send_order_confirmation_email, send_order_address_update_email, send_order_cancellation_email
 
 class OrderListCreateView(APIView):
@@ -32,8 +34,10 @@ class OrderCreateFromCartView(APIView):
             context={'request': request}
         )
         if serializer.is_valid():
-            order = serializer.save()
-            send_order_confirmation_email(order)
+            # The confirmation email is queued in the same transaction as the order
+            with transaction.atomic():
+                order = serializer.save()
+                send_order_confirmation_email(order)
             return Response(
                 OrderSerializer(order).data,
                 status=status.HTTP_201_CREATED
@@ -82,11 +86,12 @@ class OrderAddressUpdateView(APIView):
             old_billing_address = copy.deepcopy(order.billing_address)
             order.billing_address = request.data['billing_address']
         
-        order.save()
-        
-        # Send address update email if shipping address was updated
-        if old_shipping_address:
-            send_order_address_update_email(order, old_shipping_address)
+        with transaction.atomic():
+            order.save()
+
+            # Send address update email if shipping address was updated
+            if old_shipping_address:
+                send_order_address_update_email(order, old_shipping_address)
         
         serializer = OrderSerializer(order)
         return Response(serializer.data)
@@ -113,16 +118,19 @@ class OrderStatusUpdateView(APIView):
         
         old_status = order.status
         order.status = request.data['status']
-        order.save()
-        
-        # Send status update email
-        if old_status != order.status:
-            send_order_status_update_email(order)
-            
-            # Send additional shipping email if status is SHIPPED
-            if order.status == 'SHIPPED':
-                tracking_number = request.data.get('tracking_number')
-                send_shipping_confirmation_email(order, tracking_number)
+
+        with transaction.atomic():
+            order.save()
+
+            # Send status update email
+            if old_status != order.status:
+                record_status_changes([(order, old_status)])
+                send_order_status_update_email(order)
+
+                # Send additional shipping email if status is SHIPPED
+                if order.status == 'SHIPPED':
+                    tracking_number = request.data.get('tracking_number')
+                    send_shipping_confirmation_email(order, tracking_number)
         
         serializer = OrderSerializer(order)
         return Response(serializer.data)
@@ -144,17 +152,13 @@ class OrderDeleteView(APIView):
             )
 
         order.status = 'CANCELLED'
-        order.save()
 
-        email_sent = send_order_cancellation_email(order)
-        # Return appropriate response
-        if email_sent:
-            return Response(
-                {'message': 'Order cancelled successfully and confirmation email sent'},
-                status=status.HTTP_200_OK
-            )
-        else:
-            return Response(
-                {'message': 'Order cancelled successfully but confirmation email failed to send'},
-                status=status.HTTP_200_OK
-            )
\ No newline at end of file
+        with transaction.atomic():
+            order.save()
+            record_status_changes([(order, 'PENDING')])
+            send_order_cancellation_email(order)
+
+        return Response(
+            {'message': 'Order cancelled successfully and confirmation email queued'},
+            status=status.HTTP_200_OK
+        )
\ No newline at end of file
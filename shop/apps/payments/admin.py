@@ -1,3 +1,17 @@
 from django.contrib import admin
+from django.utils import timezone
+from .models import WebhookEvent
 
-# Register your models here.
+@admin.register(WebhookEvent)
+class WebhookEventAdmin(admin.ModelAdmin):
+    list_display = ('id', 'provider', 'event_id', 'event_type', 'status', 'attempts', 'received_at', 'processed_at')
+    list_filter = ('provider', 'status', 'received_at')
+    search_fields = ('event_id',)
+    readonly_fields = ('received_at', 'processed_at', 'last_error')
+    ordering = ('-received_at',)
+    actions = ['retry_now']
+
+    def retry_now(self, request, queryset):
+        updated = queryset.exclude(status='processed').update(status='pending', next_attempt_at=timezone.now())
+        self.message_user(request, f'{updated} events were queued for another attempt.')
+    retry_now.short_description = "Retry selected events now"
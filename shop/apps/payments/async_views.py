@@ -0,0 +1,206 @@
+"""
+Async variants of the payment initiation endpoints, plus the long-polling
+payment status endpoint. Served under ASGI they hold no worker thread while
+Stripe or Daraja is responding or while a client waits for a callback, so
+a single process can keep many checkouts in flight.
+"""
+import asyncio
+import json
+import time
+import logging
+import httpx
+import stripe
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
+from rest_framework import exceptions
+from rest_framework.settings import api_settings
+from .models import Payment
+from .utils import get_mpesa_access_token, build_stk_push_payload, payment_status_cache_key
+from ..common import http
+from ..orders.models import Order
+
+logger = logging.getLogger(__name__)
+
+PAYMENT_STATUS_POLL_INTERVAL = 0.5
+
+
+def _authenticate(request):
+    """Run the configured DRF authenticators against a plain Django request"""
+    for authentication_class in api_settings.DEFAULT_AUTHENTICATION_CLASSES:
+        result = authentication_class().authenticate(request)
+        if result is not None:
+            return result[0]
+    return None
+
+
+async def _get_customer(request):
+    try:
+        user = await sync_to_async(_authenticate)(request)
+    except exceptions.AuthenticationFailed:
+        user = None
+    if user is None or user.user_type != 'CUSTOMER':
+        return None
+    return user
+
+
+def _get_data(request):
+    try:
+        return json.loads(request.body or b'{}')
+    except ValueError:
+        return request.POST
+
+
+async def _get_payable_order(order_id, user):
+    """Return (order, error_response) for an order the user may start paying for"""
+    try:
+        order = await Order.objects.aget(id=order_id, user=user)
+    except (Order.DoesNotExist, ValueError):
+        return None, JsonResponse({"detail": "Not found."}, status=404)
+
+    if order.status != 'PENDING':
+        return None, JsonResponse(
+            {"error": f"This order cannot be paid for. Its status is '{order.status}'."}, status=400
+        )
+
+    if await Payment.objects.filter(order=order, status='pending').aexists():
+        return None, JsonResponse(
+            {"error": "A payment process has already been initiated for this order."}, status=409
+        )
+
+    return order, None
+
+
+@csrf_exempt
+@require_POST
+async def stripe_payment(request):
+    user = await _get_customer(request)
+    if user is None:
+        return JsonResponse({"detail": "You do not have permission to perform this action."}, status=403)
+
+    order_id = _get_data(request).get("order_id")
+    if not order_id:
+        return JsonResponse({"error": "order_id is required"}, status=400)
+
+    order, error = await _get_payable_order(order_id, user)
+    if error:
+        return error
+
+    amount = float(order.total_price)
+
+    try:
+        intent = await stripe.PaymentIntent.create_async(
+            amount=int(amount * 100),  # Amount in cents
+            currency="kes",
+            payment_method_types=["card"],
+            metadata={'order_id': order.id},
+        )
+
+        await Payment.objects.acreate(
+            user=user,
+            order=order,
+            amount=amount,
+            payment_method="stripe",
+            transaction_id=intent.id,
+            status="pending",
+        )
+    except Exception as e:
+        logger.error(f"Stripe Payment Intent creation failed for order {order_id}: {e}")
+        return JsonResponse({"error": "An error occurred while communicating with Stripe."}, status=500)
+
+    return JsonResponse({"client_secret": intent.client_secret, "amount": amount})
+
+
+@csrf_exempt
+@require_POST
+async def mpesa_payment(request):
+    user = await _get_customer(request)
+    if user is None:
+        return JsonResponse({"detail": "You do not have permission to perform this action."}, status=403)
+
+    data = _get_data(request)
+    order_id = data.get("order_id")
+    phone = data.get("phone")
+    if not all([order_id, phone]):
+        return JsonResponse({"error": "order_id and phone are required"}, status=400)
+
+    order, error = await _get_payable_order(order_id, user)
+    if error:
+        return error
+
+    amount = float(order.total_price)
+
+    # Normally a cache hit; Daraja is only called when the token is close to expiring
+    access_token = await sync_to_async(get_mpesa_access_token, thread_sensitive=False)()
+    if not access_token:
+        return JsonResponse({"error": "Failed to obtain access token"}, status=400)
+
+    headers = {"Authorization": f"Bearer {access_token}", "Content-Type": "application/json"}
+    try:
+        response = await http.apost(
+            f"{settings.MPESA_BASE_URL}/mpesa/stkpush/v1/processrequest",
+            json=build_stk_push_payload(order_id, phone, amount),
+            headers=headers,
+        )
+    except httpx.HTTPError as e:
+        logger.error(f"M-Pesa STK push request failed: {e}")
+        return JsonResponse({"error": "Payment provider unavailable"}, status=502)
+
+    if response.status_code != 200:
+        return JsonResponse({"error": "Failed to initiate payment"}, status=400)
+
+    checkout_request_id = response.json().get("CheckoutRequestID")
+    await Payment.objects.acreate(
+        user=user,
+        order=order,
+        amount=amount,
+        payment_method="mpesa",
+        mpesa_checkout_id=checkout_request_id,
+        status="pending",
+    )
+
+    return JsonResponse({"message": "Payment initiated", "checkout_request_id": checkout_request_id})
+
+
+@require_GET
+async def payment_status(request, order_id):
+    """
+    Status of the latest payment for an order. With ?wait=<seconds> a pending
+    payment is long-polled: the request watches the cache key the webhook
+    worker sets when the payment settles, so the database is read only once.
+    """
+    user = await _get_customer(request)
+    if user is None:
+        return JsonResponse({"detail": "You do not have permission to perform this action."}, status=403)
+
+    payment = await (
+        Payment.objects.filter(order_id=order_id, order__user=user)
+        .only('id', 'order_id', 'payment_method', 'status')
+        .order_by('-created_at')
+        .afirst()
+    )
+    if payment is None:
+        return JsonResponse({"detail": "Not found."}, status=404)
+
+    try:
+        wait = min(max(float(request.GET.get('wait', 0)), 0), settings.PAYMENT_STATUS_MAX_WAIT)
+    except ValueError:
+        return JsonResponse({"error": "wait must be a number of seconds"}, status=400)
+
+    current_status = payment.status
+    deadline = time.monotonic() + wait
+    while current_status == 'pending' and time.monotonic() < deadline:
+        await asyncio.sleep(PAYMENT_STATUS_POLL_INTERVAL)
+        settled = await cache.aget(payment_status_cache_key(order_id))
+        if settled and settled['payment_id'] == payment.id:
+            current_status = settled['status']
+
+    return JsonResponse({
+        "order_id": payment.order_id,
+        "payment_id": payment.id,
+        "payment_method": payment.payment_method,
+        "status": current_status,
+    })
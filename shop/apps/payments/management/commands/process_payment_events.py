@@ -0,0 +1,81 @@
+import logging
+import random
+import time
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from ...models import WebhookEvent
+from ...utils import apply_webhook_events
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Applies queued Stripe and M-Pesa webhook events to payments and orders in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100, help='Events claimed per batch (default: 100)')
+        parser.add_argument('--max-attempts', type=int, default=5, help='Attempts before an event is marked failed')
+        parser.add_argument('--backoff', type=float, default=10, help='Base retry delay in seconds, doubled per attempt')
+        parser.add_argument('--loop', action='store_true', help='Keep polling for events instead of exiting when empty')
+        parser.add_argument('--interval', type=float, default=1, help='Seconds to wait between polls with --loop')
+
+    def handle(self, *args, **options):
+        self.options = options
+        processed = retried = 0
+
+        try:
+            while True:
+                batch_processed, batch_retried, claimed = self.process_batch()
+                processed += batch_processed
+                retried += batch_retried
+
+                if claimed < options['batch_size']:
+                    if not options['loop']:
+                        break
+                    time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
+
+        self.stdout.write(self.style.SUCCESS(f'Processed {processed} events, {retried} deferred'))
+
+    def process_batch(self):
+        now = timezone.now()
+
+        with transaction.atomic():
+            # skip_locked lets several workers drain the inbox without applying an event twice
+            events = list(
+                WebhookEvent.objects.select_for_update(skip_locked=True)
+                .filter(status='pending', next_attempt_at__lte=now)
+                .order_by('next_attempt_at')[:self.options['batch_size']]
+            )
+            if not events:
+                return 0, 0, 0
+
+            unmatched = apply_webhook_events(events)
+
+            for event in events:
+                event.attempts += 1
+                if event.id in unmatched:
+                    # The webhook can beat the Payment row being committed; try again later
+                    self.schedule_retry(event, 'Payment record not found')
+                else:
+                    event.status = 'processed'
+                    event.processed_at = now
+
+            WebhookEvent.objects.bulk_update(
+                events, ['status', 'attempts', 'next_attempt_at', 'last_error', 'processed_at']
+            )
+
+        return len(events) - len(unmatched), len(unmatched), len(events)
+
+    def schedule_retry(self, event, error):
+        event.last_error = error
+        if event.attempts >= self.options['max_attempts']:
+            logger.error(f'{event.provider} event {event.event_id} failed after {event.attempts} attempts: {error}')
+            event.status = 'failed'
+            return
+
+        delay = self.options['backoff'] * 2 ** (event.attempts - 1)
+        event.next_attempt_at = timezone.now() + timedelta(seconds=delay + random.uniform(0, delay / 2))
@@ -0,0 +1,112 @@
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+import requests
+import stripe
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from ...models import Payment
+from ...utils import _mpesa_receipt_number, build_stk_query_payload, get_mpesa_access_token, settle_payments
+from ....common import http
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Resolves stale pending payments whose callbacks never arrived by asking Stripe and M-Pesa directly'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--minutes', type=int, default=15, help='Reconcile payments pending longer than this (default: 15)')
+        parser.add_argument('--batch-size', type=int, default=100, help='Payments reconciled per batch (default: 100)')
+        parser.add_argument('--workers', type=int, default=8, help='Concurrent provider lookups (default: 8)')
+        parser.add_argument(
+            '--cancel-abandoned', action='store_true',
+            help='Cancel Stripe intents the customer never completed so the order can be paid again',
+        )
+
+    def handle(self, *args, **options):
+        self.cancel_abandoned = options['cancel_abandoned']
+        cutoff = timezone.now() - timedelta(minutes=options['minutes'])
+        pending = Payment.objects.filter(status='pending', created_at__lt=cutoff).order_by('id')
+
+        started = time.monotonic()
+        checked = completed = failed = 0
+        last_id = 0
+
+        with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+            while True:
+                batch = list(
+                    pending.filter(id__gt=last_id).only('id', 'payment_method', 'transaction_id', 'mpesa_checkout_id')[:options['batch_size']]
+                )
+                if not batch:
+                    break
+                last_id = batch[-1].id
+
+                # One token for the whole batch instead of one lookup per thread
+                self.mpesa_token = get_mpesa_access_token() if any(p.payment_method == 'mpesa' for p in batch) else None
+                outcomes = {
+                    payment.id: outcome
+                    for payment, outcome in zip(batch, executor.map(self.lookup, batch))
+                    if outcome is not None
+                }
+                checked += len(batch)
+
+                settled = self.settle(outcomes)
+                completed += sum(1 for payment in settled if payment.status == 'completed')
+                failed += sum(1 for payment in settled if payment.status == 'failed')
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Checked {checked} stale payments in {elapsed:.1f}s: {completed} completed, {failed} failed, '
+            f'{checked - completed - failed} still pending'
+        ))
+
+    def lookup(self, payment):
+        """Ask the provider what became of a payment; None when it is still undecided"""
+        try:
+            if payment.payment_method == 'stripe':
+                return self.lookup_stripe(payment)
+            return self.lookup_mpesa(payment)
+        except (stripe.error.StripeError, requests.RequestException, ValueError) as e:
+            logger.warning(f'Reconciling payment {payment.id} failed: {e}')
+            return None
+
+    def lookup_stripe(self, payment):
+        if not payment.transaction_id:
+            return None
+        intent = stripe.PaymentIntent.retrieve(payment.transaction_id)
+        if intent.status == 'succeeded':
+            return True, None
+        if intent.status in ('requires_payment_method', 'requires_confirmation') and self.cancel_abandoned:
+            # Cancelling fails if the customer pays in the meantime, which leaves the payment pending
+            intent = stripe.PaymentIntent.cancel(payment.transaction_id)
+        if intent.status == 'canceled':
+            return False, None
+        return None
+
+    def lookup_mpesa(self, payment):
+        if not payment.mpesa_checkout_id or not self.mpesa_token:
+            return None
+        response = http.post(
+            f"{settings.MPESA_BASE_URL}/mpesa/stkpushquery/v1/query",
+            json=build_stk_query_payload(payment.mpesa_checkout_id),
+            headers={"Authorization": f"Bearer {self.mpesa_token}"},
+        )
+        data = response.json()
+        # While the customer is still on the prompt Daraja answers with an errorCode and no ResultCode
+        if 'ResultCode' not in data:
+            return None
+        # Keep the receipt number as the transaction ID, as the callback does
+        return str(data['ResultCode']) == '0', data.get('MpesaReceiptNumber') or _mpesa_receipt_number(data)
+
+    def settle(self, outcomes):
+        if not outcomes:
+            return []
+        with transaction.atomic():
+            payments = Payment.objects.select_for_update().select_related('order').filter(id__in=outcomes.keys())
+            return settle_payments(
+                (payment, *outcomes[payment.id]) for payment in payments
+            )
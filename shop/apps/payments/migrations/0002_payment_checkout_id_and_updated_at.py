@@ -0,0 +1,49 @@
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0001_initial'),
+        ('payments', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='payment',
+            options={'ordering': ['-created_at']},
+        ),
+        migrations.AddField(
+            model_name='payment',
+            name='mpesa_checkout_id',
+            field=models.CharField(blank=True, help_text='The temporary CheckoutRequestID from an M-Pesa STK Push.', max_length=100, null=True, unique=True),
+        ),
+        migrations.AddField(
+            model_name='payment',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AlterField(
+            model_name='payment',
+            name='order',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='payments', to='orders.order'),
+        ),
+        migrations.AlterField(
+            model_name='payment',
+            name='payment_method',
+            field=models.CharField(choices=[('stripe', 'Stripe'), ('mpesa', 'M-Pesa')], max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='payment',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('completed', 'Completed'), ('failed', 'Failed')], default='pending', max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='payment',
+            name='transaction_id',
+            field=models.CharField(blank=True, help_text='The final, permanent transaction ID from Stripe (pi_...) or M-Pesa (receipt number).', max_length=100, null=True, unique=True),
+        ),
+    ]
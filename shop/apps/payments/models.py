@@ -1,5 +1,6 @@
 from django.conf import settings
 from django.db import models
+from django.utils import timezone
 
 class Payment(models.Model):
     """
@@ -30,4 +31,50 @@ class Payment(models.Model):
         return f"Payment {self.id} for Order {self.order.id} ({self.status})"
 
     class Meta:
-        ordering = ['-created_at']
\ No newline at end of file
+        ordering = ['-created_at']
+        indexes = [
+            # "Payment already initiated" checks and status lookups per order
+            models.Index(fields=['order', 'status']),
+            # Scans for stale pending payments
+            models.Index(fields=['status', 'created_at']),
+        ]
+
+class WebhookEvent(models.Model):
+    """
+    A verified provider callback waiting to be applied. Webhook views only
+    insert a row and acknowledge; the process_payment_events worker applies
+    events to payments and orders in batches. The unique (provider, event_id)
+    pair drops provider retries of an event we already have.
+    """
+    PROVIDERS = [
+        ("stripe", "Stripe"),
+        ("mpesa", "M-Pesa"),
+    ]
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('processed', 'Processed'),
+        ('failed', 'Failed'),
+    ]
+
+    provider = models.CharField(max_length=20, choices=PROVIDERS)
+    event_id = models.CharField(max_length=255, help_text="Stripe event id or M-Pesa CheckoutRequestID.")
+    event_type = models.CharField(max_length=100, blank=True)
+    payload = models.JSONField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="pending")
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.provider} event {self.event_id} ({self.status})"
+
+    class Meta:
+        ordering = ['received_at']
+        constraints = [
+            models.UniqueConstraint(fields=['provider', 'event_id'], name='unique_webhook_event'),
+        ]
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at']),
+        ]
@@ -1,3 +1,341 @@
-from django.test import TestCase
+import json
+import threading
+import time
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch, MagicMock, AsyncMock
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from django.core.cache import cache
+from django.core.management import call_command
+from django.urls import reverse
+from rest_framework_simplejwt.tokens import RefreshToken
+from .models import Payment, WebhookEvent
+from .utils import get_mpesa_access_token, payment_status_cache_key, MPESA_TOKEN_CACHE_KEY, MPESA_TOKEN_LOCK_KEY
+from ..orders.models import Order
 
-# Create your tests here.
+
+def mock_token_response(token, expires_in='3599'):
+    response = MagicMock()
+    response.json.return_value = {'access_token': token, 'expires_in': expires_in}
+    return response
+
+
+class MpesaAccessTokenTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    @patch('apps.payments.utils.http.get')
+    def test_token_is_cached(self, mock_get):
+        mock_get.return_value = mock_token_response('token-1')
+
+        self.assertEqual(get_mpesa_access_token(), 'token-1')
+        self.assertEqual(get_mpesa_access_token(), 'token-1')
+        mock_get.assert_called_once()
+
+    @patch('apps.payments.utils.http.get')
+    def test_token_is_refreshed_before_expiry(self, mock_get):
+        cache.set(MPESA_TOKEN_CACHE_KEY, {'token': 'old-token', 'refresh_at': time.time() - 1}, 60)
+        mock_get.return_value = mock_token_response('new-token')
+
+        self.assertEqual(get_mpesa_access_token(), 'new-token')
+        mock_get.assert_called_once()
+
+    @patch('apps.payments.utils.http.get')
+    def test_current_token_is_used_while_another_process_refreshes(self, mock_get):
+        cache.set(MPESA_TOKEN_CACHE_KEY, {'token': 'old-token', 'refresh_at': time.time() - 1}, 60)
+        cache.set(MPESA_TOKEN_LOCK_KEY, True, 10)
+
+        self.assertEqual(get_mpesa_access_token(), 'old-token')
+        mock_get.assert_not_called()
+
+
+class AsyncPaymentViewTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(email='buyer@test.com', password='testpass123')
+        self.order = Order.objects.create(user=self.user, shipping_address='123 Test St', total_price='1500.00')
+        self.auth = {'HTTP_AUTHORIZATION': f'Bearer {RefreshToken.for_user(self.user).access_token}'}
+
+    @patch('apps.payments.async_views.stripe.PaymentIntent.create_async', new_callable=AsyncMock)
+    def test_stripe_payment_creates_pending_payment(self, mock_create):
+        mock_create.return_value = MagicMock(id='pi_123', client_secret='secret_123')
+
+        response = self.client.post(
+            reverse('stripe-payment-async'), {'order_id': self.order.id}, content_type='application/json', **self.auth
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['client_secret'], 'secret_123')
+        self.assertEqual(mock_create.call_args.kwargs['amount'], 150000)
+        self.assertTrue(Payment.objects.filter(order=self.order, transaction_id='pi_123', status='pending').exists())
+
+    @patch('apps.payments.async_views.http.apost', new_callable=AsyncMock)
+    def test_mpesa_payment_sends_stk_push(self, mock_post):
+        cache.set(MPESA_TOKEN_CACHE_KEY, {'token': 'token-1', 'refresh_at': time.time() + 60}, 60)
+        mock_post.return_value = MagicMock(status_code=200, json=lambda: {'CheckoutRequestID': 'ws_CO_1'})
+
+        response = self.client.post(
+            reverse('mpesa-payment-async'),
+            {'order_id': self.order.id, 'phone': '254700000000'},
+            content_type='application/json',
+            **self.auth,
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(mock_post.call_args.kwargs['headers']['Authorization'], 'Bearer token-1')
+        self.assertTrue(Payment.objects.filter(order=self.order, mpesa_checkout_id='ws_CO_1').exists())
+
+    def test_duplicate_payment_is_rejected(self):
+        Payment.objects.create(
+            user=self.user, order=self.order, amount=1500, payment_method='stripe', transaction_id='pi_1', status='pending'
+        )
+
+        response = self.client.post(
+            reverse('stripe-payment-async'), {'order_id': self.order.id}, content_type='application/json', **self.auth
+        )
+
+        self.assertEqual(response.status_code, 409)
+
+    def test_requires_authentication(self):
+        response = self.client.post(
+            reverse('stripe-payment-async'), {'order_id': self.order.id}, content_type='application/json'
+        )
+
+        self.assertEqual(response.status_code, 403)
+
+
+def mpesa_callback_body(checkout_request_id, result_code=0):
+    return {
+        'Body': {
+            'stkCallback': {
+                'CheckoutRequestID': checkout_request_id,
+                'ResultCode': result_code,
+                'ResultDesc': 'The service request is processed successfully.',
+                'CallbackMetadata': {'Item': [{'Name': 'MpesaReceiptNumber', 'Value': 'RCP123'}]},
+            }
+        }
+    }
+
+
+class WebhookIngestionTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(email='buyer@test.com', password='testpass123')
+        self.order = Order.objects.create(user=self.user, shipping_address='123 Test St', total_price='1500.00')
+
+    def test_mpesa_callback_is_stored_once_and_acknowledged(self):
+        for _ in range(2):
+            response = self.client.post(
+                reverse('mpesa_callback'), json.dumps(mpesa_callback_body('ws_CO_1')), content_type='application/json'
+            )
+            self.assertEqual(response.json()['ResultCode'], 0)
+
+        self.assertEqual(WebhookEvent.objects.filter(provider='mpesa', event_id='ws_CO_1').count(), 1)
+
+    @patch('apps.payments.views.stripe.Webhook.construct_event')
+    def test_stripe_webhook_is_stored(self, mock_construct):
+        body = {'id': 'evt_1', 'type': 'payment_intent.succeeded', 'data': {'object': {'id': 'pi_1'}}}
+        mock_construct.return_value = body
+
+        response = self.client.post(
+            reverse('stripe-webhook'), json.dumps(body), content_type='application/json', HTTP_STRIPE_SIGNATURE='sig'
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(WebhookEvent.objects.filter(provider='stripe', event_id='evt_1').exists())
+
+    def test_worker_applies_events(self):
+        mpesa_payment = Payment.objects.create(
+            user=self.user, order=self.order, amount=1500, payment_method='mpesa', mpesa_checkout_id='ws_CO_1'
+        )
+        other_order = Order.objects.create(user=self.user, shipping_address='123 Test St', total_price='900.00')
+        stripe_payment = Payment.objects.create(
+            user=self.user, order=other_order, amount=900, payment_method='stripe', transaction_id='pi_1'
+        )
+        WebhookEvent.objects.create(
+            provider='mpesa', event_id='ws_CO_1', payload=mpesa_callback_body('ws_CO_1')['Body']['stkCallback']
+        )
+        WebhookEvent.objects.create(
+            provider='stripe', event_id='evt_1', event_type='payment_intent.succeeded',
+            payload={'data': {'object': {'id': 'pi_1'}}},
+        )
+
+        call_command('process_payment_events', stdout=MagicMock())
+
+        mpesa_payment.refresh_from_db()
+        stripe_payment.refresh_from_db()
+        self.assertEqual(mpesa_payment.status, 'completed')
+        self.assertEqual(mpesa_payment.transaction_id, 'RCP123')
+        self.assertEqual(stripe_payment.status, 'completed')
+        self.assertEqual(Order.objects.filter(status='PROCESSING').count(), 2)
+        self.assertFalse(WebhookEvent.objects.exclude(status='processed').exists())
+
+    def test_failed_mpesa_payment_is_marked_failed(self):
+        payment = Payment.objects.create(
+            user=self.user, order=self.order, amount=1500, payment_method='mpesa', mpesa_checkout_id='ws_CO_2'
+        )
+        WebhookEvent.objects.create(
+            provider='mpesa', event_id='ws_CO_2', payload=mpesa_callback_body('ws_CO_2', result_code=1032)['Body']['stkCallback']
+        )
+
+        call_command('process_payment_events', stdout=MagicMock())
+
+        payment.refresh_from_db()
+        self.order.refresh_from_db()
+        self.assertEqual(payment.status, 'failed')
+        self.assertEqual(self.order.status, 'PENDING')
+
+    def test_event_without_payment_is_retried(self):
+        WebhookEvent.objects.create(
+            provider='mpesa', event_id='ws_CO_9', payload=mpesa_callback_body('ws_CO_9')['Body']['stkCallback']
+        )
+
+        call_command('process_payment_events', stdout=MagicMock())
+
+        event = WebhookEvent.objects.get(event_id='ws_CO_9')
+        self.assertEqual(event.status, 'pending')
+        self.assertEqual(event.attempts, 1)
+        self.assertGreater(event.next_attempt_at, event.received_at)
+
+
+class PaymentStatusViewTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(email='buyer@test.com', password='testpass123')
+        self.order = Order.objects.create(user=self.user, shipping_address='123 Test St', total_price='1500.00')
+        self.payment = Payment.objects.create(
+            user=self.user, order=self.order, amount=1500, payment_method='mpesa', mpesa_checkout_id='ws_CO_1'
+        )
+        self.auth = {'HTTP_AUTHORIZATION': f'Bearer {RefreshToken.for_user(self.user).access_token}'}
+        self.url = reverse('payment-status', args=[self.order.id])
+
+    def test_returns_current_status_without_waiting(self):
+        response = self.client.get(self.url, **self.auth)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['status'], 'pending')
+
+    def test_long_poll_returns_when_payment_settles(self):
+        cache.set(payment_status_cache_key(self.order.id), {'payment_id': self.payment.id, 'status': 'completed'})
+
+        started = time.monotonic()
+        response = self.client.get(self.url, {'wait': 5}, **self.auth)
+
+        self.assertEqual(response.json()['status'], 'completed')
+        self.assertLess(time.monotonic() - started, 2)
+
+    def test_other_users_order_is_not_found(self):
+        other = get_user_model().objects.create_user(email='other@test.com', password='testpass123')
+        auth = {'HTTP_AUTHORIZATION': f'Bearer {RefreshToken.for_user(other).access_token}'}
+
+        response = self.client.get(self.url, **auth)
+
+        self.assertEqual(response.status_code, 404)
+
+    def test_worker_publishes_settled_status(self):
+        WebhookEvent.objects.create(
+            provider='mpesa', event_id='ws_CO_1', payload=mpesa_callback_body('ws_CO_1')['Body']['stkCallback']
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('process_payment_events', stdout=MagicMock())
+
+        self.assertEqual(
+            cache.get(payment_status_cache_key(self.order.id)), {'payment_id': self.payment.id, 'status': 'completed'}
+        )
+
+
+class ProviderStubHandler(BaseHTTPRequestHandler):
+    """Answers like Stripe's PaymentIntent API and Daraja's STK push query"""
+    intents = {'pi_paid': 'succeeded', 'pi_open': 'requires_payment_method'}
+    stk_results = {
+        'ws_CO_paid': {'ResultCode': '0', 'MpesaReceiptNumber': 'QKL1234567'},
+        'ws_CO_cancelled': {'ResultCode': '1032'},
+    }
+
+    def do_GET(self):
+        intent_id = self.path.rsplit('/', 1)[-1]
+        self.reply({'id': intent_id, 'object': 'payment_intent', 'status': self.intents[intent_id]})
+
+    def do_POST(self):
+        if self.path.endswith('/cancel'):
+            intent_id = self.path.rsplit('/', 2)[-2]
+            self.reply({'id': intent_id, 'object': 'payment_intent', 'status': 'canceled'})
+            return
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        result = self.stk_results.get(body['CheckoutRequestID'])
+        if result is None:
+            self.reply({'errorCode': '500.001.1001', 'errorMessage': 'The transaction is being processed'}, 500)
+        else:
+            self.reply({'ResponseCode': '0', **result})
+
+    def reply(self, data, status=200):
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class ReconcilePaymentsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), ProviderStubHandler)
+        cls.base_url = f'http://127.0.0.1:{cls.server.server_port}'
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        cache.set(MPESA_TOKEN_CACHE_KEY, {'token': 'token-1', 'refresh_at': time.time() + 60}, 60)
+        self.user = get_user_model().objects.create_user(email='buyer@test.com', password='testpass123')
+
+    def create_payment(self, method, **ids):
+        order = Order.objects.create(user=self.user, shipping_address='123 Test St', total_price='1500.00')
+        return Payment.objects.create(user=self.user, order=order, amount=1500, payment_method=method, **ids)
+
+    def test_stale_payments_are_resolved_from_providers(self):
+        paid = self.create_payment('stripe', transaction_id='pi_paid')
+        open_intent = self.create_payment('stripe', transaction_id='pi_open')
+        mpesa_paid = self.create_payment('mpesa', mpesa_checkout_id='ws_CO_paid')
+        cancelled = self.create_payment('mpesa', mpesa_checkout_id='ws_CO_cancelled')
+        processing = self.create_payment('mpesa', mpesa_checkout_id='ws_CO_processing')
+        recent = self.create_payment('mpesa', mpesa_checkout_id='ws_CO_recent')
+        Payment.objects.exclude(id=recent.id).update(created_at=timezone.now() - timedelta(hours=1))
+
+        with override_settings(MPESA_BASE_URL=self.base_url), \
+                patch('stripe.api_base', self.base_url), patch('stripe.api_key', 'sk_test_stub'):
+            call_command('reconcile_payments', '--batch-size', '2', '--workers', '3', stdout=MagicMock())
+
+        statuses = dict(Payment.objects.values_list('id', 'status'))
+        self.assertEqual(statuses[paid.id], 'completed')
+        self.assertEqual(statuses[open_intent.id], 'pending')
+        self.assertEqual(statuses[mpesa_paid.id], 'completed')
+        self.assertEqual(statuses[cancelled.id], 'failed')
+        self.assertEqual(statuses[processing.id], 'pending')
+        self.assertEqual(statuses[recent.id], 'pending')
+        self.assertEqual(Order.objects.get(payments=paid).status, 'PROCESSING')
+        self.assertEqual(Payment.objects.get(id=mpesa_paid.id).transaction_id, 'QKL1234567')
+
+    def test_abandoned_intents_are_cancelled(self):
+        abandoned = self.create_payment('stripe', transaction_id='pi_open')
+        Payment.objects.update(created_at=timezone.now() - timedelta(hours=1))
+
+        with override_settings(MPESA_BASE_URL=self.base_url), \
+                patch('stripe.api_base', self.base_url), patch('stripe.api_key', 'sk_test_stub'):
+            call_command('reconcile_payments', '--cancel-abandoned', stdout=MagicMock())
+
+        # The order can be paid again instead of answering 409
+        self.assertEqual(Payment.objects.get(id=abandoned.id).status, 'failed')
+        self.assertFalse(Payment.objects.filter(order=abandoned.order, status='pending').exists())
@@ -1,9 +1,13 @@
 from django.urls import path
 from .views import StripePaymentView, MpesaPaymentView, mpesa_callback, stripe_webhook
+from . import async_views
 
 urlpatterns = [
     path("stripe/", StripePaymentView.as_view(), name="stripe-payment"),
     path("mpesa/", MpesaPaymentView.as_view(), name="mpesa-payment"),
+    path("stripe/async/", async_views.stripe_payment, name="stripe-payment-async"),
+    path("mpesa/async/", async_views.mpesa_payment, name="mpesa-payment-async"),
+    path("orders/<int:order_id>/status/", async_views.payment_status, name="payment-status"),
     path("mpesa/callback/", mpesa_callback, name="mpesa_callback"),
     path("stripe/webhook/", stripe_webhook, name="stripe-webhook"),
 ]
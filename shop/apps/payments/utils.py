@@ -0,0 +1,235 @@
+import base64
+import datetime
+import logging
+import time
+import requests
+import stripe
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from ..common import http
+from .models import Payment
+from ..orders.models import Order
+from ..salesanalysis.events import record_status_changes
+
+stripe.api_key = settings.STRIPE_SECRET_KEY
+stripe.api_base = settings.STRIPE_API_BASE
+# Reuse pooled keep-alive connections to Stripe; the SDK retries with idempotency keys itself
+stripe.default_http_client = stripe.RequestsClient(
+    timeout=settings.OUTBOUND_HTTP_TIMEOUT,
+    session=http.get_session(stripe.api_base),
+    # Used by the *_async calls in async_views
+    async_fallback_client=stripe.HTTPXClient(timeout=http.httpx_timeout()),
+)
+stripe.max_network_retries = settings.OUTBOUND_HTTP_RETRIES
+
+logger = logging.getLogger(__name__)
+
+MPESA_TOKEN_CACHE_KEY = 'mpesa:access-token'
+MPESA_TOKEN_LOCK_KEY = 'mpesa:access-token:lock'
+# Refresh this long before Daraja's expires_in so no request ever sees an expired token
+MPESA_TOKEN_REFRESH_MARGIN = 300
+# Hard cache expiry margin; after this the token is not trusted at all
+MPESA_TOKEN_EXPIRY_MARGIN = 30
+MPESA_TOKEN_LOCK_TIMEOUT = 10
+PAYMENT_STATUS_CACHE_TTL = 600
+
+
+def get_mpesa_access_token():
+    """
+    Return a Daraja OAuth token from the shared cache, fetching a new one only
+    when needed. A cache lock makes sure a single process refreshes at a time;
+    while a refresh is in flight everyone else keeps using the current token,
+    or waits briefly for the new one if there is none yet.
+    """
+    cached = cache.get(MPESA_TOKEN_CACHE_KEY)
+    if cached and time.time() < cached['refresh_at']:
+        return cached['token']
+
+    if cache.add(MPESA_TOKEN_LOCK_KEY, True, MPESA_TOKEN_LOCK_TIMEOUT):
+        try:
+            return _refresh_mpesa_access_token() or (cached and cached['token'])
+        finally:
+            cache.delete(MPESA_TOKEN_LOCK_KEY)
+
+    # Another process is refreshing; the old token is still valid until its hard expiry
+    if cached:
+        return cached['token']
+
+    deadline = time.monotonic() + MPESA_TOKEN_LOCK_TIMEOUT
+    while time.monotonic() < deadline:
+        time.sleep(0.1)
+        cached = cache.get(MPESA_TOKEN_CACHE_KEY)
+        if cached:
+            return cached['token']
+    return None
+
+
+def _refresh_mpesa_access_token():
+    auth_url = f"{settings.MPESA_BASE_URL}/oauth/v1/generate?grant_type=client_credentials"
+    try:
+        response = http.get(auth_url, auth=(settings.MPESA_CONSUMER_KEY, settings.MPESA_CONSUMER_SECRET))
+        data = response.json()
+    except (requests.RequestException, ValueError) as e:
+        logger.error(f"M-Pesa access token request failed: {e}")
+        return None
+
+    token = data.get("access_token")
+    if not token:
+        logger.error(f"M-Pesa access token response had no token: {data}")
+        return None
+
+    expires_in = int(data.get("expires_in", 3599))
+    cache.set(
+        MPESA_TOKEN_CACHE_KEY,
+        {'token': token, 'refresh_at': time.time() + max(expires_in - MPESA_TOKEN_REFRESH_MARGIN, 0)},
+        max(expires_in - MPESA_TOKEN_EXPIRY_MARGIN, 1),
+    )
+    return token
+
+
+def _stk_password():
+    timestamp = datetime.datetime.now().strftime("%Y%m%d%H%M%S")
+    password = base64.b64encode(f"{settings.MPESA_SHORTCODE}{settings.MPESA_PASSKEY}{timestamp}".encode()).decode()
+    return password, timestamp
+
+
+def build_stk_push_payload(order_id, phone, amount):
+    """Daraja STK push request body for an order"""
+    password, timestamp = _stk_password()
+
+    return {
+        "BusinessShortCode": settings.MPESA_SHORTCODE,
+        "Password": password,
+        "Timestamp": timestamp,
+        "TransactionType": "CustomerPayBillOnline",
+        "Amount": int(amount),
+        "PartyA": phone,
+        "PartyB": settings.MPESA_SHORTCODE,
+        "PhoneNumber": phone,
+        "CallBackURL": "https://a203-105-163-0-243.ngrok-free.app/payments/mpesa/callback/",
+        "AccountReference": f"Order_{order_id}",
+        "TransactionDesc": f"Payment for order {order_id}",
+    }
+
+
+def build_stk_query_payload(checkout_request_id):
+    """Daraja STK push query request body for a CheckoutRequestID"""
+    password, timestamp = _stk_password()
+
+    return {
+        "BusinessShortCode": settings.MPESA_SHORTCODE,
+        "Password": password,
+        "Timestamp": timestamp,
+        "CheckoutRequestID": checkout_request_id,
+    }
+
+
+def payment_status_cache_key(order_id):
+    return f'payment-status:order:{order_id}'
+
+
+def publish_payment_statuses(payments):
+    """
+    Announce settled payments to long-polling status requests once the
+    current transaction commits.
+    """
+    statuses = {
+        payment_status_cache_key(payment.order_id): {'payment_id': payment.id, 'status': payment.status}
+        for payment in payments
+    }
+    if statuses:
+        transaction.on_commit(lambda: cache.set_many(statuses, PAYMENT_STATUS_CACHE_TTL))
+
+
+def _mpesa_receipt_number(stk_callback):
+    metadata = stk_callback.get("CallbackMetadata", {}).get("Item", [])
+    return next((item.get('Value') for item in metadata if item.get('Name') == 'MpesaReceiptNumber'), None)
+
+
+def settle_payments(outcomes):
+    """
+    Record the final outcome of pending payments and mark paid orders as
+    PROCESSING. ``outcomes`` holds (payment, succeeded, receipt_number)
+    tuples for payments locked with select_for_update and select_related
+    order. Payments that are no longer pending are left alone, so a late or
+    repeated outcome is a no-op. Returns the payments that changed.
+    """
+    now = timezone.now()
+    changed_payments = []
+    changed_orders = []
+    for payment, succeeded, receipt_number in outcomes:
+        order = payment.order
+        if payment.status != 'pending':
+            logger.info(f"Outcome for already settled payment {payment.id} ignored.")
+            continue
+
+        if not succeeded:
+            payment.status = 'failed'
+        elif order.status != 'PENDING':
+            logger.info(f"Payment {payment.id} for already processed order {order.id} ignored.")
+            continue
+        else:
+            payment.status = 'completed'
+            if receipt_number:
+                # The M-Pesa receipt number is the final transaction ID
+                payment.transaction_id = receipt_number
+            order.status = 'PROCESSING'
+            order.updated_at = now
+            changed_orders.append(order)
+
+        payment.updated_at = now
+        changed_payments.append(payment)
+
+    Payment.objects.bulk_update(changed_payments, ['status', 'transaction_id', 'updated_at'])
+    Order.objects.bulk_update(changed_orders, ['status', 'updated_at'])
+    record_status_changes([(order, 'PENDING') for order in changed_orders])
+    publish_payment_statuses(changed_payments)
+    return changed_payments
+
+
+def apply_webhook_events(events):
+    """
+    Apply a batch of webhook events to their payments and orders. Must run in
+    a transaction: all payments are locked with one query and written back
+    with bulk updates. Returns the ids of events whose payment does not
+    exist (yet), so the caller can retry them.
+    """
+    stripe_events = {}
+    mpesa_events = {}
+    for event in events:
+        if event.provider == 'stripe':
+            if event.event_type == 'payment_intent.succeeded':
+                stripe_events.setdefault(event.payload['data']['object']['id'], event)
+        else:
+            mpesa_events.setdefault(event.event_id, event)
+
+    if not stripe_events and not mpesa_events:
+        return set()
+
+    payments = (
+        Payment.objects.select_for_update()
+        .select_related('order')
+        .filter(Q(transaction_id__in=stripe_events.keys()) | Q(mpesa_checkout_id__in=mpesa_events.keys()))
+    )
+
+    outcomes = []
+    found = set()
+    for payment in payments:
+        if payment.payment_method == 'stripe':
+            event = stripe_events[payment.transaction_id]
+            outcomes.append((payment, True, None))
+        else:
+            event = mpesa_events[payment.mpesa_checkout_id]
+            if event.payload.get("ResultCode") != 0:
+                logger.info(f"M-Pesa payment {payment.id} failed: {event.payload.get('ResultDesc')}")
+            outcomes.append((payment, event.payload.get("ResultCode") == 0, _mpesa_receipt_number(event.payload)))
+        found.add(event.id)
+
+    settle_payments(outcomes)
+
+    return {
+        event.id for event in [*stripe_events.values(), *mpesa_events.values()] if event.id not in found
+    }
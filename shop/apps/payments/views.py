@@ -1,22 +1,20 @@
 import stripe
 import requests
-import base64
-import datetime
 import json
 import logging
 from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.conf import settings
 from django.shortcuts import get_object_or_404
-from django.db import transaction
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework import status
-from .models import Payment
+from .models import Payment, WebhookEvent
+from .utils import get_mpesa_access_token, build_stk_push_payload
 from ..accounts.permissions import IsCustomer
+from ..common import http
 from ..orders.models import Order
 
-stripe.api_key = settings.STRIPE_SECRET_KEY
 logger = logging.getLogger(__name__)
 
 class StripePaymentView(APIView):
@@ -86,37 +84,11 @@ def stripe_webhook(request):
         logger.warning(f"Stripe webhook signature/payload error: {e}")
         return JsonResponse({'error': 'Invalid payload or signature'}, status=400)
 
-    if event['type'] == 'payment_intent.succeeded':
-        payment_intent = event['data']['object']
-        transaction_id = payment_intent.id
-        
-        try:
-            # Use the transaction_id from the intent to find our pending payment
-            with transaction.atomic():
-                payment = Payment.objects.select_for_update().get(transaction_id=transaction_id, status='pending')
-                order = payment.order
-                
-                # Idempotency check: if order is no longer pending, we've likely processed it already.
-                if order.status != 'PENDING':
-                    logger.info(f"Stripe webhook for already processed order {order.id} received.")
-                    return JsonResponse({'status': 'success', 'message': 'Order already processed'})
-
-                # Update statuses
-                payment.status = 'completed'
-                order.status = 'PROCESSING' # Update order status to show it's paid
-                
-                payment.save()
-                order.save()
-
-                # You can send a "payment received" email here
-                # send_payment_confirmation_email(order)
-
-        except Payment.DoesNotExist:
-            logger.error(f"Stripe webhook: Payment with transaction_id {transaction_id} not found.")
-            return JsonResponse({'error': 'Payment record not found'}, status=404)
-        except Exception as e:
-            logger.error(f"Error processing Stripe webhook for {transaction_id}: {e}")
-            return JsonResponse({'error': 'Internal server error'}, status=500)
+    # Persist and acknowledge; process_payment_events applies it to the payment and order
+    WebhookEvent.objects.bulk_create(
+        [WebhookEvent(provider='stripe', event_id=event['id'], event_type=event['type'], payload=json.loads(payload))],
+        ignore_conflicts=True,
+    )
 
     return JsonResponse({'status': 'success'})
 
@@ -124,9 +96,8 @@ class MpesaPaymentView(APIView):
     permission_classes = [IsCustomer]
 
     def get_access_token(self):
-        auth_url = f"{settings.MPESA_BASE_URL}/oauth/v1/generate?grant_type=client_credentials"
-        response = requests.get(auth_url, auth=(settings.MPESA_CONSUMER_KEY, settings.MPESA_CONSUMER_SECRET))
-        return response.json().get("access_token")
+        # Served from the shared cache; Daraja is only called when the token is close to expiring
+        return get_mpesa_access_token()
 
     def post(self, request):
         order_id = request.data.get("order_id")
@@ -155,26 +126,15 @@ class MpesaPaymentView(APIView):
         if not access_token:
             return Response({"error": "Failed to obtain access token"}, status=status.HTTP_400_BAD_REQUEST)
 
-        timestamp = datetime.datetime.now().strftime("%Y%m%d%H%M%S")
-        password = base64.b64encode(f"{settings.MPESA_SHORTCODE}{settings.MPESA_PASSKEY}{timestamp}".encode()).decode()
-
-        payload = {
-            "BusinessShortCode": settings.MPESA_SHORTCODE,
-            "Password": password,
-            "Timestamp": timestamp,
-            "TransactionType": "CustomerPayBillOnline",
-            "Amount": int(amount),
-            "PartyA": phone,
-            "PartyB": settings.MPESA_SHORTCODE,
-            "PhoneNumber": phone,
-            "CallBackURL": "https://a203-105-163-0-243.ngrok-free.app/payments/mpesa/callback/",
-            "AccountReference": f"Order_{order_id}",
-            "TransactionDesc": f"Payment for order {order_id}",
-        }
+        payload = build_stk_push_payload(order_id, phone, amount)
 
         # Send M-Pesa STK Push request
         headers = {"Authorization": f"Bearer {access_token}", "Content-Type": "application/json"}
-        response = requests.post(f"{settings.MPESA_BASE_URL}/mpesa/stkpush/v1/processrequest", json=payload, headers=headers)
+        try:
+            response = http.post(f"{settings.MPESA_BASE_URL}/mpesa/stkpush/v1/processrequest", json=payload, headers=headers)
+        except requests.RequestException as e:
+            logger.error(f"M-Pesa STK push request failed: {e}")
+            return Response({"error": "Payment provider unavailable"}, status=status.HTTP_502_BAD_GATEWAY)
 
         if response.status_code == 200:
             data = response.json()
@@ -196,41 +156,23 @@ class MpesaPaymentView(APIView):
     
 @csrf_exempt
 def mpesa_callback(request):
-    
-    if request.method == "POST":
-        try:
-            data = json.loads(request.body)
-            stk_callback = data.get("Body", {}).get("stkCallback", {})
-            checkout_request_id = stk_callback.get("CheckoutRequestID")
-
-            with transaction.atomic():
-                payment = Payment.objects.select_for_update().get(mpesa_checkout_id=checkout_request_id, status='pending')
-                order = payment.order
-
-                if stk_callback.get("ResultCode") == 0:
-                    if order.status != 'PENDING':
-                        logger.info(f"M-Pesa callback for already processed order {order.id} received.")
-                        return JsonResponse({"ResultCode": 0, "ResultDesc": "Accepted"})
-                    metadata = stk_callback.get("CallbackMetadata", {}).get("Item", [])
-                    receipt_number = next((item['Value'] for item in metadata if item['Name'] == 'MpesaReceiptNumber'), None)
-
-                    payment.status = 'completed'
-                    payment.transaction_id = receipt_number # This is the final transaction ID
-                    order.status = 'PROCESSING'
-                
-                    payment.save()
-                    order.save()
-                else:
-                    payment.status = 'failed'
-                    payment.extra_data = {'error_message': stk_callback.get('ResultDesc')}
-                    payment.save()
-
-            return JsonResponse({"ResultCode": 0, "ResultDesc": "Accepted"})
-        
-        except Payment.DoesNotExist:
-            logger.warning(f"M-Pesa callback for unknown CheckoutRequestID: {checkout_request_id}")
-            return JsonResponse({"ResultCode": 1, "ResultDesc": "No matching transaction found"})
-        
-        except Exception as e:
-            logger.error(f"M-Pesa callback internal error: {e}")
-            return JsonResponse({"ResultCode": 1, "ResultDesc": "Internal Server Error"}, status=500)
+    if request.method != "POST":
+        return JsonResponse({"ResultCode": 1, "ResultDesc": "Method not allowed"}, status=405)
+
+    try:
+        data = json.loads(request.body)
+        stk_callback = data.get("Body", {}).get("stkCallback", {})
+        checkout_request_id = stk_callback.get("CheckoutRequestID")
+    except (ValueError, AttributeError):
+        return JsonResponse({"ResultCode": 1, "ResultDesc": "Invalid payload"}, status=400)
+
+    if not checkout_request_id:
+        return JsonResponse({"ResultCode": 1, "ResultDesc": "Invalid payload"}, status=400)
+
+    # Daraja sends one callback per STK push, so the CheckoutRequestID identifies the event
+    WebhookEvent.objects.bulk_create(
+        [WebhookEvent(provider='mpesa', event_id=checkout_request_id, event_type='stkCallback', payload=stk_callback)],
+        ignore_conflicts=True,
+    )
+
+    return JsonResponse({"ResultCode": 0, "ResultDesc": "Accepted"})
@@ -12,13 +12,13 @@ from .serializers import (
     ProductPagination
 )
 from ..accounts.permissions import IsAdmin, IsCustomer
+from ..common import http
 from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
 import cloudinary
 import cloudinary.uploader
 from django.conf import settings
 import csv
 import json
-import requests
 from io import TextIOWrapper
 from django.db import transaction
 
@@ -199,7 +199,7 @@ class BulkProductImportView(APIView):
     def _validate_image_url(self, url):
         """Validate if the URL points to an image"""
         try:
-            response = requests.head(url, timeout=5)
+            response = http.head(url, timeout=(3.05, 5), allow_redirects=True)
             content_type = response.headers.get('content-type', '')
             return content_type.startswith('image/')
         except:
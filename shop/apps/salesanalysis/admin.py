@@ -3,8 +3,14 @@ from .models import (
     DailySales, 
     ProductPerformance, 
     CategoryPerformance, 
+    PeriodSales,
+    PeriodProductPerformance,
+    PeriodCategoryPerformance,
     CustomerInsight, 
-    SalesReport
+    SalesReport,
+    MetricsWatermark,
+    SalesEvent,
+    MetricsJob
 )
 
 @admin.register(DailySales)
@@ -31,6 +37,29 @@ class CategoryPerformanceAdmin(admin.ModelAdmin):
     date_hierarchy = 'date'
     autocomplete_fields = ('category',)
 
+@admin.register(PeriodSales)
+class PeriodSalesAdmin(admin.ModelAdmin):
+    list_display = ('period', 'start_date', 'end_date', 'total_sales', 'order_count', 'average_order_value', 'new_customers')
+    list_filter = ('period',)
+    date_hierarchy = 'start_date'
+    readonly_fields = ('average_order_value',)
+
+@admin.register(PeriodProductPerformance)
+class PeriodProductPerformanceAdmin(admin.ModelAdmin):
+    list_display = ('period', 'start_date', 'product', 'units_sold', 'revenue')
+    list_filter = ('period', 'product__category')
+    search_fields = ('product__name',)
+    date_hierarchy = 'start_date'
+    autocomplete_fields = ('product',)
+
+@admin.register(PeriodCategoryPerformance)
+class PeriodCategoryPerformanceAdmin(admin.ModelAdmin):
+    list_display = ('period', 'start_date', 'category', 'products_sold', 'revenue')
+    list_filter = ('period', 'category')
+    search_fields = ('category__name',)
+    date_hierarchy = 'start_date'
+    autocomplete_fields = ('category',)
+
 @admin.register(CustomerInsight)
 class CustomerInsightAdmin(admin.ModelAdmin):
     list_display = ('user', 'total_spent', 'orders_count', 'average_order_value', 
@@ -60,4 +89,24 @@ class SalesReportAdmin(admin.ModelAdmin):
         ('Top Performers', {
             'fields': ('top_products', 'top_categories')
         }),
-    )
\ No newline at end of file
+    )
+
+@admin.register(MetricsWatermark)
+class MetricsWatermarkAdmin(admin.ModelAdmin):
+    list_display = ('name', 'order_updated_at', 'order_item_created_at', 'updated_at')
+    readonly_fields = ('updated_at',)
+
+@admin.register(SalesEvent)
+class SalesEventAdmin(admin.ModelAdmin):
+    list_display = ('id', 'event_type', 'order', 'from_status', 'to_status', 'created_at', 'processed_at')
+    list_filter = ('event_type', 'processed_at')
+    search_fields = ('order__id',)
+    raw_id_fields = ('order',)
+    readonly_fields = ('created_at',)
+
+@admin.register(MetricsJob)
+class MetricsJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'job_type', 'start_date', 'end_date', 'status', 'progress', 'requested_by', 'created_at',
+                    'started_at', 'finished_at')
+    list_filter = ('job_type', 'status')
+    readonly_fields = ('created_at', 'started_at', 'finished_at', 'progress', 'error')
@@ -0,0 +1,194 @@
+"""
+Near-real-time sales rollups. Order creation and status changes record a
+SalesEvent in the same transaction; the apply_sales_events worker turns
+batches of events into F() deltas on DailySales, ProductPerformance and
+CategoryPerformance, then recomputes the affected period rollups.
+refresh_sales_metrics remains the source of truth and corrects anything the
+deltas cannot see (e.g. edited or deleted items).
+"""
+from collections import defaultdict
+from decimal import Decimal
+from django.conf import settings
+from django.db.models import Avg, F, Min
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from .models import CategoryPerformance, DailySales, MetricsWatermark, ProductPerformance, SalesEvent
+from .utils import (
+    CENTS, SALES_METRICS_WATERMARK, _average, _date_ranges, bump_rollup_version, sales_metrics_locked,
+    update_period_rollups
+)
+from ..orders.models import Order
+from ..products.models import ProductReview
+
+
+def record_orders_created(orders):
+    """Record a creation event for each new order, after its items exist"""
+    SalesEvent.objects.bulk_create([
+        SalesEvent(
+            event_type='ORDER_CREATED',
+            order=order,
+            to_status=order.status,
+            order_updated_at=order.updated_at,
+        )
+        for order in orders
+    ])
+
+
+def record_status_changes(changes):
+    """
+    Record a status change event for each (order, old_status) pair whose
+    order now has a different status.
+    """
+    SalesEvent.objects.bulk_create([
+        SalesEvent(
+            event_type='STATUS_CHANGED',
+            order=order,
+            from_status=old_status,
+            to_status=order.status,
+            order_updated_at=order.updated_at,
+        )
+        for order, old_status in changes
+        if old_status != order.status
+    ])
+
+
+def _zero_delta():
+    return defaultdict(int)
+
+
+def _order_firsts(orders):
+    """
+    For the users of ``orders``: the id of each user's first order per day
+    and the first day each user ordered at all.
+    """
+    first_order_of_day = {}
+    first_day = {}
+    rows = (
+        Order.objects.filter(user__in={order.user_id for order in orders})
+        .annotate(day=TruncDate('created_at'))
+        .values_list('user', 'day')
+        .annotate(first_id=Min('id'))
+        .order_by()
+    )
+    for user_id, day, first_id in rows:
+        first_order_of_day[(user_id, day)] = first_id
+        if user_id not in first_day or day < first_day[user_id]:
+            first_day[user_id] = day
+    return first_order_of_day, first_day
+
+
+def _apply(model, deltas, fields, now):
+    """Add ``deltas`` ({lookup values: {field: delta}}) to existing rows of ``model`` with one UPDATE per row"""
+    for lookup, delta in deltas.items():
+        model.objects.filter(**dict(zip(fields, lookup))).update(
+            updated_at=now,
+            **{field: F(field) + value for field, value in delta.items() if value},
+        )
+
+
+def apply_sales_events(events):
+    """
+    Apply a batch of sales events to the rollup tables as atomic F()
+    increments. Must run in a transaction. Events for order changes that a
+    refresh_sales_metrics run has already folded in are skipped. Returns the
+    number of events applied, or None without applying anything while a
+    sales metrics update holds sales_metrics_lock().
+    """
+    # Shares the refresh's row lock, so deltas never interleave with a recompute
+    watermark, created = MetricsWatermark.objects.select_for_update().get_or_create(name=SALES_METRICS_WATERMARK)
+    # Checked under the row lock: an update takes the row once after its lock, see sales_metrics_lock()
+    if sales_metrics_locked():
+        return None
+    if watermark.order_updated_at:
+        events = [event for event in events if event.order_updated_at > watermark.order_updated_at]
+    if not events:
+        return 0
+
+    orders = (
+        Order.objects.filter(id__in={event.order_id for event in events})
+        .annotate(day=TruncDate('created_at'))
+        .prefetch_related('items__product')
+        .in_bulk()
+    )
+    first_order_of_day, first_day = _order_firsts(orders.values())
+    revenue_statuses = set(settings.SALES_REVENUE_STATUSES)
+
+    daily = defaultdict(_zero_delta)
+    products = defaultdict(_zero_delta)
+    categories = defaultdict(_zero_delta)
+
+    for event in events:
+        order = orders.get(event.order_id)
+        if order is None:
+            continue
+
+        if event.event_type == 'ORDER_CREATED':
+            delta = daily[(order.day,)]
+            delta['total_sales'] += order.total_price
+            delta['order_count'] += 1
+            if first_order_of_day.get((order.user_id, order.day)) == order.id:
+                delta['unique_customers'] += 1
+                if first_day.get(order.user_id) == order.day:
+                    delta['new_customers'] += 1
+            for item in order.items.all():
+                delta = products[(order.day, item.product_id)]
+                delta['units_sold'] += item.quantity
+                delta['revenue'] += item.quantity * item.price
+            sign = 1 if event.to_status in revenue_statuses else 0
+        else:
+            sign = (event.to_status in revenue_statuses) - (event.from_status in revenue_statuses)
+
+        if sign:
+            for item in order.items.all():
+                if item.product.category_id is None:
+                    continue
+                delta = categories[(order.day, item.product.category_id)]
+                delta['products_sold'] += sign * item.quantity
+                delta['revenue'] += sign * item.quantity * item.price
+
+    now = timezone.now()
+
+    if daily:
+        DailySales.objects.bulk_create([DailySales(date=day) for day, in daily], ignore_conflicts=True)
+        _apply(DailySales, daily, ['date'], now)
+        # Averages follow from the new totals, which only the database knows
+        days = list(DailySales.objects.filter(date__in=[day for day, in daily]))
+        for day in days:
+            day.average_order_value = _average(day.total_sales, day.order_count)
+        DailySales.objects.bulk_update(days, ['average_order_value'])
+
+    if products:
+        ratings = {
+            product_id: Decimal(average_rating).quantize(CENTS)
+            for product_id, average_rating in ProductReview.objects.filter(
+                product__in={product_id for day, product_id in products}
+            ).values('product').annotate(average_rating=Avg('rating')).values_list('product', 'average_rating')
+        }
+        ProductPerformance.objects.bulk_create(
+            [
+                ProductPerformance(date=day, product_id=product_id, average_rating=ratings.get(product_id))
+                for day, product_id in products
+            ],
+            ignore_conflicts=True,
+        )
+        _apply(ProductPerformance, products, ['date', 'product'], now)
+
+    if categories:
+        CategoryPerformance.objects.bulk_create(
+            [CategoryPerformance(date=day, category_id=category_id) for day, category_id in categories],
+            ignore_conflicts=True,
+        )
+        _apply(CategoryPerformance, categories, ['date', 'category'], now)
+        # Categories whose last sale on a day was cancelled drop out, as in a full recompute
+        CategoryPerformance.objects.filter(
+            date__in={day for day, category_id in categories},
+            category__in={category_id for day, category_id in categories},
+            products_sold__lte=0,
+        ).delete()
+
+    # Periods are small sums of daily rows, so they are recomputed rather than patched
+    for start_date, end_date in _date_ranges({day for day, in daily} | {day for day, category_id in categories}):
+        update_period_rollups(start_date, end_date)
+
+    bump_rollup_version()
+    return len(events)
@@ -0,0 +1,92 @@
+"""
+Sales analysis work as background jobs. Report endpoints only read the
+rollups; admins queue a MetricsJob (a date range recomputation or a full
+update_sales_metrics run) and the run_metrics_jobs worker runs it outside
+any request, recording progress as it goes.
+"""
+import logging
+from django.db import transaction
+from django.utils import timezone
+from .models import MetricsJob
+from .utils import (
+    refresh_sales_metrics, sales_metrics_lock, update_category_performance, update_daily_sales, update_period_rollups,
+    update_product_performance, update_sales_metrics
+)
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue_sales_metrics_update(requested_by=None):
+    """
+    Queue an update_sales_metrics run unless one is already queued or
+    running. Returns (job, created).
+    """
+    with transaction.atomic():
+        job = (
+            MetricsJob.objects.select_for_update()
+            .filter(job_type='UPDATE_METRICS', status__in=['QUEUED', 'RUNNING'])
+            .first()
+        )
+        if job:
+            return job, False
+        return MetricsJob.objects.create(job_type='UPDATE_METRICS', requested_by=requested_by), True
+
+
+def claim_metrics_job():
+    """Mark the oldest queued job as running and return it, or None"""
+    with transaction.atomic():
+        # skip_locked lets several workers take jobs without running one twice
+        job = (
+            MetricsJob.objects.select_for_update(skip_locked=True)
+            .filter(status='QUEUED')
+            .order_by('created_at')
+            .first()
+        )
+        if job is None:
+            return None
+        job.status = 'RUNNING'
+        job.started_at = timezone.now()
+        job.save(update_fields=['status', 'started_at'])
+    return job
+
+
+def run_metrics_job(job):
+    """
+    Run a claimed job under sales_metrics_lock(), so it never overlaps
+    another update or a batch of sales event deltas. Progress is committed
+    after every step so it can be polled while the job runs; each step is
+    consistent on its own. While another update holds the lock the job goes
+    back to the queue.
+    """
+    def report_progress(done, total):
+        job.progress = done * 100 // total
+        MetricsJob.objects.filter(pk=job.pk).update(progress=job.progress)
+
+    try:
+        with sales_metrics_lock() as acquired:
+            if not acquired:
+                # Usually the scheduled update_sales_metrics run; the worker retries the job later
+                job.status = 'QUEUED'
+                job.started_at = None
+                job.save(update_fields=['status', 'started_at'])
+                return job
+            if job.job_type == 'UPDATE_METRICS':
+                update_sales_metrics(progress=report_progress)
+            else:
+                # Fold in changes since the watermark first, so events still pending
+                # are skipped afterwards instead of added on top of the recompute
+                refresh_sales_metrics()
+                steps = [
+                    update_daily_sales, update_product_performance, update_category_performance, update_period_rollups
+                ]
+                for done, step in enumerate(steps, 1):
+                    step(job.start_date, job.end_date)
+                    report_progress(done, len(steps))
+    except Exception as e:
+        logger.exception(f'Metrics job {job.id} failed')
+        job.error = str(e)
+
+    job.status = 'FAILED' if job.error else 'SUCCEEDED'
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'progress', 'error', 'finished_at'])
+    return job
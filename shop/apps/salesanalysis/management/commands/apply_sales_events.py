@@ -0,0 +1,54 @@
+import time
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from ...events import apply_sales_events
+from ...models import SalesEvent
+
+
+class Command(BaseCommand):
+    help = 'Applies queued order events to the daily, product and category sales rollups in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Events claimed per batch (default: 500)')
+        parser.add_argument('--loop', action='store_true', help='Keep polling for events instead of exiting when empty')
+        parser.add_argument('--interval', type=float, default=2, help='Seconds to wait between polls with --loop')
+
+    def handle(self, *args, **options):
+        self.options = options
+        applied = claimed_total = 0
+
+        try:
+            while True:
+                batch_applied, claimed = self.process_batch()
+                applied += batch_applied
+                claimed_total += claimed
+
+                if claimed < options['batch_size']:
+                    if not options['loop']:
+                        break
+                    time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Applied {applied} events, {claimed_total - applied} already covered by a refresh'
+        ))
+
+    def process_batch(self):
+        with transaction.atomic():
+            events = list(
+                SalesEvent.objects.select_for_update(skip_locked=True)
+                .filter(processed_at__isnull=True)
+                .order_by('id')[:self.options['batch_size']]
+            )
+            if not events:
+                return 0, 0
+
+            applied = apply_sales_events(events)
+            if applied is None:
+                # A sales metrics update is running; leave the events for afterwards
+                return 0, 0
+            SalesEvent.objects.filter(id__in=[event.id for event in events]).update(processed_at=timezone.now())
+
+        return applied, len(events)
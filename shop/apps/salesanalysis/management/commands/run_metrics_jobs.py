@@ -0,0 +1,39 @@
+import time
+from django.core.management.base import BaseCommand
+from ...jobs import claim_metrics_job, run_metrics_job
+
+
+class Command(BaseCommand):
+    help = 'Runs queued sales rollup recomputation jobs'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Keep polling for jobs instead of exiting when empty')
+        parser.add_argument('--interval', type=float, default=5, help='Seconds to wait between polls with --loop')
+
+    def handle(self, *args, **options):
+        succeeded = failed = deferred = 0
+
+        try:
+            while True:
+                job = claim_metrics_job()
+                if job is None:
+                    if not options['loop']:
+                        break
+                    time.sleep(options['interval'])
+                    continue
+
+                run_metrics_job(job)
+                if job.status == 'QUEUED':
+                    # Another sales metrics update holds the lock; wait for it to finish
+                    deferred += 1
+                    if not options['loop']:
+                        break
+                    time.sleep(options['interval'])
+                elif job.status == 'SUCCEEDED':
+                    succeeded += 1
+                else:
+                    failed += 1
+        except KeyboardInterrupt:
+            pass
+
+        self.stdout.write(self.style.SUCCESS(f'Ran {succeeded} metrics jobs, {failed} failed, {deferred} deferred'))
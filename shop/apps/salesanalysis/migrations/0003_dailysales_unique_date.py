@@ -0,0 +1,30 @@
+# Generated by Django 5.1.6 on 2026-10-19 19:43
+
+from django.db import migrations, models
+
+
+def remove_duplicate_dates(apps, schema_editor):
+    """Keep only the most recently updated DailySales row for each date"""
+    DailySales = apps.get_model('salesanalysis', 'DailySales')
+    seen = set()
+    duplicates = []
+    for pk, date in DailySales.objects.order_by('date', '-updated_at', '-pk').values_list('pk', 'date'):
+        if date in seen:
+            duplicates.append(pk)
+        seen.add(date)
+    DailySales.objects.filter(pk__in=duplicates).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('salesanalysis', '0002_dailysales_categoryperformance_customerinsight_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_dates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='dailysales',
+            constraint=models.UniqueConstraint(fields=('date',), name='unique_daily_sales_date'),
+        ),
+    ]
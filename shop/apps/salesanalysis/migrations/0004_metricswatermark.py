@@ -0,0 +1,27 @@
+# Generated by Django 5.1.6 on 2026-10-19 19:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('salesanalysis', '0003_dailysales_unique_date'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MetricsWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('order_updated_at', models.DateTimeField(blank=True, null=True)),
+                ('order_item_created_at', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Metrics Watermark',
+                'verbose_name_plural': 'Metrics Watermarks',
+            },
+        ),
+    ]
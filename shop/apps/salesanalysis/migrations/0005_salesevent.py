@@ -0,0 +1,34 @@
+# Generated by Django 5.1.6 on 2026-10-19 19:53
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0001_initial'),
+        ('salesanalysis', '0004_metricswatermark'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SalesEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('event_type', models.CharField(choices=[('ORDER_CREATED', 'Order Created'), ('STATUS_CHANGED', 'Status Changed')], max_length=20)),
+                ('from_status', models.CharField(blank=True, max_length=20)),
+                ('to_status', models.CharField(max_length=20)),
+                ('order_updated_at', models.DateTimeField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('processed_at', models.DateTimeField(blank=True, null=True)),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sales_events', to='orders.order')),
+            ],
+            options={
+                'verbose_name': 'Sales Event',
+                'verbose_name_plural': 'Sales Events',
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['processed_at', 'id'], name='salesanalys_process_1c5fbf_idx')],
+            },
+        ),
+    ]
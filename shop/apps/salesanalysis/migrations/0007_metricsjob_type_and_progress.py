@@ -0,0 +1,33 @@
+# Generated by Django 5.1.6 on 2026-10-19 20:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('salesanalysis', '0006_metricsjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='metricsjob',
+            name='job_type',
+            field=models.CharField(choices=[('RECOMPUTE', 'Recompute Date Range'), ('UPDATE_METRICS', 'Update Sales Metrics')], default='RECOMPUTE', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='metricsjob',
+            name='progress',
+            field=models.PositiveSmallIntegerField(default=0, help_text="Percentage of the job's steps completed."),
+        ),
+        migrations.AlterField(
+            model_name='metricsjob',
+            name='end_date',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='metricsjob',
+            name='start_date',
+            field=models.DateField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,76 @@
+# Generated by Django 5.1.6 on 2026-10-19 20:06
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0001_initial'),
+        ('salesanalysis', '0007_metricsjob_type_and_progress'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PeriodSales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('WEEK', 'Week'), ('MONTH', 'Month'), ('QUARTER', 'Quarter'), ('YEAR', 'Year')], max_length=10)),
+                ('start_date', models.DateField()),
+                ('end_date', models.DateField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('total_sales', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('order_count', models.IntegerField(default=0)),
+                ('average_order_value', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('new_customers', models.IntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Period Sales',
+                'verbose_name_plural': 'Period Sales',
+                'ordering': ['period', '-start_date'],
+                'unique_together': {('period', 'start_date')},
+            },
+        ),
+        migrations.CreateModel(
+            name='PeriodCategoryPerformance',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('WEEK', 'Week'), ('MONTH', 'Month'), ('QUARTER', 'Quarter'), ('YEAR', 'Year')], max_length=10)),
+                ('start_date', models.DateField()),
+                ('end_date', models.DateField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('products_sold', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='period_performance_metrics', to='products.category')),
+            ],
+            options={
+                'verbose_name': 'Period Category Performance',
+                'verbose_name_plural': 'Period Category Performance',
+                'ordering': ['period', '-start_date', '-revenue'],
+                'unique_together': {('period', 'start_date', 'category')},
+            },
+        ),
+        migrations.CreateModel(
+            name='PeriodProductPerformance',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('WEEK', 'Week'), ('MONTH', 'Month'), ('QUARTER', 'Quarter'), ('YEAR', 'Year')], max_length=10)),
+                ('start_date', models.DateField()),
+                ('end_date', models.DateField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('units_sold', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='period_performance_metrics', to='products.product')),
+            ],
+            options={
+                'verbose_name': 'Period Product Performance',
+                'verbose_name_plural': 'Period Product Performance',
+                'ordering': ['period', '-start_date', '-revenue'],
+                'unique_together': {('period', 'start_date', 'product')},
+            },
+        ),
+    ]
@@ -27,6 +27,9 @@ class DailySales(SalesMetric):
         verbose_name_plural = 'Daily Sales'
         ordering = ['-date']
         get_latest_by = 'date'
+        constraints = [
+            models.UniqueConstraint(fields=['date'], name='unique_daily_sales_date'),
+        ]
 
     def __str__(self):
         return f"Sales for {self.date.strftime('%Y-%m-%d')}"
@@ -62,6 +65,73 @@ class CategoryPerformance(SalesMetric):
     def __str__(self):
         return f"{self.category.name} - {self.date.strftime('%Y-%m-%d')}"
 
+class PeriodMetric(models.Model):
+    """
+    Base model for the week, month, quarter and year rollups, derived from the
+    daily tables (quarters from months, years from quarters)
+    """
+    PERIODS = (
+        ('WEEK', 'Week'),
+        ('MONTH', 'Month'),
+        ('QUARTER', 'Quarter'),
+        ('YEAR', 'Year'),
+    )
+
+    period = models.CharField(max_length=10, choices=PERIODS)
+    start_date = models.DateField()
+    end_date = models.DateField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        abstract = True
+
+class PeriodSales(PeriodMetric):
+    """Sales per period. Unique customers are not additive across days, so only daily rows have them."""
+    total_sales = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    order_count = models.IntegerField(default=0)
+    average_order_value = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    new_customers = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name = 'Period Sales'
+        verbose_name_plural = 'Period Sales'
+        ordering = ['period', '-start_date']
+        unique_together = ['period', 'start_date']
+
+    def __str__(self):
+        return f"{self.get_period_display()} sales from {self.start_date.strftime('%Y-%m-%d')}"
+
+class PeriodProductPerformance(PeriodMetric):
+    """Product performance per period"""
+    product = models.ForeignKey('products.Product', on_delete=models.CASCADE, related_name='period_performance_metrics')
+    units_sold = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        verbose_name = 'Period Product Performance'
+        verbose_name_plural = 'Period Product Performance'
+        ordering = ['period', '-start_date', '-revenue']
+        unique_together = ['period', 'start_date', 'product']
+
+    def __str__(self):
+        return f"{self.product.name} - {self.get_period_display()} from {self.start_date.strftime('%Y-%m-%d')}"
+
+class PeriodCategoryPerformance(PeriodMetric):
+    """Category performance per period"""
+    category = models.ForeignKey('products.Category', on_delete=models.CASCADE, related_name='period_performance_metrics')
+    products_sold = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        verbose_name = 'Period Category Performance'
+        verbose_name_plural = 'Period Category Performance'
+        ordering = ['period', '-start_date', '-revenue']
+        unique_together = ['period', 'start_date', 'category']
+
+    def __str__(self):
+        return f"{self.category.name} - {self.get_period_display()} from {self.start_date.strftime('%Y-%m-%d')}"
+
 class CustomerInsight(models.Model):
     """Customer buying patterns and insights"""
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='sales_insights')
@@ -116,4 +186,94 @@ class SalesReport(models.Model):
         ordering = ['-generated_at']
 
     def __str__(self):
-        return f"{self.get_report_type_display()} Report ({self.start_date} to {self.end_date})"
\ No newline at end of file
+        return f"{self.get_report_type_display()} Report ({self.start_date} to {self.end_date})"
+
+class MetricsWatermark(models.Model):
+    """How far order changes have been folded into the sales metrics"""
+    name = models.CharField(max_length=50, unique=True)
+    order_updated_at = models.DateTimeField(null=True, blank=True)
+    order_item_created_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Metrics Watermark'
+        verbose_name_plural = 'Metrics Watermarks'
+
+    def __str__(self):
+        return f"{self.name} at {self.order_updated_at}"
+
+class SalesEvent(models.Model):
+    """
+    An order creation or status change waiting to be applied to the daily,
+    product and category rollups as deltas by the apply_sales_events worker.
+    Events are written in the same transaction as the change itself.
+    """
+    EVENT_TYPES = (
+        ('ORDER_CREATED', 'Order Created'),
+        ('STATUS_CHANGED', 'Status Changed'),
+    )
+
+    event_type = models.CharField(max_length=20, choices=EVENT_TYPES)
+    order = models.ForeignKey('orders.Order', on_delete=models.CASCADE, related_name='sales_events')
+    from_status = models.CharField(max_length=20, blank=True)
+    to_status = models.CharField(max_length=20)
+    order_updated_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = 'Sales Event'
+        verbose_name_plural = 'Sales Events'
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['processed_at', 'id']),
+        ]
+
+    def __str__(self):
+        return f"{self.get_event_type_display()} for order {self.order_id}"
+
+class MetricsJob(models.Model):
+    """
+    A queued sales analysis job, run by the run_metrics_jobs worker: either a
+    recomputation of the rollups for a date range or a full
+    update_sales_metrics run.
+    """
+    JOB_TYPES = (
+        ('RECOMPUTE', 'Recompute Date Range'),
+        ('UPDATE_METRICS', 'Update Sales Metrics'),
+    )
+    STATUS_CHOICES = (
+        ('QUEUED', 'Queued'),
+        ('RUNNING', 'Running'),
+        ('SUCCEEDED', 'Succeeded'),
+        ('FAILED', 'Failed'),
+    )
+
+    job_type = models.CharField(max_length=20, choices=JOB_TYPES, default='RECOMPUTE')
+    start_date = models.DateField(null=True, blank=True)
+    end_date = models.DateField(null=True, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='QUEUED')
+    progress = models.PositiveSmallIntegerField(default=0, help_text="Percentage of the job's steps completed.")
+    requested_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='metrics_jobs')
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = 'Metrics Job'
+        verbose_name_plural = 'Metrics Jobs'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.get_job_type_display()} job {self.id} ({self.status})"
+
+    @property
+    def duration(self):
+        """Seconds the job ran for, or has been running"""
+        if not self.started_at:
+            return None
+        return ((self.finished_at or timezone.now()) - self.started_at).total_seconds()
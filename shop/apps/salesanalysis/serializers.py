@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from .models import DailySales, ProductPerformance, CategoryPerformance, CustomerInsight, SalesReport
+from .models import DailySales, ProductPerformance, CategoryPerformance, CustomerInsight, SalesReport, MetricsJob
 from ..products.models import Product, Category
 
 class DailySalesSerializer(serializers.ModelSerializer):
@@ -62,4 +62,22 @@ class SalesReportSerializer(serializers.ModelSerializer):
         model = SalesReport
         fields = ('id', 'report_type', 'start_date', 'end_date', 'total_sales', 
                   'total_orders', 'average_order_value', 'top_products', 'top_categories', 
-                  'generated_at')
\ No newline at end of file
+                  'generated_at')
+
+class MetricsJobSerializer(serializers.ModelSerializer):
+    duration = serializers.FloatField(read_only=True)
+
+    class Meta:
+        model = MetricsJob
+        fields = ('id', 'job_type', 'start_date', 'end_date', 'status', 'progress', 'duration', 'error',
+                  'created_at', 'started_at', 'finished_at')
+        read_only_fields = ('id', 'job_type', 'status', 'progress', 'error', 'created_at', 'started_at', 'finished_at')
+        extra_kwargs = {
+            'start_date': {'required': True, 'allow_null': False},
+            'end_date': {'required': True, 'allow_null': False},
+        }
+
+    def validate(self, data):
+        if data['start_date'] > data['end_date']:
+            raise serializers.ValidationError("start_date must not be after end_date")
+        return data
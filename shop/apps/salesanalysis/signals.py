@@ -0,0 +1,15 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .models import CategoryPerformance, DailySales, ProductPerformance
+from .utils import bump_rollup_version
+
+
+@receiver(post_save, sender=DailySales)
+@receiver(post_save, sender=ProductPerformance)
+@receiver(post_save, sender=CategoryPerformance)
+@receiver(post_delete, sender=DailySales)
+@receiver(post_delete, sender=ProductPerformance)
+@receiver(post_delete, sender=CategoryPerformance)
+def invalidate_cached_reports(sender, instance, **kwargs):
+    """Rows edited one at a time (admin, CRUD endpoints) invalidate cached reports too"""
+    bump_rollup_version()
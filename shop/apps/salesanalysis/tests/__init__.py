@@ -1,2 +1,4 @@
 from .test_models import DailySalesModelTest, ProductPerformanceModelTest, CategoryPerformanceModelTest, CustomerInsightModelTest, SalesReportModelTest
-from .test_views import BaseAnalyticsTestCase, DailySalesViewsTestCase, ProductPerformanceViewsTestCase, CategoryPerformanceViewsTestCase, CustomerInsightViewsTestCase, SalesReportViewsTestCase, UpdateSalesMetricsViewTestCase
\ No newline at end of file
+from .test_views import BaseAnalyticsTestCase, DailySalesViewsTestCase, ProductPerformanceViewsTestCase, CategoryPerformanceViewsTestCase, CustomerInsightViewsTestCase, SalesReportViewsTestCase, MetricsJobViewsTestCase, UpdateSalesMetricsViewTestCase
+from .test_utils import UpdateDailySalesTest, UpdateProductPerformanceTest, UpdateCategoryPerformanceTest, UpdateCustomerInsightsTest, RefreshSalesMetricsTest, BackfillSalesMetricsTest, UpdatePeriodRollupsTest
+from .test_events import SalesEventsTest
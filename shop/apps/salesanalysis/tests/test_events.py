@@ -0,0 +1,179 @@
+from django.core.management import call_command
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework import status
+from decimal import Decimal
+from io import StringIO
+from .test_utils import SalesMetricsTestCase
+from ..events import apply_sales_events, record_orders_created, record_status_changes
+from ..models import CategoryPerformance, DailySales, MetricsJob, MetricsWatermark, ProductPerformance, SalesEvent
+from ..utils import refresh_sales_metrics, sales_metrics_lock
+from ...cart.models import Cart, CartItem
+from ...orders.models import OrderItem
+
+
+class SalesEventsTest(SalesMetricsTestCase):
+    def checkout(self, user, items, days_ago=0):
+        """Create a pending order with (product, quantity, price) items the way checkout does"""
+        order = self.create_order(user, sum(quantity * price for product, quantity, price in items), days_ago, 'PENDING')
+        for product, quantity, price in items:
+            OrderItem.objects.create(order=order, product=product, quantity=quantity, price=price)
+        order.refresh_from_db()
+        record_orders_created([order])
+        return order
+
+    def change_status(self, order, new_status):
+        old_status = order.status
+        order.status = new_status
+        order.save()
+        record_status_changes([(order, old_status)])
+
+    def apply_pending(self):
+        return apply_sales_events(list(SalesEvent.objects.filter(processed_at__isnull=True)))
+
+    def test_created_orders_update_daily_and_product_rollups(self):
+        """Test that new orders add their totals, units and customers as deltas."""
+        self.checkout(self.customer1, [(self.product1, 1, 1000), (self.product2, 2, 20)])
+        self.checkout(self.customer1, [(self.product2, 1, 20)])
+        self.checkout(self.customer2, [(self.product2, 3, 20)])
+        self.assertEqual(self.apply_pending(), 3)
+
+        daily = DailySales.objects.get(date=self.today)
+        self.assertEqual(daily.total_sales, Decimal('1120.00'))
+        self.assertEqual(daily.order_count, 3)
+        self.assertEqual(daily.unique_customers, 2)
+        self.assertEqual(daily.new_customers, 2)
+        self.assertEqual(daily.average_order_value, Decimal('373.33'))
+
+        shirts = ProductPerformance.objects.get(date=self.today, product=self.product2)
+        self.assertEqual(shirts.units_sold, 6)
+        self.assertEqual(shirts.revenue, Decimal('120.00'))
+        # Pending orders are not revenue yet
+        self.assertFalse(CategoryPerformance.objects.exists())
+
+    def test_status_changes_move_category_revenue(self):
+        """Test that entering and leaving a revenue status adds and removes category sales."""
+        order = self.checkout(self.customer1, [(self.product1, 1, 1000), (self.product2, 2, 20)])
+        self.apply_pending()
+        SalesEvent.objects.update(processed_at=timezone.now())
+
+        self.change_status(order, 'PROCESSING')
+        self.change_status(order, 'SHIPPED')
+        self.apply_pending()
+        SalesEvent.objects.update(processed_at=timezone.now())
+        clothing = CategoryPerformance.objects.get(date=self.today, category=self.category2)
+        self.assertEqual(clothing.products_sold, 2)
+        self.assertEqual(clothing.revenue, Decimal('40.00'))
+
+        self.change_status(order, 'CANCELLED')
+        self.apply_pending()
+        self.assertFalse(CategoryPerformance.objects.exists())
+
+    def test_deltas_match_full_recompute(self):
+        """Test that applying events gives the same rollups as recomputing from scratch."""
+        first = self.checkout(self.customer1, [(self.product1, 1, 1000)], days_ago=1)
+        self.checkout(self.customer1, [(self.product2, 2, 20)])
+        second = self.checkout(self.customer2, [(self.product2, 1, 20), (self.product1, 1, 1000)])
+        self.change_status(first, 'DELIVERED')
+        self.change_status(second, 'PROCESSING')
+        self.apply_pending()
+
+        def snapshot():
+            return (
+                list(DailySales.objects.order_by('date').values_list(
+                    'date', 'total_sales', 'order_count', 'average_order_value', 'unique_customers', 'new_customers'
+                )),
+                list(ProductPerformance.objects.order_by('date', 'product').values_list(
+                    'date', 'product', 'units_sold', 'revenue'
+                )),
+                list(CategoryPerformance.objects.order_by('date', 'category').values_list(
+                    'date', 'category', 'products_sold', 'revenue'
+                )),
+            )
+
+        from_events = snapshot()
+        call_command('update_sales_metrics', '--full', stdout=StringIO())
+        self.assertEqual(from_events, snapshot())
+
+    def test_events_covered_by_refresh_are_skipped(self):
+        """Test that events for changes a refresh already folded in are not applied twice."""
+        self.checkout(self.customer1, [(self.product1, 1, 1000)])
+        call_command('update_sales_metrics', stdout=StringIO())
+        self.assertIsNotNone(MetricsWatermark.objects.get().order_updated_at)
+
+        self.assertEqual(self.apply_pending(), 0)
+        self.assertEqual(DailySales.objects.get(date=self.today).order_count, 1)
+
+    def test_apply_sales_events_command(self):
+        """Test that the worker applies and marks every pending event."""
+        self.checkout(self.customer1, [(self.product1, 1, 1000)])
+        self.checkout(self.customer2, [(self.product2, 1, 20)])
+
+        out = StringIO()
+        call_command('apply_sales_events', '--batch-size', '1', stdout=out)
+
+        self.assertIn('Applied 2 events', out.getvalue())
+        self.assertFalse(SalesEvent.objects.filter(processed_at__isnull=True).exists())
+        self.assertEqual(DailySales.objects.get(date=self.today).order_count, 2)
+
+    def test_events_wait_for_sales_metrics_update(self):
+        """Test that no deltas are applied while an update holds the sales metrics lock."""
+        self.checkout(self.customer1, [(self.product1, 1, 1000)])
+
+        with sales_metrics_lock():
+            self.assertIsNone(self.apply_pending())
+            call_command('apply_sales_events', stdout=StringIO())
+
+        self.assertFalse(DailySales.objects.exists())
+        self.assertTrue(SalesEvent.objects.filter(processed_at__isnull=True).exists())
+
+        call_command('apply_sales_events', stdout=StringIO())
+        self.assertEqual(DailySales.objects.get(date=self.today).order_count, 1)
+
+    def test_recompute_job_covers_pending_events(self):
+        """Test that events pending when a range job runs are not applied on top of it."""
+        self.checkout(self.customer1, [(self.product1, 1, 1000)])
+        refresh_sales_metrics()
+        SalesEvent.objects.update(processed_at=timezone.now())
+        self.checkout(self.customer2, [(self.product2, 1, 20)])
+
+        MetricsJob.objects.create(start_date=self.today, end_date=self.today)
+        call_command('run_metrics_jobs', stdout=StringIO())
+        self.assertEqual(DailySales.objects.get(date=self.today).order_count, 2)
+
+        call_command('apply_sales_events', stdout=StringIO())
+        self.assertEqual(DailySales.objects.get(date=self.today).order_count, 2)
+
+    def test_order_endpoints_record_events(self):
+        """Test that checkout, admin status updates and customer cancellations record events."""
+        admin = self.customer2.__class__.objects.create_user(
+            email='admin@example.com', password='password', user_type='ADMIN'
+        )
+        order = self.create_order(self.customer1, 1000, days_ago=0, status='PENDING')
+        client = APIClient()
+
+        cart = Cart.objects.create(user=self.customer2)
+        CartItem.objects.create(cart=cart, product=self.product2, quantity=2)
+        client.force_authenticate(user=self.customer2)
+        response = client.post(reverse('order-create'), {'shipping_address': '1 Test St', 'billing_address': '1 Test St'})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        response_order_id = response.data['id']
+
+        client.force_authenticate(user=admin)
+        response = client.put(reverse('order-status-update', kwargs={'pk': order.pk}), {'status': 'PROCESSING'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        other = self.create_order(self.customer1, 20, days_ago=0, status='PENDING')
+        client.force_authenticate(user=self.customer1)
+        response = client.delete(reverse('order-delete', kwargs={'pk': other.pk}))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        self.assertEqual(
+            list(SalesEvent.objects.values_list('order', 'event_type', 'from_status', 'to_status')),
+            [
+                (response_order_id, 'ORDER_CREATED', '', 'PENDING'),
+                (order.pk, 'STATUS_CHANGED', 'PENDING', 'PROCESSING'),
+                (other.pk, 'STATUS_CHANGED', 'PENDING', 'CANCELLED'),
+            ]
+        )
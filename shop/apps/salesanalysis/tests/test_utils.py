@@ -0,0 +1,435 @@
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from django.contrib.auth import get_user_model
+from decimal import Decimal
+from datetime import date, timedelta
+from io import StringIO
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from ..models import (
+    CategoryPerformance, CustomerInsight, DailySales, MetricsWatermark, PeriodCategoryPerformance,
+    PeriodProductPerformance, PeriodSales, ProductPerformance
+)
+from ..utils import (
+    SALES_METRICS_WATERMARK, _recompute_customers, _recompute_dates, _shards, backfill_sales_metrics, period_bounds, refresh_sales_metrics, update_category_performance, update_customer_insights, update_daily_sales,
+    update_period_rollups, update_product_performance
+)
+from ...orders.models import Order, OrderItem
+from ...products.models import Category, Product, ProductReview
+
+User = get_user_model()
+
+
+class SalesMetricsTestCase(TestCase):
+    def setUp(self):
+        self.today = timezone.now().date()
+        self.yesterday = self.today - timedelta(days=1)
+        self.two_days_ago = self.today - timedelta(days=2)
+
+        self.customer1 = User.objects.create_user(email='customer1@example.com', password='password', user_type='CUSTOMER')
+        self.customer2 = User.objects.create_user(email='customer2@example.com', password='password', user_type='CUSTOMER')
+
+        self.category1 = Category.objects.create(name='Electronics', description='Electronic items')
+        self.category2 = Category.objects.create(name='Clothing', description='Apparel items')
+        self.product1 = Product.objects.create(name='Laptop', description='A laptop', price=1000, stock=10, category=self.category1)
+        self.product2 = Product.objects.create(name='T-shirt', description='A t-shirt', price=20, stock=50, category=self.category2)
+
+    def create_order(self, user, total_price, days_ago, status='PROCESSING'):
+        order = Order.objects.create(user=user, total_price=total_price, shipping_address='123 Test St', status=status)
+        # created_at is auto_now_add, so move the order back in time afterwards
+        Order.objects.filter(pk=order.pk).update(created_at=timezone.now() - timedelta(days=days_ago))
+        return order
+
+
+class UpdateDailySalesTest(SalesMetricsTestCase):
+    def setUp(self):
+        super().setUp()
+        self.create_order(self.customer1, 100, days_ago=2)
+        self.create_order(self.customer1, 50, days_ago=1)
+        self.create_order(self.customer1, 30, days_ago=1)
+        self.create_order(self.customer2, 20, days_ago=1)
+
+    def test_metrics_per_day(self):
+        """Test that each day with orders gets its totals and customer counts."""
+        update_daily_sales(self.two_days_ago, self.today)
+
+        first_day = DailySales.objects.get(date=self.two_days_ago)
+        self.assertEqual(first_day.total_sales, Decimal('100.00'))
+        self.assertEqual(first_day.order_count, 1)
+        self.assertEqual(first_day.new_customers, 1)
+
+        second_day = DailySales.objects.get(date=self.yesterday)
+        self.assertEqual(second_day.total_sales, Decimal('100.00'))
+        self.assertEqual(second_day.order_count, 3)
+        self.assertEqual(second_day.average_order_value, Decimal('33.33'))
+        self.assertEqual(second_day.unique_customers, 2)
+        # customer1 bought before, customer2 is new even with the earlier day outside the range
+        self.assertEqual(second_day.new_customers, 1)
+
+        self.assertFalse(DailySales.objects.filter(date=self.today).exists())
+
+    def test_new_customers_ignore_range_start(self):
+        """Test that a customer's earlier orders count even when they fall before the range."""
+        update_daily_sales(self.yesterday, self.yesterday)
+        self.assertEqual(DailySales.objects.get(date=self.yesterday).new_customers, 1)
+
+    def test_recompute_updates_existing_rows(self):
+        """Test that running again updates the existing row instead of adding one."""
+        update_daily_sales(self.two_days_ago, self.today)
+        self.create_order(self.customer2, 80, days_ago=2)
+        update_daily_sales(self.two_days_ago, self.today)
+
+        self.assertEqual(DailySales.objects.filter(date=self.two_days_ago).count(), 1)
+        first_day = DailySales.objects.get(date=self.two_days_ago)
+        self.assertEqual(first_day.total_sales, Decimal('180.00'))
+        self.assertEqual(first_day.new_customers, 2)
+
+
+class UpdateProductPerformanceTest(SalesMetricsTestCase):
+    def setUp(self):
+        super().setUp()
+        order1 = self.create_order(self.customer1, 1020, days_ago=2)
+        OrderItem.objects.create(order=order1, product=self.product1, quantity=1, price=1000)
+        OrderItem.objects.create(order=order1, product=self.product2, quantity=1, price=20)
+        order2 = self.create_order(self.customer2, 75, days_ago=2)
+        OrderItem.objects.create(order=order2, product=self.product2, quantity=3, price=25)
+        order3 = self.create_order(self.customer1, 40, days_ago=1)
+        OrderItem.objects.create(order=order3, product=self.product2, quantity=2, price=20)
+
+        ProductReview.objects.create(product=self.product2, user=self.customer1, rating=4, comment='Good')
+        ProductReview.objects.create(product=self.product2, user=self.customer2, rating=5, comment='Great')
+
+    def test_metrics_per_day_and_product(self):
+        """Test that units and revenue are summed per product and day."""
+        update_product_performance(self.two_days_ago, self.today)
+
+        self.assertEqual(ProductPerformance.objects.count(), 3)
+        laptop = ProductPerformance.objects.get(date=self.two_days_ago, product=self.product1)
+        self.assertEqual(laptop.units_sold, 1)
+        self.assertEqual(laptop.revenue, Decimal('1000.00'))
+        self.assertIsNone(laptop.average_rating)
+
+        shirts = ProductPerformance.objects.get(date=self.two_days_ago, product=self.product2)
+        self.assertEqual(shirts.units_sold, 4)
+        self.assertEqual(shirts.revenue, Decimal('95.00'))
+        self.assertEqual(shirts.average_rating, Decimal('4.50'))
+
+        self.assertEqual(ProductPerformance.objects.get(date=self.yesterday, product=self.product2).units_sold, 2)
+
+    def test_query_count_does_not_depend_on_range(self):
+        """Test that the computation runs a fixed number of queries."""
+        with self.assertNumQueries(3):
+            update_product_performance(self.today - timedelta(days=30), self.today)
+
+    def test_recompute_updates_existing_rows(self):
+        """Test that running again updates rows in place."""
+        update_product_performance(self.two_days_ago, self.today)
+        OrderItem.objects.filter(product=self.product1).update(quantity=5)
+        update_product_performance(self.two_days_ago, self.today)
+
+        self.assertEqual(ProductPerformance.objects.filter(product=self.product1).count(), 1)
+        self.assertEqual(ProductPerformance.objects.get(product=self.product1).units_sold, 5)
+
+
+class UpdateCategoryPerformanceTest(SalesMetricsTestCase):
+    def setUp(self):
+        super().setUp()
+        order1 = self.create_order(self.customer1, 1020, days_ago=2, status='DELIVERED')
+        OrderItem.objects.create(order=order1, product=self.product1, quantity=1, price=1000)
+        OrderItem.objects.create(order=order1, product=self.product2, quantity=1, price=20)
+        order2 = self.create_order(self.customer2, 60, days_ago=2, status='SHIPPED')
+        OrderItem.objects.create(order=order2, product=self.product2, quantity=3, price=20)
+        pending = self.create_order(self.customer2, 2000, days_ago=2, status='PENDING')
+        OrderItem.objects.create(order=pending, product=self.product1, quantity=2, price=1000)
+        cancelled = self.create_order(self.customer1, 40, days_ago=1, status='CANCELLED')
+        OrderItem.objects.create(order=cancelled, product=self.product2, quantity=2, price=20)
+
+    def test_only_revenue_statuses_count(self):
+        """Test that pending and cancelled orders are left out and empty cells get no row."""
+        update_category_performance(self.two_days_ago, self.today)
+
+        self.assertEqual(CategoryPerformance.objects.count(), 2)
+        electronics = CategoryPerformance.objects.get(date=self.two_days_ago, category=self.category1)
+        self.assertEqual(electronics.products_sold, 1)
+        self.assertEqual(electronics.revenue, Decimal('1000.00'))
+        clothing = CategoryPerformance.objects.get(date=self.two_days_ago, category=self.category2)
+        self.assertEqual(clothing.products_sold, 4)
+        self.assertEqual(clothing.revenue, Decimal('80.00'))
+
+    @override_settings(SALES_REVENUE_STATUSES=['DELIVERED'])
+    def test_revenue_statuses_setting(self):
+        """Test that the revenue-counting statuses come from settings."""
+        update_category_performance(self.two_days_ago, self.today)
+        clothing = CategoryPerformance.objects.get(date=self.two_days_ago, category=self.category2)
+        self.assertEqual(clothing.products_sold, 1)
+
+    def test_query_count_does_not_depend_on_range(self):
+        """Test that the computation runs a fixed number of queries."""
+        # Savepoint, grouped read, stale row delete, upsert, release
+        with self.assertNumQueries(5):
+            update_category_performance(self.today - timedelta(days=30), self.today)
+
+    def test_stale_rows_removed(self):
+        """Test that a category left without sales loses its row."""
+        update_category_performance(self.two_days_ago, self.today)
+        Order.objects.filter(status='DELIVERED').update(status='CANCELLED')
+        update_category_performance(self.two_days_ago, self.today)
+
+        self.assertFalse(CategoryPerformance.objects.filter(category=self.category1).exists())
+        self.assertEqual(CategoryPerformance.objects.get(category=self.category2).products_sold, 3)
+
+
+    def test_many_date_category_pairs(self):
+        """Test that more than 1000 (date, category) rows are recomputed without an oversized query."""
+        products = [
+            Product.objects.create(
+                name=f'Product {i}', description='', price=10, stock=10,
+                category=Category.objects.create(name=f'Category {i}', description='')
+            )
+            for i in range(40)
+        ]
+        for days_ago in range(3, 33):
+            order = self.create_order(self.customer1, 400, days_ago=days_ago, status='DELIVERED')
+            OrderItem.objects.bulk_create([
+                OrderItem(order=order, product=product, quantity=1, price=10) for product in products
+            ])
+
+        start_date = self.today - timedelta(days=40)
+        update_category_performance(start_date, self.today)
+        update_category_performance(start_date, self.today)
+
+        self.assertEqual(CategoryPerformance.objects.filter(category__in=[p.category for p in products]).count(), 1200)
+
+
+class UpdateCustomerInsightsTest(SalesMetricsTestCase):
+    def setUp(self):
+        super().setUp()
+        order1 = self.create_order(self.customer1, 1020, days_ago=2)
+        OrderItem.objects.create(order=order1, product=self.product1, quantity=1, price=1000)
+        OrderItem.objects.create(order=order1, product=self.product2, quantity=1, price=20)
+        order2 = self.create_order(self.customer1, 40, days_ago=1)
+        OrderItem.objects.create(order=order2, product=self.product2, quantity=2, price=20)
+        order3 = self.create_order(self.customer2, 1000, days_ago=0)
+        OrderItem.objects.create(order=order3, product=self.product1, quantity=1, price=1000)
+
+        self.customer3 = User.objects.create_user(email='customer3@example.com', password='password', user_type='CUSTOMER')
+
+    def test_insights_per_customer(self):
+        """Test totals, purchase dates and the preferred category per customer."""
+        self.assertEqual(update_customer_insights(), 2)
+
+        insight = CustomerInsight.objects.get(user=self.customer1)
+        self.assertEqual(insight.total_spent, Decimal('1060.00'))
+        self.assertEqual(insight.orders_count, 2)
+        self.assertEqual(insight.average_order_value, Decimal('530.00'))
+        self.assertEqual(insight.first_purchase_date, self.two_days_ago)
+        self.assertEqual(insight.last_purchase_date, self.yesterday)
+        # Three t-shirts beat one laptop
+        self.assertEqual(insight.preferred_category, self.category2)
+
+        self.assertEqual(CustomerInsight.objects.get(user=self.customer2).preferred_category, self.category1)
+        self.assertFalse(CustomerInsight.objects.filter(user=self.customer3).exists())
+
+    def test_chunks(self):
+        """Test that customers are upserted chunk by chunk with a fixed number of queries each."""
+        CustomerInsight.objects.create(user=self.customer2, total_spent=1, orders_count=1)
+        # Two full chunks plus the empty read that ends the loop
+        with self.assertNumQueries(7):
+            update_customer_insights(chunk_size=1)
+
+        self.assertEqual(CustomerInsight.objects.count(), 2)
+        self.assertEqual(CustomerInsight.objects.get(user=self.customer2).total_spent, Decimal('1000.00'))
+
+
+class RefreshSalesMetricsTest(SalesMetricsTestCase):
+    def setUp(self):
+        super().setUp()
+        self.old_order = self.create_order(self.customer1, 1000, days_ago=20)
+        OrderItem.objects.create(order=self.old_order, product=self.product1, quantity=1, price=1000)
+        order = self.create_order(self.customer2, 40, days_ago=1)
+        OrderItem.objects.create(order=order, product=self.product2, quantity=2, price=20)
+
+    def age_watermark(self):
+        """Move the watermark and all orders back so they fall outside the overlap window"""
+        Order.objects.update(updated_at=timezone.now() - timedelta(hours=1))
+        OrderItem.objects.update(created_at=timezone.now() - timedelta(hours=1))
+        MetricsWatermark.objects.update(
+            order_updated_at=timezone.now() - timedelta(minutes=30),
+            order_item_created_at=timezone.now() - timedelta(minutes=30)
+        )
+
+    def test_first_run_processes_all_orders(self):
+        """Test that the first run covers every order and records the watermark."""
+        self.assertEqual(refresh_sales_metrics(), 2)
+
+        self.assertTrue(DailySales.objects.filter(date=self.today - timedelta(days=20)).exists())
+        self.assertTrue(DailySales.objects.filter(date=self.yesterday).exists())
+        self.assertEqual(CustomerInsight.objects.count(), 2)
+        self.assertIsNotNone(MetricsWatermark.objects.get().order_updated_at)
+
+    def test_nothing_changed(self):
+        """Test that a run without changes recomputes nothing."""
+        refresh_sales_metrics()
+        self.age_watermark()
+        # Savepoint, watermark lock, changed order read, release
+        with self.assertNumQueries(4):
+            self.assertEqual(refresh_sales_metrics(), 0)
+
+    def test_only_touched_rows_recomputed(self):
+        """Test that only the dates, products, categories and customers of changed orders are refreshed."""
+        refresh_sales_metrics()
+        self.age_watermark()
+        DailySales.objects.update(total_sales=0)
+        CustomerInsight.objects.update(total_spent=0)
+
+        self.old_order.refresh_from_db()
+        self.old_order.status = 'DELIVERED'
+        self.old_order.save()
+        self.assertEqual(refresh_sales_metrics(), 1)
+
+        old_date = self.today - timedelta(days=20)
+        self.assertEqual(DailySales.objects.get(date=old_date).total_sales, Decimal('1000.00'))
+        self.assertEqual(CategoryPerformance.objects.get(date=old_date).category, self.category1)
+        self.assertEqual(CustomerInsight.objects.get(user=self.customer1).total_spent, Decimal('1000.00'))
+        # Untouched rows keep their (here deliberately wrong) values
+        self.assertEqual(DailySales.objects.get(date=self.yesterday).total_sales, Decimal('0.00'))
+        self.assertEqual(CustomerInsight.objects.get(user=self.customer2).total_spent, Decimal('0.00'))
+
+    def test_new_order_item_recomputed(self):
+        """Test that an item added to an unchanged order is picked up."""
+        refresh_sales_metrics()
+        self.age_watermark()
+
+        OrderItem.objects.create(order=self.old_order, product=self.product2, quantity=4, price=20)
+        self.assertEqual(refresh_sales_metrics(), 1)
+
+        performance = ProductPerformance.objects.get(date=self.today - timedelta(days=20), product=self.product2)
+        self.assertEqual(performance.units_sold, 4)
+
+
+class BackfillSalesMetricsTest(SalesMetricsTestCase):
+    def setUp(self):
+        super().setUp()
+        for days_ago, customer in [(1, self.customer1), (5, self.customer2), (9, self.customer1)]:
+            order = self.create_order(customer, 100, days_ago=days_ago)
+            OrderItem.objects.create(order=order, product=self.product1, quantity=1, price=100)
+
+    def test_shards(self):
+        """Test that shards cover the whole range without overlapping."""
+        self.assertEqual(_shards(1, 10, 3), [(1, 4), (5, 8), (9, 10)])
+        self.assertEqual(_shards(5, 5, 4), [(5, 5)])
+        day = timedelta(days=1)
+        self.assertEqual(
+            _shards(self.today - 3 * day, self.today, 2, day),
+            [(self.today - 3 * day, self.today - 2 * day), (self.today - day, self.today)]
+        )
+
+    def test_sharded_matches_single_pass(self):
+        """Test that recomputing shard by shard gives the same rows as one pass."""
+        start_date = self.today - timedelta(days=10)
+        backfill_sales_metrics(start_date, self.today)
+        expected = list(DailySales.objects.order_by('date').values_list('date', 'total_sales', 'new_customers'))
+        insights = list(CustomerInsight.objects.order_by('user').values_list('user', 'total_spent', 'orders_count'))
+
+        DailySales.objects.all().delete()
+        CustomerInsight.objects.all().delete()
+        for first, last in _shards(start_date, self.today, 3, timedelta(days=1)):
+            _recompute_dates(first, last)
+        user_ids = sorted([self.customer1.id, self.customer2.id])
+        for first, last in _shards(user_ids[0], user_ids[-1], 2):
+            _recompute_customers(first, last)
+
+        self.assertEqual(list(DailySales.objects.order_by('date').values_list('date', 'total_sales', 'new_customers')), expected)
+        self.assertEqual(list(CustomerInsight.objects.order_by('user').values_list('user', 'total_spent', 'orders_count')), insights)
+        self.assertEqual(len(expected), 3)
+
+    def test_command_date_range(self):
+        """Test that --from/--to recompute only the given days."""
+        # Nothing changed since the last refresh
+        MetricsWatermark.objects.create(
+            name=SALES_METRICS_WATERMARK,
+            order_updated_at=timezone.now() + timedelta(hours=1),
+            order_item_created_at=timezone.now() + timedelta(hours=1),
+        )
+        call_command(
+            'update_sales_metrics',
+            '--from', str(self.today - timedelta(days=6)), '--to', str(self.yesterday),
+            stdout=StringIO()
+        )
+        self.assertEqual(
+            set(DailySales.objects.values_list('date', flat=True)),
+            {self.yesterday, self.today - timedelta(days=5)}
+        )
+        self.assertEqual(CustomerInsight.objects.count(), 2)
+
+        with self.assertRaises(CommandError):
+            call_command('update_sales_metrics', '--from', str(self.today), '--to', str(self.yesterday), stdout=StringIO())
+
+    def test_backfill_moves_watermark_forward(self):
+        """Test that changes outside the range are folded in and the watermark moves past them."""
+        backfill_sales_metrics(self.yesterday, self.today)
+
+        self.assertTrue(DailySales.objects.filter(date=self.today - timedelta(days=9)).exists())
+        self.assertEqual(MetricsWatermark.objects.get().order_updated_at, Order.objects.latest('updated_at').updated_at)
+
+
+class UpdatePeriodRollupsTest(SalesMetricsTestCase):
+    def setUp(self):
+        super().setUp()
+        # A week spanning the end of March (Q1) and the start of April (Q2)
+        for day, total, orders in [(date(2026, 3, 30), 100, 2), (date(2026, 3, 31), 50, 1), (date(2026, 4, 1), 30, 3)]:
+            DailySales.objects.create(date=day, total_sales=total, order_count=orders, new_customers=1)
+            ProductPerformance.objects.create(date=day, product=self.product1, units_sold=orders, revenue=total)
+            CategoryPerformance.objects.create(date=day, category=self.category1, products_sold=orders, revenue=total)
+
+    def sales(self, period, start_date):
+        return PeriodSales.objects.get(period=period, start_date=start_date)
+
+    def test_period_bounds(self):
+        """Test the first and last day of each period."""
+        day = date(2026, 11, 18)
+        self.assertEqual(period_bounds('WEEK', day), (date(2026, 11, 16), date(2026, 11, 22)))
+        self.assertEqual(period_bounds('MONTH', day), (date(2026, 11, 1), date(2026, 11, 30)))
+        self.assertEqual(period_bounds('QUARTER', day), (date(2026, 10, 1), date(2026, 12, 31)))
+        self.assertEqual(period_bounds('YEAR', day), (date(2026, 1, 1), date(2026, 12, 31)))
+        self.assertEqual(period_bounds('MONTH', date(2028, 2, 10)), (date(2028, 2, 1), date(2028, 2, 29)))
+
+    def test_rollups_per_period(self):
+        """Test that each period sums the daily rows it contains."""
+        update_period_rollups(date(2026, 3, 31), date(2026, 3, 31))
+
+        week = self.sales('WEEK', date(2026, 3, 30))
+        self.assertEqual(week.end_date, date(2026, 4, 5))
+        self.assertEqual(week.total_sales, Decimal('180.00'))
+        self.assertEqual(week.order_count, 6)
+        self.assertEqual(week.average_order_value, Decimal('30.00'))
+        self.assertEqual(week.new_customers, 3)
+
+        self.assertEqual(self.sales('MONTH', date(2026, 3, 1)).total_sales, Decimal('150.00'))
+        self.assertEqual(self.sales('QUARTER', date(2026, 1, 1)).total_sales, Decimal('150.00'))
+        self.assertEqual(self.sales('YEAR', date(2026, 1, 1)).total_sales, Decimal('150.00'))
+        # April lies outside every month, quarter and year around the range except the week
+        self.assertFalse(PeriodSales.objects.filter(period='MONTH', start_date=date(2026, 4, 1)).exists())
+
+        product = PeriodProductPerformance.objects.get(period='WEEK', product=self.product1)
+        self.assertEqual((product.units_sold, product.revenue), (6, Decimal('180.00')))
+        category = PeriodCategoryPerformance.objects.get(period='QUARTER', category=self.category1)
+        self.assertEqual((category.products_sold, category.revenue), (3, Decimal('150.00')))
+
+    def test_years_from_quarters(self):
+        """Test that a year adds up its quarters."""
+        update_period_rollups(date(2026, 3, 30), date(2026, 4, 1))
+
+        self.assertEqual(self.sales('QUARTER', date(2026, 4, 1)).total_sales, Decimal('30.00'))
+        year = self.sales('YEAR', date(2026, 1, 1))
+        self.assertEqual((year.total_sales, year.order_count), (Decimal('180.00'), 6))
+
+    def test_stale_periods_removed(self):
+        """Test that periods left without daily rows are removed."""
+        update_period_rollups(date(2026, 3, 30), date(2026, 4, 1))
+        DailySales.objects.filter(date=date(2026, 4, 1)).delete()
+        update_period_rollups(date(2026, 4, 1), date(2026, 4, 1))
+
+        self.assertFalse(PeriodSales.objects.filter(start_date=date(2026, 4, 1)).exists())
+        self.assertEqual(self.sales('WEEK', date(2026, 3, 30)).total_sales, Decimal('150.00'))
+        self.assertEqual(self.sales('YEAR', date(2026, 1, 1)).total_sales, Decimal('150.00'))
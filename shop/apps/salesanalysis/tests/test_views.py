@@ -1,5 +1,8 @@
 from django.test import TestCase
 from django.urls import reverse
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
 from django.contrib.auth import get_user_model
 from django.utils import timezone
 from rest_framework.test import APIClient
@@ -8,12 +11,17 @@ from datetime import datetime, timedelta
 import json
 from ...products.models import Product, Category, ProductReview
 from ...orders.models import Order, OrderItem
-from ..models import DailySales, ProductPerformance, CategoryPerformance, CustomerInsight, SalesReport
+from io import StringIO
+from ..models import DailySales, ProductPerformance, CategoryPerformance, CustomerInsight, SalesReport, MetricsJob, PeriodSales
+from ..utils import period_bounds, refresh_sales_metrics, sales_metrics_lock, update_category_performance
 
 User = get_user_model()
 
 class BaseAnalyticsTestCase(TestCase):
     def setUp(self):
+        # Cached reports must not leak between tests
+        cache.clear()
+
         # Create admin user
         self.admin_user = User.objects.create_user(
             email='admin@example.com',
@@ -199,6 +207,32 @@ class DailySalesViewsTestCase(BaseAnalyticsTestCase):
         response = self.client.get(reverse('daily-sales-report'))
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
     
+    def test_daily_sales_report_view_is_read_only_and_cached(self):
+        """Test that the report only reads the rollups and serves repeat requests from the cache"""
+        DailySales.objects.create(date=self.yesterday, total_sales=40, order_count=1, average_order_value=40)
+        self.client.force_authenticate(user=self.admin_user)
+        url = f"{reverse('daily-sales-report')}?start_date={self.start_date_str}&end_date={self.end_date_str}"
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data), 1)
+        # The setUp orders are not folded in by a GET
+        self.assertEqual(DailySales.objects.count(), 1)
+
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertEqual(len(response.data), 1)
+
+    def test_daily_sales_report_view_invalidated_by_rollup_changes(self):
+        """Test that a rollup change serves a fresh report"""
+        self.client.force_authenticate(user=self.admin_user)
+        url = f"{reverse('daily-sales-report')}?start_date={self.start_date_str}&end_date={self.end_date_str}"
+        self.assertEqual(self.client.get(url).data, [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            DailySales.objects.create(date=self.yesterday, total_sales=40, order_count=1, average_order_value=40)
+        self.assertEqual(len(self.client.get(url).data), 1)
+
     def test_daily_sales_report_view_invalid_date_format(self):
         """Test that daily sales report validates date format"""
         self.client.force_authenticate(user=self.admin_user)
@@ -302,18 +336,24 @@ class CategoryPerformanceViewsTestCase(BaseAnalyticsTestCase):
     
     def test_category_performance_report_view(self):
         """Test generating a category performance report"""
+        # Only orders in a revenue-counting status are reported
+        Order.objects.filter(pk=self.order1.pk).update(
+            status='DELIVERED',
+            created_at=timezone.now() - timedelta(days=2)
+        )
+        update_category_performance(self.two_days_ago, self.today)
+
         self.client.force_authenticate(user=self.admin_user)
         url = f"{reverse('category-performance-report')}?start_date={self.start_date_str}&end_date={self.end_date_str}"
         response = self.client.get(url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         
-        # Check that performance data was generated
-        self.assertTrue(
-            CategoryPerformance.objects.filter(
-                date=self.two_days_ago,
-                category=self.category1
-            ).exists()
+        # Only categories with sales are reported
+        self.assertEqual(
+            [(row['date'], row['category']) for row in response.data],
+            [(self.two_days_ago.strftime('%Y-%m-%d'), self.category1.id), (self.two_days_ago.strftime('%Y-%m-%d'), self.category2.id)]
         )
+        self.assertEqual(CategoryPerformance.objects.filter(date=self.today).count(), 0)
 
 
 class CustomerInsightViewsTestCase(BaseAnalyticsTestCase):
@@ -400,6 +440,8 @@ class SalesReportViewsTestCase(BaseAnalyticsTestCase):
     
     def test_sales_report_generator_view(self):
         """Test generating a sales report"""
+        # Categories are ranked over revenue statuses only
+        Order.objects.update(status='DELIVERED')
         self.client.force_authenticate(user=self.admin_user)
         data = {
             'report_type': 'WEEKLY',
@@ -419,6 +461,65 @@ class SalesReportViewsTestCase(BaseAnalyticsTestCase):
         self.assertIn(self.product2, report.top_products.all())
         self.assertIn(self.category1, report.top_categories.all())
         self.assertIn(self.category2, report.top_categories.all())
+
+    def test_sales_report_generator_uses_period_rollups(self):
+        """Test that a report of whole months is answered from the monthly rollups"""
+        # Category rollups only count revenue statuses
+        Order.objects.update(status='DELIVERED')
+        refresh_sales_metrics()
+        month_start, month_end = period_bounds('MONTH', self.today)
+        # Deliberately different from the orders, to tell where the totals came from
+        PeriodSales.objects.filter(period='MONTH').update(total_sales=5000, order_count=4)
+
+        self.client.force_authenticate(user=self.admin_user)
+        data = {
+            'report_type': 'MONTHLY',
+            'start_date': month_start.strftime('%Y-%m-%d'),
+            'end_date': month_end.strftime('%Y-%m-%d')
+        }
+        response = self.client.post(reverse('sales-report-generate'), data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        report = SalesReport.objects.get()
+        self.assertEqual(float(report.total_sales), 5000.00)
+        self.assertEqual(report.total_orders, 4)
+        self.assertIn(self.product1, report.top_products.all())
+        self.assertIn(self.category1, report.top_categories.all())
+
+    def test_sales_report_generator_paths_agree_on_categories(self):
+        """Test that rollups and the order scan rank categories over the same statuses"""
+        # Only the cancelled order sold Electronics
+        Order.objects.filter(pk=self.order1.pk).update(status='CANCELLED')
+        Order.objects.filter(pk=self.order2.pk).update(status='DELIVERED')
+        month_start, month_end = period_bounds('MONTH', self.today)
+        data = {
+            'report_type': 'MONTHLY',
+            'start_date': month_start.strftime('%Y-%m-%d'),
+            'end_date': month_end.strftime('%Y-%m-%d')
+        }
+        self.client.force_authenticate(user=self.admin_user)
+
+        self.client.post(reverse('sales-report-generate'), data, format='json')
+        refresh_sales_metrics()
+        self.client.post(reverse('sales-report-generate'), data, format='json')
+
+        from_orders, from_rollups = SalesReport.objects.order_by('generated_at', 'id')
+        self.assertEqual(set(from_orders.top_categories.all()), {self.category2})
+        self.assertEqual(set(from_rollups.top_categories.all()), {self.category2})
+        self.assertEqual(set(from_orders.top_products.all()), set(from_rollups.top_products.all()))
+
+    def test_sales_report_generator_falls_back_to_orders(self):
+        """Test that a period report without rollups is computed from the orders"""
+        month_start, month_end = period_bounds('MONTH', self.today)
+        self.client.force_authenticate(user=self.admin_user)
+        data = {
+            'report_type': 'MONTHLY',
+            'start_date': month_start.strftime('%Y-%m-%d'),
+            'end_date': month_end.strftime('%Y-%m-%d')
+        }
+        response = self.client.post(reverse('sales-report-generate'), data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(SalesReport.objects.get().total_orders, Order.objects.count())
     
     def test_sales_report_generator_view_missing_params(self):
         """Test that sales report generator requires parameters"""
@@ -444,10 +545,108 @@ class SalesReportViewsTestCase(BaseAnalyticsTestCase):
         self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
 
 
+class MetricsJobViewsTestCase(BaseAnalyticsTestCase):
+    def test_queue_metrics_job(self):
+        """Test that recomputation is queued and run by the worker, not the request"""
+        self.client.force_authenticate(user=self.admin_user)
+        data = {'start_date': self.start_date_str, 'end_date': self.end_date_str}
+        response = self.client.post(reverse('metrics-job-list'), data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response.data['status'], 'QUEUED')
+        self.assertFalse(DailySales.objects.exists())
+
+        call_command('run_metrics_jobs', stdout=StringIO())
+
+        response = self.client.get(reverse('metrics-job-detail', kwargs={'pk': response.data['id']}))
+        self.assertEqual(response.data['status'], 'SUCCEEDED')
+        self.assertIsNotNone(response.data['finished_at'])
+        self.assertTrue(DailySales.objects.filter(date=self.today).exists())
+        self.assertEqual(MetricsJob.objects.get().requested_by, self.admin_user)
+
+    def test_metrics_job_waits_for_lock(self):
+        """Test that a range recomputation never runs alongside another update"""
+        self.client.force_authenticate(user=self.admin_user)
+        data = {'start_date': self.start_date_str, 'end_date': self.end_date_str}
+        job_id = self.client.post(reverse('metrics-job-list'), data, format='json').data['id']
+
+        with sales_metrics_lock():
+            call_command('run_metrics_jobs', stdout=StringIO())
+
+            job = MetricsJob.objects.get(pk=job_id)
+            self.assertEqual(job.status, 'QUEUED')
+            self.assertIsNone(job.started_at)
+            self.assertFalse(DailySales.objects.exists())
+
+        # Retried once the other update is done
+        call_command('run_metrics_jobs', stdout=StringIO())
+        self.assertEqual(MetricsJob.objects.get(pk=job_id).status, 'SUCCEEDED')
+        self.assertTrue(DailySales.objects.exists())
+
+    def test_queue_metrics_job_invalid_range(self):
+        """Test that a range ending before it starts is rejected"""
+        self.client.force_authenticate(user=self.admin_user)
+        data = {'start_date': self.end_date_str, 'end_date': self.start_date_str}
+        response = self.client.post(reverse('metrics-job-list'), data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_metrics_jobs_non_admin(self):
+        """Test that customers cannot queue jobs"""
+        self.client.force_authenticate(user=self.customer)
+        response = self.client.post(reverse('metrics-job-list'), {}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
 class UpdateSalesMetricsViewTestCase(BaseAnalyticsTestCase):
     def test_update_sales_metrics_view(self):
         """Test the update sales metrics view"""
         self.client.force_authenticate(user=self.admin_user)
         response = self.client.post(reverse('update_sales_metrics'))
-        self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(response.data['message'], "Sales metrics update triggered successfully")
\ No newline at end of file
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response.data['message'], "Sales metrics update queued")
+        job = MetricsJob.objects.get(pk=response.data['job_id'])
+        self.assertEqual(job.job_type, 'UPDATE_METRICS')
+        # Nothing runs inside the request
+        self.assertFalse(DailySales.objects.exists())
+
+    def test_update_sales_metrics_view_reuses_pending_job(self):
+        """Test that a second request while an update is queued does not queue another"""
+        self.client.force_authenticate(user=self.admin_user)
+        first = self.client.post(reverse('update_sales_metrics'))
+        second = self.client.post(reverse('update_sales_metrics'))
+        self.assertEqual(second.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(second.data['job_id'], first.data['job_id'])
+        self.assertEqual(second.data['message'], "Sales metrics update already in progress")
+
+    def test_update_sales_metrics_progress_and_duration(self):
+        """Test that the worker runs the update and the view reports progress and duration"""
+        self.client.force_authenticate(user=self.admin_user)
+        job_id = self.client.post(reverse('update_sales_metrics')).data['job_id']
+
+        response = self.client.get(reverse('update_sales_metrics'))
+        self.assertEqual(response.data['current']['id'], job_id)
+        self.assertIsNone(response.data['last_run'])
+
+        call_command('run_metrics_jobs', stdout=StringIO())
+
+        response = self.client.get(reverse('update_sales_metrics'))
+        self.assertIsNone(response.data['current'])
+        self.assertEqual(response.data['last_run']['status'], 'SUCCEEDED')
+        self.assertEqual(response.data['last_run']['progress'], 100)
+        self.assertGreaterEqual(response.data['last_run']['duration'], 0)
+        self.assertTrue(DailySales.objects.filter(date=self.today).exists())
+
+    def test_update_sales_metrics_job_waits_for_lock(self):
+        """Test that a job never runs while another update holds the lock"""
+        self.client.force_authenticate(user=self.admin_user)
+        job_id = self.client.post(reverse('update_sales_metrics')).data['job_id']
+
+        with sales_metrics_lock() as acquired:
+            self.assertTrue(acquired)
+            call_command('run_metrics_jobs', stdout=StringIO())
+            with self.assertRaises(CommandError):
+                call_command('update_sales_metrics', stdout=StringIO())
+
+        job = MetricsJob.objects.get(pk=job_id)
+        self.assertEqual(job.status, 'QUEUED')
+        self.assertEqual(job.error, '')
+        self.assertFalse(DailySales.objects.exists())
\ No newline at end of file
@@ -27,4 +27,8 @@ urlpatterns = [
     path('sales-reports/<int:pk>/', views.SalesReportDetailView.as_view(), name='sales-report-detail'),
     path('sales-reports/generate/', views.SalesReportGeneratorView.as_view(), name='sales-report-generate'),
     path('update-metrics/', views.UpdateSalesMetricsView.as_view(), name='update_sales_metrics'),
+
+    # Rollup recomputation jobs
+    path('metrics-jobs/', views.MetricsJobListView.as_view(), name='metrics-job-list'),
+    path('metrics-jobs/<int:pk>/', views.MetricsJobDetailView.as_view(), name='metrics-job-detail'),
 ]
\ No newline at end of file
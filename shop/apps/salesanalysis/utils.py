@@ -0,0 +1,580 @@
+"""
+Set-based computation of the sales analysis tables. Each function reads a
+date range with grouped queries and writes the results back with a single
+bulk upsert. The report views and the update_sales_metrics command share
+these functions.
+"""
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+import django
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Avg, Count, DecimalField, F, Max, Min, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Trunc, TruncDate
+from django.utils import timezone
+from .models import (
+    CategoryPerformance, CustomerInsight, DailySales, MetricsWatermark, PeriodCategoryPerformance,
+    PeriodProductPerformance, PeriodSales, ProductPerformance
+)
+from ..orders.models import Order, OrderItem
+from ..products.models import ProductReview
+
+CENTS = Decimal('0.01')
+CUSTOMER_INSIGHT_CHUNK_SIZE = 2000
+SALES_METRICS_WATERMARK = 'sales-metrics'
+# Re-read changes this far behind the watermark, so orders committed late by a
+# long transaction (with an older updated_at) are not missed. Recomputing is idempotent.
+WATERMARK_OVERLAP = timedelta(minutes=5)
+ROLLUP_VERSION_CACHE_KEY = 'sales-rollups:version'
+# Key of the Postgres advisory lock serialising update_sales_metrics runs (b'SALE')
+SALES_METRICS_LOCK_ID = 0x53414c45
+SALES_METRICS_LOCK_CACHE_KEY = 'sales-metrics:lock'
+# Cache lock expiry for databases without advisory locks; longer than any run
+SALES_METRICS_LOCK_TIMEOUT = 60 * 60
+# (period, Trunc kind, period rolled up from; None for the daily tables)
+PERIOD_HIERARCHY = [
+    ('WEEK', 'week', None),
+    ('MONTH', 'month', None),
+    ('QUARTER', 'quarter', 'MONTH'),
+    ('YEAR', 'year', 'QUARTER'),
+]
+# Shards per worker process in a parallel backfill; recent dates hold more
+# orders, so smaller shards keep every worker busy until the end
+BACKFILL_SHARDS_PER_WORKER = 4
+
+
+def rollup_version():
+    """Current version of the rollup tables, part of every cached report key"""
+    version = cache.get(ROLLUP_VERSION_CACHE_KEY)
+    if version is None:
+        cache.add(ROLLUP_VERSION_CACHE_KEY, time.time_ns(), None)
+        version = cache.get(ROLLUP_VERSION_CACHE_KEY)
+    return version
+
+
+def bump_rollup_version():
+    """
+    Invalidate every cached report once the current transaction commits. A
+    fresh timestamp rather than an increment, so a version lost from the
+    cache can never come back and match old entries.
+    """
+    transaction.on_commit(lambda: cache.set(ROLLUP_VERSION_CACHE_KEY, time.time_ns(), None))
+
+
+def report_cache_key(report, start_date, end_date):
+    return f'sales-report:{report}:{rollup_version()}:{start_date}:{end_date}'
+
+
+def _wait_for_sales_events():
+    # Delta batches hold the watermark row while they apply; once we get it none
+    # is in flight, and later batches see the lock held and wait (see events.py)
+    with transaction.atomic():
+        MetricsWatermark.objects.select_for_update().get_or_create(name=SALES_METRICS_WATERMARK)
+
+
+@contextmanager
+def sales_metrics_lock():
+    """
+    Try to become the only running sales metrics update. Yields whether the
+    lock was acquired. Uses a session-level Postgres advisory lock, released
+    even if the process dies, and a cache lock on other databases. While the
+    lock is held the apply_sales_events worker adds no deltas, so absolute
+    recomputes never interleave with them.
+    """
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_try_advisory_lock(%s)', [SALES_METRICS_LOCK_ID])
+            acquired = cursor.fetchone()[0]
+        try:
+            if acquired:
+                _wait_for_sales_events()
+            yield acquired
+        finally:
+            if acquired:
+                with connection.cursor() as cursor:
+                    cursor.execute('SELECT pg_advisory_unlock(%s)', [SALES_METRICS_LOCK_ID])
+        return
+
+    acquired = cache.add(SALES_METRICS_LOCK_CACHE_KEY, True, SALES_METRICS_LOCK_TIMEOUT)
+    try:
+        if acquired:
+            _wait_for_sales_events()
+        yield acquired
+    finally:
+        if acquired:
+            cache.delete(SALES_METRICS_LOCK_CACHE_KEY)
+
+
+def sales_metrics_locked():
+    """Whether any process holds sales_metrics_lock()"""
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            # A bigint advisory key shows up split into classid (high) and objid (low 32 bits)
+            cursor.execute(
+                "SELECT EXISTS (SELECT 1 FROM pg_locks WHERE locktype = 'advisory' AND granted "
+                "AND classid = %s AND objid = %s AND objsubid = 1)",
+                [SALES_METRICS_LOCK_ID >> 32, SALES_METRICS_LOCK_ID & 0xFFFFFFFF],
+            )
+            return cursor.fetchone()[0]
+    return cache.get(SALES_METRICS_LOCK_CACHE_KEY) is not None
+
+
+def _line_total():
+    return Sum(F('quantity') * F('price'), output_field=DecimalField(max_digits=12, decimal_places=2))
+
+
+def _average(total, count):
+    return (Decimal(total) / count).quantize(CENTS) if count else Decimal('0.00')
+
+
+def update_daily_sales(start_date, end_date):
+    """Recompute DailySales for every date in the range that has orders"""
+    # Date of each customer's first ever order, as a correlated subquery
+    first_order_date = (
+        Order.objects.filter(user=OuterRef('user'))
+        .order_by('created_at')
+        .annotate(day=TruncDate('created_at'))
+        .values('day')[:1]
+    )
+
+    rows = (
+        Order.objects.filter(created_at__date__gte=start_date, created_at__date__lte=end_date)
+        .annotate(day=TruncDate('created_at'), first_order_date=Subquery(first_order_date))
+        .values('day')
+        .annotate(
+            total_sales=Sum('total_price'),
+            order_count=Count('id'),
+            unique_customers=Count('user', distinct=True),
+            new_customers=Count('user', distinct=True, filter=Q(first_order_date=F('day'))),
+        )
+        .order_by('day')
+    )
+
+    daily_sales = [
+        DailySales(
+            date=row['day'],
+            total_sales=row['total_sales'] or 0,
+            order_count=row['order_count'],
+            average_order_value=_average(row['total_sales'] or 0, row['order_count']),
+            unique_customers=row['unique_customers'],
+            new_customers=row['new_customers'],
+        )
+        for row in rows
+    ]
+
+    DailySales.objects.bulk_create(
+        daily_sales,
+        update_conflicts=True,
+        unique_fields=['date'],
+        update_fields=[
+            'total_sales', 'order_count', 'average_order_value', 'unique_customers', 'new_customers', 'updated_at'
+        ],
+    )
+    bump_rollup_version()
+    return daily_sales
+
+
+def update_product_performance(start_date, end_date, product_ids=None):
+    """
+    Recompute ProductPerformance for every product sold in the date range, or
+    only for ``product_ids`` when given.
+    """
+    items = OrderItem.objects.filter(
+        order__created_at__date__gte=start_date,
+        order__created_at__date__lte=end_date
+    )
+    if product_ids is not None:
+        items = items.filter(product__in=product_ids)
+
+    rows = list(
+        items
+        .annotate(day=TruncDate('order__created_at'))
+        .values('day', 'product')
+        .annotate(units_sold=Sum('quantity'), revenue=_line_total())
+        .order_by('day', 'product')
+    )
+
+    # Ratings don't depend on the day, so fetch them once for every product sold
+    ratings = dict(
+        ProductReview.objects.filter(product__in={row['product'] for row in rows})
+        .values('product')
+        .annotate(average_rating=Avg('rating'))
+        .values_list('product', 'average_rating')
+    )
+
+    product_performance = [
+        ProductPerformance(
+            date=row['day'],
+            product_id=row['product'],
+            units_sold=row['units_sold'] or 0,
+            revenue=row['revenue'] or 0,
+            average_rating=(
+                Decimal(ratings[row['product']]).quantize(CENTS) if row['product'] in ratings else None
+            ),
+        )
+        for row in rows
+    ]
+
+    ProductPerformance.objects.bulk_create(
+        product_performance,
+        update_conflicts=True,
+        unique_fields=['date', 'product'],
+        update_fields=['units_sold', 'revenue', 'average_rating', 'updated_at'],
+    )
+    bump_rollup_version()
+    return product_performance
+
+
+def update_category_performance(start_date, end_date, category_ids=None):
+    """
+    Recompute CategoryPerformance for every category in the date range, or
+    only for ``category_ids`` when given. Only items of orders in
+    SALES_REVENUE_STATUSES count; rows for categories left without sales
+    (e.g. after a cancellation) are removed.
+    """
+    items = OrderItem.objects.filter(
+        order__created_at__date__gte=start_date,
+        order__created_at__date__lte=end_date,
+        order__status__in=settings.SALES_REVENUE_STATUSES,
+        product__category__isnull=False,
+    )
+    existing = CategoryPerformance.objects.filter(date__gte=start_date, date__lte=end_date)
+    if category_ids is not None:
+        items = items.filter(product__category__in=category_ids)
+        existing = existing.filter(category__in=category_ids)
+
+    rows = (
+        items
+        .annotate(day=TruncDate('order__created_at'))
+        .values('day', 'product__category')
+        .annotate(products_sold=Sum('quantity'), revenue=_line_total())
+        .order_by('day', 'product__category')
+    )
+
+    category_performance = [
+        CategoryPerformance(
+            date=row['day'],
+            category_id=row['product__category'],
+            products_sold=row['products_sold'] or 0,
+            revenue=row['revenue'] or 0,
+        )
+        for row in rows
+    ]
+
+    # Replace the range wholesale: excluding every computed (date, category) pair
+    # would put one OR term per row into a single query
+    with transaction.atomic():
+        existing.delete()
+        CategoryPerformance.objects.bulk_create(category_performance)
+    bump_rollup_version()
+    return category_performance
+
+
+def period_bounds(period, day):
+    """First and last day of the week (Monday to Sunday), month, quarter or year containing ``day``"""
+    if period == 'WEEK':
+        start = day - timedelta(days=day.weekday())
+        return start, start + timedelta(days=6)
+    if period == 'MONTH':
+        start, months = day.replace(day=1), 1
+    elif period == 'QUARTER':
+        start, months = day.replace(month=(day.month - 1) // 3 * 3 + 1, day=1), 3
+    else:
+        start, months = day.replace(month=1, day=1), 12
+    month = start.month - 1 + months
+    return start, start.replace(year=start.year + month // 12, month=month % 12 + 1) - timedelta(days=1)
+
+
+def _roll_up(daily_model, period_model, keys, sums, start_date, end_date):
+    """
+    Recompute ``period_model`` for every period overlapping the date range:
+    weeks and months from ``daily_model``, quarters from months and years from
+    quarters. Periods that no longer have any sales are removed.
+    """
+    for period, kind, source in PERIOD_HIERARCHY:
+        first = period_bounds(period, start_date)[0]
+        last = period_bounds(period, end_date)[1]
+        if source is None:
+            rows = daily_model.objects.filter(date__range=(first, last)).annotate(period_start=Trunc('date', kind))
+        else:
+            rows = period_model.objects.filter(period=source, start_date__range=(first, last)).annotate(
+                period_start=Trunc('start_date', kind)
+            )
+        rows = rows.values('period_start', *keys).annotate(**{field: Sum(field) for field in sums}).order_by()
+
+        rollups = []
+        for row in rows:
+            rollup = period_model(
+                period=period,
+                start_date=row['period_start'],
+                end_date=period_bounds(period, row['period_start'])[1],
+                **{f'{key}_id': row[key] for key in keys},
+                **{field: row[field] for field in sums},
+            )
+            if period_model is PeriodSales:
+                rollup.average_order_value = _average(rollup.total_sales, rollup.order_count)
+            rollups.append(rollup)
+
+        with transaction.atomic():
+            period_model.objects.filter(period=period, start_date__range=(first, last)).delete()
+            period_model.objects.bulk_create(rollups)
+
+
+def update_period_rollups(start_date, end_date):
+    """
+    Recompute the week, month, quarter and year rollups of every period
+    overlapping the date range from DailySales, ProductPerformance and
+    CategoryPerformance. Run after the daily tables are up to date; each
+    period reads a few dozen rows at most.
+    """
+    _roll_up(DailySales, PeriodSales, [], ['total_sales', 'order_count', 'new_customers'], start_date, end_date)
+    _roll_up(ProductPerformance, PeriodProductPerformance, ['product'], ['units_sold', 'revenue'], start_date, end_date)
+    _roll_up(
+        CategoryPerformance, PeriodCategoryPerformance, ['category'], ['products_sold', 'revenue'], start_date, end_date
+    )
+    bump_rollup_version()
+
+
+def _preferred_categories(user_ids):
+    """Map each user to the category they bought the most units from"""
+    # One grouped row per (user, category), best first within each user
+    ranked = (
+        OrderItem.objects.filter(order__user__in=user_ids, product__category__isnull=False)
+        .values_list('order__user', 'product__category')
+        .annotate(units=Sum('quantity'))
+        .order_by('order__user', '-units', 'product__category')
+    )
+    preferred = {}
+    for user_id, category_id, units in ranked:
+        preferred.setdefault(user_id, category_id)
+    return preferred
+
+
+def update_customer_insights(user_ids=None, chunk_size=CUSTOMER_INSIGHT_CHUNK_SIZE):
+    """
+    Recompute CustomerInsight for every customer with orders, or only for
+    ``user_ids`` when given. Customers are processed in keyset chunks of
+    ``chunk_size``: one grouped order query, one ranked category query and
+    one bulk upsert per chunk.
+    """
+    orders = Order.objects.filter(user__user_type='CUSTOMER')
+    if user_ids is not None:
+        orders = orders.filter(user__in=user_ids)
+
+    orders = (
+        orders
+        .values('user')
+        .annotate(
+            total_spent=Sum('total_price'),
+            orders_count=Count('id'),
+            first_purchase_date=Min(TruncDate('created_at')),
+            last_purchase_date=Max(TruncDate('created_at')),
+        )
+        .order_by('user')
+    )
+
+    updated = 0
+    last_user_id = 0
+    while True:
+        rows = list(orders.filter(user__gt=last_user_id)[:chunk_size])
+        if not rows:
+            break
+        last_user_id = rows[-1]['user']
+        preferred_categories = _preferred_categories([row['user'] for row in rows])
+
+        CustomerInsight.objects.bulk_create(
+            [
+                CustomerInsight(
+                    user_id=row['user'],
+                    total_spent=row['total_spent'] or 0,
+                    orders_count=row['orders_count'],
+                    average_order_value=_average(row['total_spent'] or 0, row['orders_count']),
+                    first_purchase_date=row['first_purchase_date'],
+                    last_purchase_date=row['last_purchase_date'],
+                    preferred_category_id=preferred_categories.get(row['user']),
+                )
+                for row in rows
+            ],
+            update_conflicts=True,
+            unique_fields=['user'],
+            update_fields=[
+                'total_spent', 'orders_count', 'average_order_value', 'first_purchase_date',
+                'last_purchase_date', 'preferred_category', 'updated_at',
+            ],
+        )
+        updated += len(rows)
+
+    return updated
+
+
+def _date_ranges(dates):
+    """Collapse dates into (start, end) runs of consecutive days"""
+    ranges = []
+    for day in sorted(dates):
+        if ranges and day == ranges[-1][1] + timedelta(days=1):
+            ranges[-1][1] = day
+        else:
+            ranges.append([day, day])
+    return ranges
+
+
+def refresh_sales_metrics(progress=None):
+    """
+    Fold orders created or changed since the last run into the sales analysis
+    tables. Only the dates, products, categories and customers of those
+    orders are recomputed, so frequent runs stay cheap. Changes are found
+    through the high-water marks of Order.updated_at and
+    OrderItem.created_at. ``progress(done, total)`` is called after each
+    step. Returns the number of changed orders.
+    """
+    with transaction.atomic():
+        # The row lock keeps concurrent refreshes from interleaving
+        watermark, created = MetricsWatermark.objects.select_for_update().get_or_create(name=SALES_METRICS_WATERMARK)
+
+        changed_orders = Order.objects.all()
+        if watermark.order_updated_at or watermark.order_item_created_at:
+            changed = Q()
+            if watermark.order_updated_at:
+                changed |= Q(updated_at__gt=watermark.order_updated_at - WATERMARK_OVERLAP)
+            if watermark.order_item_created_at:
+                changed |= Q(id__in=OrderItem.objects.filter(
+                    created_at__gt=watermark.order_item_created_at - WATERMARK_OVERLAP
+                ).values('order'))
+            changed_orders = changed_orders.filter(changed)
+
+        touched = list(
+            changed_orders
+            .annotate(day=TruncDate('created_at'))
+            .values_list(
+                'id', 'day', 'user', 'items__product', 'items__product__category', 'updated_at', 'items__created_at'
+            )
+            .order_by()
+        )
+        if not touched:
+            return 0
+
+        dates = {row[1] for row in touched}
+        user_ids = {row[2] for row in touched}
+        product_ids = {row[3] for row in touched if row[3] is not None}
+        category_ids = {row[4] for row in touched if row[4] is not None}
+
+        ranges = _date_ranges(dates)
+        for done, (start_date, end_date) in enumerate(ranges, 1):
+            update_daily_sales(start_date, end_date)
+            update_product_performance(start_date, end_date, product_ids)
+            update_category_performance(start_date, end_date, category_ids)
+            update_period_rollups(start_date, end_date)
+            if progress:
+                progress(done, len(ranges) + 1)
+        update_customer_insights(user_ids)
+
+        watermark.order_updated_at = max(row[5] for row in touched)
+        watermark.order_item_created_at = max(
+            (row[6] for row in touched if row[6] is not None), default=watermark.order_item_created_at
+        )
+        watermark.save(update_fields=['order_updated_at', 'order_item_created_at', 'updated_at'])
+
+    return len({row[0] for row in touched})
+
+
+def _shards(first, last, count, step=1):
+    """Split ``first``..``last`` (inclusive, dates or ids) into at most ``count`` contiguous (first, last) ranges"""
+    size = -(-((last - first) // step + 1) // count)
+    shards = []
+    while first <= last:
+        shards.append((first, min(first + (size - 1) * step, last)))
+        first += size * step
+    return shards
+
+
+def _recompute_dates(start_date, end_date):
+    update_daily_sales(start_date, end_date)
+    update_product_performance(start_date, end_date)
+    update_category_performance(start_date, end_date)
+
+
+def _recompute_customers(first_user_id, last_user_id):
+    update_customer_insights(get_user_model().objects.filter(id__range=(first_user_id, last_user_id)))
+
+
+def backfill_sales_metrics(start_date, end_date, workers=1, progress=None):
+    """
+    Recompute the sales analysis tables for ``start_date``..``end_date`` and
+    every customer. Callers hold sales_metrics_lock(), which keeps the
+    apply_sales_events worker from adding deltas in the meantime. Changes
+    since the watermark are folded in first, which also moves the watermark
+    forward, so no event from before the backfill is applied on top of it.
+
+    The date range and the customer id space are split into shards; with
+    ``workers`` > 1 the shards run in that many processes. Shards never
+    overlap and every write is an upsert of absolute values, so a failed
+    backfill can simply be rerun. The period rollups are rebuilt last.
+    ``progress(done, total)`` is called after each shard.
+    """
+    refresh_sales_metrics()
+
+    shard_count = workers * BACKFILL_SHARDS_PER_WORKER if workers > 1 else 1
+    customers = Order.objects.filter(user__user_type='CUSTOMER').aggregate(first=Min('user'), last=Max('user'))
+
+    tasks = [
+        (_recompute_dates, first, last)
+        for first, last in _shards(start_date, end_date, shard_count, timedelta(days=1))
+    ]
+    if customers['first'] is not None:
+        tasks += [
+            (_recompute_customers, first, last)
+            for first, last in _shards(customers['first'], customers['last'], shard_count)
+        ]
+
+    if workers <= 1:
+        for done, (task, *args) in enumerate(tasks, 1):
+            task(*args)
+            if progress:
+                progress(done, len(tasks) + 1)
+    else:
+        # spawn rather than fork: a forked worker would share the parent's
+        # connection, which also holds the sales metrics lock
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            # Spawned workers start from a clean interpreter and open their own
+            # database connections; set up Django before any task (and models) is unpickled
+            initializer=django.setup,
+        ) as executor:
+            futures = [executor.submit(*task) for task in tasks]
+            for done, future in enumerate(as_completed(futures), 1):
+                future.result()
+                if progress:
+                    progress(done, len(tasks) + 1)
+
+    # Once every date shard is in; periods can span shards
+    update_period_rollups(start_date, end_date)
+    if progress:
+        progress(len(tasks) + 1, len(tasks) + 1)
+
+
+def update_sales_metrics(full=False, days=30, start_date=None, end_date=None, workers=1, progress=None):
+    """
+    Bring the sales analysis tables up to date: incrementally from the
+    watermark, or with ``full`` by recomputing ``start_date``..``end_date``
+    (default: the last ``days`` days up to today) and every customer over
+    ``workers`` processes. Callers hold sales_metrics_lock().
+    ``progress(done, total)`` is called after each step. Returns the number
+    of changed orders of an incremental run.
+    """
+    if not full:
+        changed = refresh_sales_metrics(progress)
+        if progress:
+            progress(1, 1)
+        return changed
+
+    end_date = end_date or timezone.now().date()
+    start_date = start_date or end_date - timedelta(days=days)
+    backfill_sales_metrics(start_date, end_date, workers, progress)
+    return None
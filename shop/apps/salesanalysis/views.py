@@ -2,18 +2,28 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from ..accounts.permissions import IsAdmin
-from django.db.models import Sum, Avg, F
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Sum, F
 from django.utils import timezone
-from datetime import datetime, timedelta
-from .models import DailySales, ProductPerformance, CategoryPerformance, CustomerInsight, SalesReport
+from datetime import datetime
+from .models import (
+    DailySales, ProductPerformance, CategoryPerformance, CustomerInsight, SalesReport, MetricsJob, PeriodSales,
+    PeriodProductPerformance, PeriodCategoryPerformance
+)
 from .serializers import (
     DailySalesSerializer, ProductPerformanceSerializer, CategoryPerformanceSerializer,
-    CustomerInsightSerializer, SalesReportSerializer
+    CustomerInsightSerializer, SalesReportSerializer, MetricsJobSerializer
 )
+from .jobs import enqueue_sales_metrics_update
+from .utils import period_bounds, report_cache_key, update_customer_insights
 
 from ..products.models import Product, Category
 from ..orders.models import Order, OrderItem
 
+# Report types answered from the period rollups
+REPORT_PERIODS = {'WEEKLY': 'WEEK', 'MONTHLY': 'MONTH', 'QUARTERLY': 'QUARTER', 'YEARLY': 'YEAR'}
+
 class DailySalesListView(APIView):
     permission_classes = [IsAdmin]
     
@@ -68,7 +78,7 @@ class DailySalesReportView(APIView):
     permission_classes = [IsAdmin]
     
     def get(self, request):
-        """Generate daily sales report for the given date range"""
+        """Daily sales report for the given date range, read from the rollups"""
         start_date = request.query_params.get('start_date')
         end_date = request.query_params.get('end_date')
         
@@ -87,55 +97,17 @@ class DailySalesReportView(APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
             
-        # Get orders in the date range
-        orders = Order.objects.filter(
-            created_at__date__gte=start_date,
-            created_at__date__lte=end_date
-        )
-        
-        # Get or create DailySales objects for each date in the range
-        delta = end_date - start_date
-        for i in range(delta.days + 1):
-            current_date = start_date + timedelta(days=i)
-            daily_orders = orders.filter(created_at__date=current_date)
-            
-            if daily_orders.exists():
-                # Calculate metrics
-                total_sales = daily_orders.aggregate(Sum('total_price'))['total_price__sum'] or 0
-                order_count = daily_orders.count()
-                average_order_value = total_sales / order_count if order_count > 0 else 0
-                unique_customers = daily_orders.values('user').distinct().count()
-                
-                # Count new customers (first purchase on this date)
-                new_customers = 0
-                for order in daily_orders:
-                    user_previous_orders = Order.objects.filter(
-                        user=order.user,
-                        created_at__date__lt=current_date
-                    ).exists()
-                    if not user_previous_orders:
-                        new_customers += 1
-                
-                # Create or update DailySales
-                daily_sales, created = DailySales.objects.update_or_create(
-                    date=current_date,
-                    defaults={
-                        'total_sales': total_sales,
-                        'order_count': order_count,
-                        'average_order_value': average_order_value,
-                        'unique_customers': unique_customers,
-                        'new_customers': new_customers
-                    }
-                )
-        
-        # Return the generated data
-        daily_sales_data = DailySales.objects.filter(
-            date__gte=start_date,
-            date__lte=end_date
-        ).order_by('date')
-        
-        serializer = DailySalesSerializer(daily_sales_data, many=True)
-        return Response(serializer.data)
+        # Rollups are maintained by the sales events worker and metrics jobs; this only reads them
+        cache_key = report_cache_key('daily-sales', start_date, end_date)
+        data = cache.get(cache_key)
+        if data is None:
+            daily_sales_data = DailySales.objects.filter(
+                date__gte=start_date,
+                date__lte=end_date
+            ).order_by('date')
+            data = DailySalesSerializer(daily_sales_data, many=True).data
+            cache.set(cache_key, data, settings.SALES_REPORT_CACHE_TTL)
+        return Response(data)
 
 
 class ProductPerformanceListView(APIView):
@@ -192,7 +164,7 @@ class ProductPerformanceReportView(APIView):
     permission_classes = [IsAdmin]
     
     def get(self, request):
-        """Generate product performance report for the given date range"""
+        """Product performance report for the given date range, read from the rollups"""
         start_date = request.query_params.get('start_date')
         end_date = request.query_params.get('end_date')
         
@@ -211,56 +183,16 @@ class ProductPerformanceReportView(APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Get all products
-        products = Product.objects.all()
-        
-        # Get order items in the date range
-        order_items = OrderItem.objects.filter(
-            order__created_at__date__gte=start_date,
-            order__created_at__date__lte=end_date
-        )
-        
-        # Process each day in the range
-        delta = end_date - start_date
-        for i in range(delta.days + 1):
-            current_date = start_date + timedelta(days=i)
-            
-            # Process each product
-            for product in products:
-                # Get order items for this product on this date
-                product_items = order_items.filter(
-                    product=product,
-                    order__created_at__date=current_date
-                )
-                
-                if product_items.exists():
-                    units_sold = product_items.aggregate(Sum('quantity'))['quantity__sum'] or 0
-                    revenue = sum(item.quantity * item.price for item in product_items)
-                    
-                    # Calculate average rating
-                    from ..products.models import ProductReview
-                    reviews = ProductReview.objects.filter(product=product)
-                    avg_rating = reviews.aggregate(Avg('rating'))['rating__avg'] if reviews.exists() else None
-                    
-                    # Create or update ProductPerformance
-                    performance, created = ProductPerformance.objects.update_or_create(
-                        date=current_date,
-                        product=product,
-                        defaults={
-                            'units_sold': units_sold,
-                            'revenue': revenue,
-                            'average_rating': avg_rating
-                        }
-                    )
-        
-        # Return the generated data
-        product_performance_data = ProductPerformance.objects.filter(
-            date__gte=start_date,
-            date__lte=end_date
-        ).order_by('date', '-revenue')
-        
-        serializer = ProductPerformanceSerializer(product_performance_data, many=True)
-        return Response(serializer.data)
+        cache_key = report_cache_key('product-performance', start_date, end_date)
+        data = cache.get(cache_key)
+        if data is None:
+            product_performance_data = ProductPerformance.objects.filter(
+                date__gte=start_date,
+                date__lte=end_date
+            ).select_related('product__category').order_by('date', '-revenue')
+            data = ProductPerformanceSerializer(product_performance_data, many=True).data
+            cache.set(cache_key, data, settings.SALES_REPORT_CACHE_TTL)
+        return Response(data)
 
 
 class CategoryPerformanceListView(APIView):
@@ -317,7 +249,7 @@ class CategoryPerformanceReportView(APIView):
     permission_classes = [IsAdmin]
     
     def get(self, request):
-        """Generate category performance report for the given date range"""
+        """Category performance report for the given date range, read from the rollups"""
         start_date = request.query_params.get('start_date')
         end_date = request.query_params.get('end_date')
         
@@ -336,46 +268,16 @@ class CategoryPerformanceReportView(APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Get all categories
-        categories = Category.objects.all()
-        
-        # Process each day in the range
-        delta = end_date - start_date
-        for i in range(delta.days + 1):
-            current_date = start_date + timedelta(days=i)
-            
-            # Process each category
-            for category in categories:
-                # Get order items for products in this category on this date
-                category_items = OrderItem.objects.filter(
-                    product__category=category,
-                    order__created_at__date=current_date,
-                    order__status__in=['completed', 'processing']  # Only count valid orders
-                )
-                
-                # Calculate metrics even if no items exist for this category/date
-                products_sold = category_items.aggregate(Sum('quantity'))['quantity__sum'] or 0
-                revenue = sum(item.quantity * item.price for item in category_items) if category_items.exists() else 0
-                
-                # Always create the CategoryPerformance object
-                # This ensures records exist even for categories with no sales
-                performance, created = CategoryPerformance.objects.update_or_create(
-                    date=current_date,
-                    category=category,
-                    defaults={
-                        'products_sold': products_sold,
-                        'revenue': revenue
-                    }
-                )
-        
-        # Return the generated data
-        category_performance_data = CategoryPerformance.objects.filter(
-            date__gte=start_date,
-            date__lte=end_date
-        ).order_by('date', '-revenue')
-        
-        serializer = CategoryPerformanceSerializer(category_performance_data, many=True)
-        return Response(serializer.data)
+        cache_key = report_cache_key('category-performance', start_date, end_date)
+        data = cache.get(cache_key)
+        if data is None:
+            category_performance_data = CategoryPerformance.objects.filter(
+                date__gte=start_date,
+                date__lte=end_date
+            ).select_related('category').order_by('date', '-revenue')
+            data = CategoryPerformanceSerializer(category_performance_data, many=True).data
+            cache.set(cache_key, data, settings.SALES_REPORT_CACHE_TTL)
+        return Response(data)
 
 
 class CustomerInsightListView(APIView):
@@ -433,60 +335,7 @@ class CustomerInsightGeneratorView(APIView):
     
     def get(self, request):
         """Generate customer insights for all users"""
-        from django.contrib.auth import get_user_model
-        User = get_user_model()
-        
-        # Get all users
-        users = User.objects.filter(user_type='CUSTOMER')
-        
-        for user in users:
-            # Get all orders for this user
-            user_orders = Order.objects.filter(user=user)
-            
-            if user_orders.exists():
-                # Calculate metrics
-                total_spent = user_orders.aggregate(Sum('total_price'))['total_price__sum'] or 0
-                orders_count = user_orders.count()
-                average_order_value = total_spent / orders_count if orders_count > 0 else 0
-                
-                # Get first and last purchase dates
-                first_purchase = user_orders.order_by('created_at').first()
-                last_purchase = user_orders.order_by('-created_at').first()
-                
-                first_purchase_date = first_purchase.created_at.date() if first_purchase else None
-                last_purchase_date = last_purchase.created_at.date() if last_purchase else None
-                
-                # Find preferred category
-                order_items = OrderItem.objects.filter(order__user=user)
-                category_counts = {}
-                
-                for item in order_items:
-                    category = item.product.category
-                    if category in category_counts:
-                        category_counts[category] += item.quantity
-                    else:
-                        category_counts[category] = item.quantity
-                
-                preferred_category = None
-                max_count = 0
-                
-                for category, count in category_counts.items():
-                    if count > max_count:
-                        max_count = count
-                        preferred_category = category
-                
-                # Create or update CustomerInsight
-                insight, created = CustomerInsight.objects.update_or_create(
-                    user=user,
-                    defaults={
-                        'total_spent': total_spent,
-                        'orders_count': orders_count,
-                        'average_order_value': average_order_value,
-                        'first_purchase_date': first_purchase_date,
-                        'last_purchase_date': last_purchase_date,
-                        'preferred_category': preferred_category
-                    }
-                )
+        update_customer_insights()
         
         # Return the generated data
         customer_insights = CustomerInsight.objects.all().order_by('-total_spent')
@@ -568,22 +417,81 @@ class SalesReportGeneratorView(APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Get orders in the date range
+        totals = self.totals_from_rollups(report_type, start_date, end_date)
+        if totals is None:
+            totals = self.totals_from_orders(start_date, end_date)
+        if totals is None:
+            return Response(
+                {"error": "No orders found in the specified date range"},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        total_sales, total_orders, top_products, top_categories = totals
+        average_order_value = total_sales / total_orders if total_orders > 0 else 0
+        
+        # Create a new SalesReport
+        report = SalesReport.objects.create(
+            report_type=report_type,
+            start_date=start_date,
+            end_date=end_date,
+            total_sales=total_sales,
+            total_orders=total_orders,
+            average_order_value=average_order_value
+        )
+        
+        # Add top products and categories
+        report.top_products.set(top_products)
+        report.top_categories.set(top_categories)
+        
+        serializer = SalesReportSerializer(report)
+        return Response(serializer.data)
+
+    def totals_from_rollups(self, report_type, start_date, end_date):
+        """
+        Totals and top products and categories from the period rollups, when
+        the range is made of whole periods of the report type and the rollups
+        have rows for it. Otherwise None.
+        """
+        period = REPORT_PERIODS.get(report_type)
+        if (
+            period is None
+            or period_bounds(period, start_date)[0] != start_date
+            or period_bounds(period, end_date)[1] != end_date
+        ):
+            return None
+
+        in_range = {'period': period, 'start_date__gte': start_date, 'start_date__lte': end_date}
+        sales = PeriodSales.objects.filter(**in_range).aggregate(
+            total_sales=Sum('total_sales'), total_orders=Sum('order_count')
+        )
+        if not sales['total_orders']:
+            return None
+
+        top_products_data = PeriodProductPerformance.objects.filter(**in_range).values('product').annotate(
+            total_revenue=Sum('revenue')
+        ).order_by('-total_revenue')[:5]
+        top_categories_data = PeriodCategoryPerformance.objects.filter(**in_range).values('category').annotate(
+            total_revenue=Sum('revenue')
+        ).order_by('-total_revenue')[:5]
+
+        return (
+            sales['total_sales'],
+            sales['total_orders'],
+            Product.objects.filter(id__in=[item['product'] for item in top_products_data]),
+            Category.objects.filter(id__in=[item['category'] for item in top_categories_data]),
+        )
+
+    def totals_from_orders(self, start_date, end_date):
+        """Totals and top products and categories scanned from the orders in the range, or None without orders"""
         orders = Order.objects.filter(
             created_at__date__gte=start_date,
             created_at__date__lte=end_date
         )
         
         if not orders.exists():
-            return Response(
-                {"error": "No orders found in the specified date range"},
-                status=status.HTTP_404_NOT_FOUND
-            )
+            return None
         
-        # Calculate metrics
         total_sales = orders.aggregate(Sum('total_price'))['total_price__sum'] or 0
         total_orders = orders.count()
-        average_order_value = total_sales / total_orders if total_orders > 0 else 0
         
         # Find top products
         top_products_data = OrderItem.objects.filter(
@@ -595,37 +503,67 @@ class SalesReportGeneratorView(APIView):
         
         top_products = Product.objects.filter(id__in=[item['product'] for item in top_products_data])
         
-        # Find top categories
+        # Find top categories, over the same statuses as CategoryPerformance
         top_categories_data = OrderItem.objects.filter(
-            order__in=orders
+            order__in=orders.filter(status__in=settings.SALES_REVENUE_STATUSES)
         ).values('product__category').annotate(
             total_quantity=Sum('quantity'),
             total_revenue=Sum(F('quantity') * F('price'))
         ).order_by('-total_revenue')[:5]
         
         top_categories = Category.objects.filter(id__in=[item['product__category'] for item in top_categories_data])
-        
-        # Create a new SalesReport
-        report = SalesReport.objects.create(
-            report_type=report_type,
-            start_date=start_date,
-            end_date=end_date,
-            total_sales=total_sales,
-            total_orders=total_orders,
-            average_order_value=average_order_value
-        )
-        
-        # Add top products and categories
-        report.top_products.set(top_products)
-        report.top_categories.set(top_categories)
-        
-        serializer = SalesReportSerializer(report)
-        return Response(serializer.data)
+        return total_sales, total_orders, top_products, top_categories
     
 class UpdateSalesMetricsView(APIView):
     permission_classes = [IsAdmin]
-    
+
+    def get(self, request):
+        """Progress of the current update, if any, and the duration of the last finished one"""
+        jobs = MetricsJob.objects.filter(job_type='UPDATE_METRICS')
+        current = jobs.filter(status__in=['QUEUED', 'RUNNING']).first()
+        last_run = jobs.filter(status__in=['SUCCEEDED', 'FAILED']).order_by('-finished_at').first()
+        return Response({
+            'current': MetricsJobSerializer(current).data if current else None,
+            'last_run': MetricsJobSerializer(last_run).data if last_run else None,
+        })
+
     def post(self, request):
-        from django.core.management import call_command
-        call_command('update_sales_metrics')
-        return Response({"message": "Sales metrics update triggered successfully"}, status=status.HTTP_200_OK)
\ No newline at end of file
+        """Queue an update_sales_metrics run for the run_metrics_jobs worker"""
+        job, created = enqueue_sales_metrics_update(requested_by=request.user)
+        return Response(
+            {
+                "message": "Sales metrics update queued" if created else "Sales metrics update already in progress",
+                "job_id": job.id,
+                "job": MetricsJobSerializer(job).data,
+            },
+            status=status.HTTP_202_ACCEPTED
+        )
+
+
+class MetricsJobListView(APIView):
+    permission_classes = [IsAdmin]
+
+    def get(self, request):
+        jobs = MetricsJob.objects.all()[:50]
+        serializer = MetricsJobSerializer(jobs, many=True)
+        return Response(serializer.data)
+
+    def post(self, request):
+        """Queue a recomputation of the sales rollups for a date range"""
+        serializer = MetricsJobSerializer(data=request.data)
+        if serializer.is_valid():
+            serializer.save(requested_by=request.user)
+            return Response(serializer.data, status=status.HTTP_202_ACCEPTED)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+class MetricsJobDetailView(APIView):
+    permission_classes = [IsAdmin]
+
+    def get(self, request, pk):
+        try:
+            job = MetricsJob.objects.get(pk=pk)
+        except MetricsJob.DoesNotExist:
+            return Response(status=status.HTTP_404_NOT_FOUND)
+        serializer = MetricsJobSerializer(job)
+        return Response(serializer.data)
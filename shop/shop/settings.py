@@ -67,6 +67,7 @@ INSTALLED_APPS = [
     'apps.products.apps.ProductsConfig',
     'apps.orders.apps.OrdersConfig',
     'apps.cart.apps.CartConfig',
+    'apps.notifications.apps.NotificationsConfig',
     'apps.salesanalysis',
     'apps.payments',
     'django_filters',
@@ -93,8 +94,14 @@ TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [],
-        'APP_DIRS': True,
         'OPTIONS': {
+            # Compiled templates (emails included) are kept in memory instead of re-parsed per render
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
             'context_processors': [
                 'django.template.context_processors.debug',
                 'django.template.context_processors.request',
@@ -113,11 +120,16 @@ WSGI_APPLICATION = 'shop.wsgi.application'
 # Default to SQLite for local dev and CI (in-memory for testing)
 DATABASE_URL = os.environ.get('DATABASE_URL', 'sqlite:///db.sqlite3')
 
+# Persistent connections must stay off under ASGI: connections opened in
+# sync_to_async threads are never reused or closed and pile up until the
+# database refuses new ones. Set DB_CONN_MAX_AGE only for WSGI deployments.
+DB_CONN_MAX_AGE = int(os.environ.get('DB_CONN_MAX_AGE', 0))
+
 DATABASES = {
     'default': dj_database_url.config(
         default=DATABASE_URL,
-        conn_max_age=600,
-        conn_health_checks=True,
+        conn_max_age=DB_CONN_MAX_AGE,
+        conn_health_checks=DB_CONN_MAX_AGE > 0,
     )
 }
 
@@ -139,6 +151,28 @@ AUTH_PASSWORD_VALIDATORS = [
 
 AUTH_USER_MODEL = 'accounts.User'
 
+# New passwords are hashed with PASSWORD_HASHER ('argon2', 'bcrypt' or 'pbkdf2'). Hashes made with
+# another algorithm or cost are upgraded on the user's next login. Measure the per-core cost of a
+# setting with `python manage.py benchmark_password_hashing`.
+PASSWORD_HASHER = os.environ.get('PASSWORD_HASHER', 'argon2')
+_TUNED_PASSWORD_HASHERS = {
+    'argon2': 'apps.accounts.hashers.TunedArgon2PasswordHasher',
+    'bcrypt': 'apps.accounts.hashers.TunedBCryptSHA256PasswordHasher',
+    'pbkdf2': 'apps.accounts.hashers.TunedPBKDF2PasswordHasher',
+}
+PASSWORD_HASHERS = [
+    _TUNED_PASSWORD_HASHERS.pop(PASSWORD_HASHER),
+    *_TUNED_PASSWORD_HASHERS.values(),
+    # Django's remaining defaults, so hashes already stored with them still verify (and get upgraded)
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+PASSWORD_ARGON2_TIME_COST = int(os.environ.get('PASSWORD_ARGON2_TIME_COST', 2))
+PASSWORD_ARGON2_MEMORY_COST = int(os.environ.get('PASSWORD_ARGON2_MEMORY_COST', 19456))  # KiB
+PASSWORD_ARGON2_PARALLELISM = int(os.environ.get('PASSWORD_ARGON2_PARALLELISM', 1))
+PASSWORD_BCRYPT_ROUNDS = int(os.environ.get('PASSWORD_BCRYPT_ROUNDS', 12))
+PASSWORD_PBKDF2_ITERATIONS = int(os.environ.get('PASSWORD_PBKDF2_ITERATIONS', 870000))
+
 # --- INTERNATIONALIZATION ---
 
 LANGUAGE_CODE = 'en-us'
@@ -178,7 +212,7 @@ else:
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'apps.accounts.authentication.CachedJWTAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
@@ -186,8 +220,21 @@ REST_FRAMEWORK = {
     'DEFAULT_RENDERER_CLASSES': [
         'rest_framework.renderers.JSONRenderer',
     ],
+    # Proxies in front of the app (Render's load balancer); the client IP for throttling is
+    # taken this many entries from the end of X-Forwarded-For, so clients can't spoof it
+    'NUM_PROXIES': int(os.environ.get('NUM_PROXIES', 1)),
+    # Per client IP and per email address, see apps.accounts.throttling
+    'DEFAULT_THROTTLE_RATES': {
+        'login': os.environ.get('THROTTLE_LOGIN_RATE', '10/min'),
+        'verify_email': os.environ.get('THROTTLE_VERIFY_EMAIL_RATE', '10/min'),
+        'resend_verification': os.environ.get('THROTTLE_RESEND_VERIFICATION_RATE', '3/min'),
+        'password_reset': os.environ.get('THROTTLE_PASSWORD_RESET_RATE', '3/min'),
+    },
 }
 
+# Seconds an authenticated user's snapshot is served from the cache; saves invalidate it sooner
+AUTH_USER_CACHE_TTL = int(os.environ.get('AUTH_USER_CACHE_TTL', 300))
+
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(days=1),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=7),
@@ -208,11 +255,15 @@ else:
     EMAIL_USE_TLS = True
     EMAIL_HOST_USER = os.environ.get('EMAIL_HOST_USER', '')
     EMAIL_HOST_PASSWORD = os.environ.get('EMAIL_HOST_PASSWORD', '')
+    # Only the send_queued_emails worker talks to SMTP, but never let it hang forever
+    EMAIL_TIMEOUT = 30
 
 # --- PAYMENT SETTINGS ---
 
 STRIPE_PUBLIC_KEY = os.environ.get('STRIPE_PUBLIC_KEY', '')
 STRIPE_SECRET_KEY = os.environ.get('STRIPE_SECRET_KEY', '')
+STRIPE_WEBHOOK_SECRET = os.environ.get('STRIPE_WEBHOOK_SECRET', '')
+STRIPE_API_BASE = os.environ.get('STRIPE_API_BASE', 'https://api.stripe.com')
 
 MPESA_CONSUMER_KEY = os.environ.get('MPESA_CONSUMER_KEY', '')
 MPESA_CONSUMER_SECRET = os.environ.get('MPESA_CONSUMER_SECRET', '')
@@ -220,6 +271,19 @@ MPESA_SHORTCODE = os.environ.get('MPESA_SHORTCODE', '')
 MPESA_PASSKEY = os.environ.get('MPESA_PASSKEY', '')
 MPESA_BASE_URL = os.environ.get('MPESA_BASE_URL', 'https://api.safaricom.co.ke')
 
+# Longest a payment status request may long-poll for a pending payment to settle, in seconds
+PAYMENT_STATUS_MAX_WAIT = int(os.environ.get('PAYMENT_STATUS_MAX_WAIT', 25))
+
+# --- OUTBOUND HTTP ---
+
+# (connect, read) timeouts in seconds for calls to payment providers and other upstreams
+OUTBOUND_HTTP_TIMEOUT = (
+    float(os.environ.get('OUTBOUND_HTTP_CONNECT_TIMEOUT', 3.05)),
+    float(os.environ.get('OUTBOUND_HTTP_READ_TIMEOUT', 15)),
+)
+OUTBOUND_HTTP_RETRIES = int(os.environ.get('OUTBOUND_HTTP_RETRIES', 2))
+OUTBOUND_HTTP_POOL_SIZE = int(os.environ.get('OUTBOUND_HTTP_POOL_SIZE', 10))
+
 # --- CORS SETTINGS ---
 
 if DEBUG:
@@ -250,11 +314,37 @@ X_FRAME_OPTIONS = 'DENY'
 
 # --- CACHE SETTINGS ---
 
-CACHES = {
-    'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+# REDIS_URL enables a cache shared by every worker process; without it each
+# process falls back to its own in-memory cache (fine for dev and CI)
+REDIS_URL = os.environ.get('REDIS_URL', '')
+
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
     }
-}
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# --- CART SETTINGS ---
+
+# Guest carts live in the cache only and expire after this many seconds of inactivity
+GUEST_CART_TTL = int(os.environ.get('GUEST_CART_TTL', 60 * 60 * 24 * 7))  # 7 days
+
+# --- SALES ANALYSIS SETTINGS ---
+
+# Order statuses whose items count as revenue in the sales analysis tables
+SALES_REVENUE_STATUSES_str = os.environ.get('SALES_REVENUE_STATUSES', 'PROCESSING,SHIPPED,DELIVERED')
+SALES_REVENUE_STATUSES = [status.strip() for status in SALES_REVENUE_STATUSES_str.split(',') if status.strip()]
+
+# Seconds a report response is cached; any rollup change invalidates it sooner
+SALES_REPORT_CACHE_TTL = int(os.environ.get('SALES_REPORT_CACHE_TTL', 300))
 
 # --- LOGGING ---
 